@@ -1,4 +1,45 @@
+import argparse
+import json
+import os
+
 import uvicorn
 
+# Desarrollo:  python app/main.py                       (recarga al cambiar el código)
+# Producción:  python app/main.py --prod [--workers N]  (sin recarga, sirve el frontend compilado)
+
+FRONTEND_BUILD = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "frontend", "build")
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--prod", action="store_true", help="modo producción")
+    parser.add_argument("--workers", type=int, default=min(4, os.cpu_count() or 1), help="procesos del servidor en modo producción")
+    parser.add_argument("--frontend", default=FRONTEND_BUILD, help="directorio del frontend compilado (npm run build)")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8000)
+    args = parser.parse_args()
+
+    if not args.prod:
+        uvicorn.run("server.api:app", host=args.host, port=args.port, reload=True)
+        return
+
+    from server.static import precompress
+
+    frontend = os.path.abspath(args.frontend)
+    if not os.path.isfile(os.path.join(frontend, "index.html")):
+        parser.error(f"no se encuentra el frontend compilado en {frontend} (npm run build)")
+    print(f"Frontend: {frontend} ({precompress(frontend)} ficheros comprimidos)")
+    # Los workers heredan el entorno: todos sirven el frontend y, si hay más de uno,
+    # se comunican por el backplane SQLite y suman sus métricas en un directorio común
+    os.environ["FRONTEND_DIR"] = frontend
+    # La página servida aquí puede llamar a la API con otro nombre de host (IP o localhost)
+    os.environ.setdefault("CORS_PORTS", json.dumps([3000, args.port]))
+    if args.workers > 1:
+        os.environ.setdefault("BACKPLANE", "sqlite")
+        os.environ.setdefault("METRICS_DIR", "app/db/metrics")
+        os.environ.setdefault("LOG_PER_PROCESS", "true")
+    # El registro va al fichero (app/logs); la consola la descarta el launcher
+    os.environ.setdefault("LOG_CONSOLE", "false")
+    uvicorn.run("server.api:app", host=args.host, port=args.port, workers=args.workers, access_log=False)
+
 if __name__ == "__main__":
-    uvicorn.run("server.api:app", host="0.0.0.0", port=8000, reload=True)
\ No newline at end of file
+    main()
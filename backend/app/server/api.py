@@ -1,42 +1,89 @@
-from fastapi import FastAPI, Response, HTTPException, WebSocket, WebSocketDisconnect, WebSocketException, File, UploadFile
+from fastapi import FastAPI, Depends, Query, Path, Header, Response, HTTPException, WebSocket, WebSocketDisconnect, WebSocketException, File, UploadFile
+from fastapi.responses import FileResponse, PlainTextResponse
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel, Json
+from pydantic import BaseModel
 import json
 from datetime import datetime
-from sqlalchemy import create_engine, func, or_
-from sqlalchemy.orm import sessionmaker
-from typing import List, Optional, Literal
-import random
-from dataclasses import dataclass
-from starlette.websockets import WebSocketState
-import json
-import asyncio
+from sqlalchemy import func, insert
+from sqlalchemy.orm import Session, joinedload, selectinload
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from typing import Dict, List, Optional, Literal
+import secrets
+import time
+from contextlib import asynccontextmanager
+from anyio import from_thread
 import csv
-import jwt
-from io import StringIO
+import logging
+from io import TextIOWrapper
 from .config import Settings
+from .database import engine, get_session, session_scope, run_db, configure_threadpool
+from .migrations import migrate
+from .live_session import LiveSession, LiveUser, live_sessions
+from .results import compute_results, install as install_number_function, normalize_number
+from .export import ExportFormat, export_response
+from .listing import MAX_PAGE_SIZE, NEXT_CURSOR_HEADER, page_headers, paginate, parse_fields, project
+from .serialization import answer_row, assessment_full_row, assessment_row, instance_row, json_response, user_row
+from .events import events, CONNECT, DISCONNECT, START, ANSWER, NEXT, FINISH, CLOSE
+from .connection_manager import ConnectionManager
+from .backplane import backplane
+from .static import IMMUTABLE, mount_frontend
+from .profiling import HEADERS as PROFILING_HEADERS, ProfilingMiddleware, SQLProfiler
+from .watchdog import LoopWatchdog, LoopWatchdogMiddleware
+from .logs import REQUEST_ID_HEADER, RequestIdMiddleware, bind_instance, setup_logging
+from .metrics import ANSWERS, CONTENT_TYPE as METRICS_CONTENT_TYPE, MetricsMiddleware, registry as metrics
+from .bundle import BundleFormat, DuplicatePolicy, bundle_response, import_files
+from .versions import QuestionContent, edit_version, head_of, lineage_of, lineage_versions
+from .images import DIGEST_PATTERN, ImageError, localize_images, store_upload, store as image_store
+from .auth import TokenClaims, auth, authenticate, authenticate_websocket, require_admin, require_user
 
 from .db_config import Assessment, Question, AssessmentInstance, User, Answer
 
 settings = Settings()
 
-USERS_TOKEN = {}
-ADMIN_TOKEN = None
-
-app = FastAPI()
+setup_logging(settings.log_level, settings.log_levels, settings.log_file, settings.log_max_bytes, settings.log_backups, settings.log_console, settings.log_per_process)
+logger = logging.getLogger(__name__)
+
+profiler = SQLProfiler(settings.profiling_sample_rate, settings.profiling_debug, settings.profiling_n_plus_one, settings.profiling_slowest)
+profiler.install(engine)
+install_number_function(engine)
+
+watchdog = LoopWatchdog(settings.loop_watchdog_interval, settings.loop_watchdog_threshold)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+	migrate(engine)
+	configure_threadpool()
+	with session_scope() as session:
+		live_sessions.all(session)
+	await backplane.start()
+	if settings.metrics_dir:
+		await metrics.start(settings.metrics_dir, settings.metrics_flush_interval)
+	if settings.loop_watchdog_enabled:
+		await watchdog.start()
+	yield
+	await watchdog.stop()
+	await metrics.stop()
+	await backplane.stop()
+
+app = FastAPI(lifespan=lifespan)
 
 app.add_middleware(
 	CORSMiddleware,
 	allow_origins=["http://localhost:3000"],  # Permite las solicitudes desde el puerto 3000
-	allow_origin_regex='http://.*:3000',
+	allow_origin_regex=r"https?://[^/]+:({})".format("|".join(str(port) for port in settings.cors_ports)),
 	allow_credentials=True,
 	allow_methods=["*"],  # Permite todos los métodos
 	allow_headers=["*"],  # Permite todos los encabezados
+	expose_headers=[NEXT_CURSOR_HEADER, REQUEST_ID_HEADER] + (PROFILING_HEADERS if profiler.debug else []),
 )
 
-engine = create_engine('sqlite:///app/db/local.db')
-Session = sessionmaker(bind=engine)
-session = Session()
+if profiler.enabled:
+	app.add_middleware(ProfilingMiddleware, profiler=profiler)
+if settings.metrics_enabled:
+	app.add_middleware(MetricsMiddleware)
+if settings.loop_watchdog_enabled:
+	app.add_middleware(LoopWatchdogMiddleware, watchdog=watchdog)
+app.add_middleware(RequestIdMiddleware)
 
 # Modelo de datos para el login
 class JSON_Login(BaseModel):
@@ -153,6 +200,43 @@ class JSON_AssessmentInstance_Output(BaseModel):
 	finished: bool
 	answers: Optional[List[JSON_Answer_Output]]
 	assessment: Optional[JSON_Assessment_Output]
+	userCount: Optional[int] = None
+	seq: Optional[int] = None
+
+class JSON_Question_Stats_Output(BaseModel):
+	question_id: int
+	questionType: Literal['text', 'number', 'select']
+	count: int
+	mean: Optional[float] = None
+	median: Optional[float] = None
+	min: Optional[float] = None
+	max: Optional[float] = None
+	options: Optional[Dict[str, int]] = None
+
+class JSON_Graded_User_Results_Output(BaseModel):
+	user_id: int
+	name: str
+	order: int
+	group: int
+	graders: int
+	expected_graders: int
+	completion: float
+	score: Optional[float] = None
+	questions: List[JSON_Question_Stats_Output]
+
+class JSON_Ranking_Output(BaseModel):
+	user_id: int
+	name: str
+	score: Optional[float] = None
+
+class JSON_AssessmentInstance_Results_Output(BaseModel):
+	id: int
+	title: str
+	assessment_id: int
+	completion: float
+	graded_users: List[JSON_Graded_User_Results_Output]
+	ranking: List[JSON_Ranking_Output]
+	questions: List[JSON_Question_Stats_Output]
 
 class JSON_Assessment_AssessmentInstances_Output(BaseModel):
 	id: int
@@ -171,163 +255,99 @@ class JSON_Assessment_Full_Output(BaseModel):
 	createdAt: datetime
 	updatedAt: datetime
 
-@dataclass
-class Connection:
-	is_admin: bool
-	websocket: WebSocket
-class ConnectionManager:
-	def __init__(self):
-		self.active_connections: list[Connection] = []
-
-	async def connect(self, websocket: WebSocket, is_admin: bool = False):
-		await websocket.accept()
-		self.active_connections.append(Connection(is_admin, websocket))
-
-	def disconnect(self, websocket: WebSocket, is_admin: bool = False):
-		self.active_connections.remove(Connection(is_admin, websocket))
-
-	async def send_personal_message(self, message: Json, websocket: WebSocket):
-		await websocket.send_text(message)
-
-	async def broadcast_admin(self, message: Json):
-		for connection in self.active_connections:
-			if connection.is_admin is True:
-				await connection.websocket.send_text(message)
-
-	async def broadcast_users(self, message: Json):
-		for connection in self.active_connections:
-			if connection.is_admin is False:
-				await connection.websocket.send_text(message)
-
-	async def receive_text(self, websocket: WebSocket):
-		message = await websocket.receive_text()
-		return message
-
-manager = ConnectionManager()
-
-# FUNCIONES
-async def check_is_admin(token: str):
-	if not token:
-		raise HTTPException(status_code=401, detail="Fallo de sesión")
-	token_payload = jwt.decode(token, settings.jwt_secret, algorithms=["HS256"])
-	if not token_payload.get('is_admin'):
-		raise HTTPException(status_code=401, detail="No eres administrador")
-	return True
-
-async def is_admin(token: str):
-	if not token:
-		raise HTTPException(status_code=401, detail="Fallo de sesión")
-	token_payload = jwt.decode(token, settings.jwt_secret, algorithms=["HS256"])
-	if not token_payload.get('is_admin'):
-		return False
-	return True
-
-async def get_token_user_id(token: str):
-	if not token:
-		raise HTTPException(status_code=401, detail="Fallo de sesión")
-	token_payload = jwt.decode(token, settings.jwt_secret, algorithms=["HS256"])
-	if token_payload.get('is_admin'):
-		raise HTTPException(status_code=401, detail="Eres administrador")
-	return token_payload.get('user_id')
+manager = ConnectionManager(send_timeout=settings.ws_send_timeout, queue_size=settings.ws_queue_size, backplane=backplane)
+
+INSTANCE_CHANNEL = "instance"
+
+def on_instance_changed(data: dict):
+	# En el event loop: invalidate() y revoke_instance() no esperan a la base de datos
+	live_sessions.invalidate(data["assessment_instance_id"])
+	if data["revoked_at"] is not None:
+		auth.revoke_instance(data["assessment_instance_id"], data["revoked_at"])
+
+backplane.subscribe(INSTANCE_CHANNEL, on_instance_changed)
+
+async def instance_changed(assessment_instance_id: int, revoke: bool = False):
+	# Invalida el estado en memoria de la evaluación (y revoca los tokens de sus
+	# alumnos) en todos los workers, incluido este
+	await backplane.publish(INSTANCE_CHANNEL, {"assessment_instance_id": assessment_instance_id, "revoked_at": time.time() if revoke else None})
 
 # RUTAS DE SESION
 @app.post("/login")
-async def login(input_data: JSON_Login):
+def login(input_data: JSON_Login):
 	user = input_data.username
 	password = input_data.password
 
 	if user == settings.admin_user:
 		if password == settings.admin_password:
-			token = jwt.encode({"is_admin": True}, settings.jwt_secret, algorithm="HS256")
+			token = auth.issue_admin_token()
 			return {"detail": "Autenticación como administrador exitosa", "token": token}
 		else:
 			raise HTTPException(status_code=401, detail="Nombre o contraseña incorrecta")
 
 # RUTAS DE ASSESSMENTS
-@app.get("/assessment/all/token={token}", response_model=List[JSON_Assessment_Full_Output])
-async def get_all_assessments(token: str):
-	await check_is_admin(token)
+@app.get("/assessment/all/token={token}", response_model=List[JSON_Assessment_Full_Output], dependencies=[Depends(require_admin)])
+def get_all_assessments(
+	limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE),
+	cursor: Optional[str] = None,
+	archived: Optional[bool] = None,
+	title_prefix: Optional[str] = None,
+	created_from: Optional[datetime] = None,
+	created_to: Optional[datetime] = None,
+	fields: Optional[str] = None,
+	session: Session = Depends(get_session)
+):
+	include = parse_fields(fields, JSON_Assessment_Full_Output)
 	try:
-		all_assessments = session.query(Assessment).filter(Assessment.actual_assessment_id.is_(None)).all()
-
-		if not all_assessments:
+		query = session.query(Assessment).filter(Assessment.actual_assessment_id.is_(None))
+		if archived is not None:
+			query = query.filter(Assessment.archived == archived)
+		if title_prefix:
+			query = query.filter(Assessment.title.startswith(title_prefix, autoescape=True))
+		if created_from is not None:
+			query = query.filter(Assessment.createdAt >= created_from)
+		if created_to is not None:
+			query = query.filter(Assessment.createdAt <= created_to)
+		all_assessments, next_cursor = paginate(query, Assessment.id, cursor, limit)
+
+		if not all_assessments and cursor is None:
 			raise HTTPException(status_code=404, detail="No hay assessment")
 
-		response = []
-
-		for assessment in all_assessments:
-			assessment_data = JSON_Assessment_Full_Output(
-				id=assessment.id,
-				title=assessment.title,
-				image=assessment.image,
-				archived=assessment.archived,
-				createdAt=assessment.createdAt.isoformat() if assessment.createdAt else None,
-				updatedAt=assessment.updatedAt.isoformat() if assessment.updatedAt else None,
-				questions=None,
-				assessmentInstances=None
-			)
-
-			response.append(assessment_data)
-
-		return response
+		assessments_data = [project(assessment_full_row(assessment), include) for assessment in all_assessments]
+		return json_response(assessments_data, headers=page_headers(next_cursor))
 	except HTTPException as e:
 		raise e
 	except Exception as e:
 		raise HTTPException(status_code=500, detail=f"Error al obtener las evaluaciones: {str(e)}")
-	finally:
-		session.close()
 
-@app.get("/assessment/{ID}/view/token={token}", response_model=JSON_Assessment_Full_Output)
-async def get_assessment_by_ID(token: str, ID: int):
-	await check_is_admin(token)
+@app.get("/assessment/{ID}/view/token={token}", response_model=JSON_Assessment_Full_Output, dependencies=[Depends(require_admin)])
+def get_assessment_by_ID(ID: int, fields: Optional[str] = None, session: Session = Depends(get_session)):
+	include = parse_fields(fields, JSON_Assessment_Full_Output)
 	try:
 		assessment = session.query(Assessment).filter(Assessment.id == ID).first()
 		if assessment is None:
 			raise HTTPException(status_code=404, detail="Assessment no encontrado")
 
-		questions_data = [
-			JSON_Question_Output(
-				id=question.id,
-				assessment_id=question.assessment_id,
-				title=question.title,
-				image=question.image,
-				questionType=question.questionType,
-				questionOrder=question.questionOrder,
-				selectOptions=[JSON_SelectOptions(title=option['title']) for option in question.selectOptions]
-			) for question in assessment.questions
-		]
-
-		response = JSON_Assessment_Full_Output(
-			id=assessment.id,
-			title=assessment.title,
-			image=assessment.image,
-			archived=assessment.archived,
-			createdAt=assessment.createdAt,
-			updatedAt=assessment.updatedAt,
-			questions=questions_data,
-			assessmentInstances=None
-		)
-
-		return response
+		questions = None if include is not None and "questions" not in include else assessment.questions
+		return json_response(project(assessment_full_row(assessment, questions), include))
 	except HTTPException as e:
 		raise e
 	except Exception as e:
 		raise HTTPException(status_code=500, detail=f"Error al obtener la evaluación: {str(e)}")
-	finally:
-		session.close()
 
-@app.delete("/assessment/{ID}/delete/token={token}")
-async def delete_assessment_by_ID(token: str, ID: int):
-	await check_is_admin(token)
+@app.delete("/assessment/{ID}/delete/token={token}", dependencies=[Depends(require_admin)])
+def delete_assessment_by_ID(ID: int, session: Session = Depends(get_session)):
 	try:
-		assessments_to_delete = session.query(Assessment).filter(or_(Assessment.id == ID, Assessment.actual_assessment_id == ID)).all()
-
-		if not assessments_to_delete:
+		assessment = session.query(Assessment).filter(Assessment.id == ID).first()
+		if assessment is None:
 			raise HTTPException(status_code=404, detail="Assessment no encontrado")
 
-		# Eliminar todos los Assessments encontrados
-		for assessment in assessments_to_delete:
-			session.delete(assessment)
+		# Se eliminan todas las versiones (con sus partidas) y las preguntas del linaje
+		lineage_id = lineage_of(assessment)
+		for version in session.query(Assessment).filter(lineage_versions(lineage_id)).all():
+			session.delete(version)
+		session.flush()
+		session.query(Question).filter(Question.lineage_id == lineage_id).delete(synchronize_session=False)
 
 		session.commit()
 
@@ -336,12 +356,17 @@ async def delete_assessment_by_ID(token: str, ID: int):
 	except Exception as e:
 		session.rollback()
 		raise HTTPException(status_code=500, detail=f"Error al eliminar la evaluación: {str(e)}")
-	finally:
-		session.close()
 
-@app.post("/assessment/{ID}/archive/token={token}")
-async def toggle_archive_assessment(token: str, ID: int):
-	await check_is_admin(token)
+@app.get("/assessment/{ID}/export/token={token}", dependencies=[Depends(require_admin)])
+def export_assessment(ID: int, format: ExportFormat = "csv", session: Session = Depends(get_session)):
+	assessment = session.query(Assessment).filter(Assessment.id == ID).first()
+	if assessment is None:
+		raise HTTPException(status_code=404, detail="Assessment no encontrado")
+	assessment_instance_ids = [id for (id,) in session.query(AssessmentInstance.id).filter(AssessmentInstance.assessment_id == ID).order_by(AssessmentInstance.id)]
+	return export_response(f"{assessment.title}_resultados", assessment.id, assessment_instance_ids, format)
+
+@app.post("/assessment/{ID}/archive/token={token}", dependencies=[Depends(require_admin)])
+def toggle_archive_assessment(ID: int, session: Session = Depends(get_session)):
 	try:
 		assessment = session.query(Assessment).filter(Assessment.id == ID).first()
 		if assessment is None:
@@ -357,43 +382,41 @@ async def toggle_archive_assessment(token: str, ID: int):
 	except Exception as e:
 		session.rollback()
 		raise HTTPException(status_code=500, detail=f"Error al archivar la evaluación: {str(e)}")
-	finally:
-		session.close()
 
-@app.post("/assessment/create/token={token}")
-async def create_assessment(token: str, input_data: JSON_Assessment_Input):
-	await check_is_admin(token)
+@app.post("/assessment/create/token={token}", dependencies=[Depends(require_admin)])
+def create_assessment(input_data: JSON_Assessment_Input, session: Session = Depends(get_session)):
 	try:
 		existing_assessment = session.query(Assessment).filter(Assessment.title == input_data.title).first()
 
 		if existing_assessment is not None:
 			raise HTTPException(status_code=400, detail="Ya existe un assessment con este título")
 
+		if not input_data.questions:
+			raise HTTPException(status_code=400, detail="No hay pregunta_raws para guardar")
+
+		# Las imágenes se descargan solo cuando se sabe que se va a guardar
+		images = localize_images(session, [input_data.image] + [question_data.image for question_data in input_data.questions])
 		new_assessment = Assessment(
 			title=input_data.title,
-			image=input_data.image,
+			image=images.get(input_data.image, input_data.image),
 			createdAt=datetime.now(),
 			updatedAt=datetime.now()
 		)
 		session.add(new_assessment)
 		session.flush()
 
-		if not input_data.questions:
-			raise HTTPException(status_code=400, detail="No hay pregunta_raws para guardar")
-
-		for question_data in input_data.questions:
-			new_question = Question(
+		session.add_all([
+			Question(
 				assessment_id=new_assessment.id,
 				title=question_data.title,
-				image=question_data.image,
+				image=images.get(question_data.image, question_data.image),
 				questionType=question_data.questionType,
 				questionOrder=question_data.questionOrder,
 				selectOptions=[option.to_dict() for option in question_data.selectOptions],
 				createdAt=datetime.now(),
 				updatedAt=datetime.now()
-			)
-			session.add(new_question)
-			session.flush()
+			) for question_data in input_data.questions
+		])
 
 		session.commit()
 		return {"detail": "Assessment creado correctamente con ID: {}".format(new_assessment.id)}
@@ -402,77 +425,51 @@ async def create_assessment(token: str, input_data: JSON_Assessment_Input):
 	except Exception as e:
 		session.rollback()
 		raise HTTPException(status_code=500, detail=f"Error al crear el assessment: {str(e)}")
-	finally:
-		session.close()
 
-@app.put("/assessment/{ID}/edit/token={token}")
-async def edit_assessment(token: str, ID: int, input_data: JSON_Assessment_Edit_Input):
-	await check_is_admin(token)
+@app.post("/assessment/import/token={token}", dependencies=[Depends(require_admin)])
+def import_assessments(files: List[UploadFile] = File(...), duplicates: DuplicatePolicy = "skip", localize: bool = True, session: Session = Depends(get_session)):
+	try:
+		report = import_files(session, files, duplicates, localize)
+		imported = sum(entry["assessments"] for entry in report)
+		return {"detail": f"{imported} evaluaciones importadas", "files": report}
+	except Exception as e:
+		session.rollback()
+		raise HTTPException(status_code=500, detail=f"Error al importar las evaluaciones: {str(e)}")
+
+@app.get("/assessment/bundle/token={token}", dependencies=[Depends(require_admin)])
+def export_assessments(format: BundleFormat = "zip", archived: Optional[bool] = None):
+	return bundle_response(format, archived)
+
+@app.put("/assessment/{ID}/edit/token={token}", dependencies=[Depends(require_admin)])
+def edit_assessment(ID: int, input_data: JSON_Assessment_Edit_Input, session: Session = Depends(get_session)):
 	try:
 		assessment = session.query(Assessment).filter(Assessment.id == ID).first()
 		if assessment is None:
 			raise HTTPException(status_code=404, detail="Assessment no encontrado")
-		if assessment.assessmentInstances:
-			new_assessment = Assessment(
-				title=input_data.title,
-				image=input_data.image,
-				createdAt=datetime.now(),
-				updatedAt=datetime.now()
-			)
-			session.add(new_assessment)
-			session.flush()
-
-			if not input_data.questions:
-				raise HTTPException(status_code=400, detail="No hay preguntas para guardar")
-
-			for question_data in input_data.questions:
-				new_question = Question(
-					assessment_id=new_assessment.id,
-					title=question_data.title,
-					image=question_data.image,
-					questionType=question_data.questionType,
-					questionOrder=question_data.questionOrder,
-					selectOptions=[option.to_dict() for option in question_data.selectOptions]
-				)
-				session.add(new_question)
-				session.flush()
-
-			session.commit()
-
-			assessments_to_update = session.query(Assessment).filter(or_(Assessment.id == ID, Assessment.actual_assessment_id == ID)).all()
-			for assessment in assessments_to_update:
-				assessment.actual_assessment_id = new_assessment.id
-		else:
-			if input_data.title:
-				assessment.title = input_data.title
-			if input_data.image:
-				assessment.image = input_data.image
-			if input_data.questions:
-				for question_data in input_data.questions:
-					if question_data.id:
-						question = session.query(Question).filter(Question.id == question_data.id).first()
-						if question:
-							question.title = question_data.title
-							question.image = question_data.image
-							question.questionType = question_data.questionType
-							question.questionOrder = question_data.questionOrder
-							question.selectOptions = [option.to_dict() for option in question_data.selectOptions]
-					else:
-						new_question = Question(
-							assessment_id=assessment.id,
-							title=question_data.title,
-							image=question_data.image,
-							questionType=question_data.questionType,
-							questionOrder=question_data.questionOrder,
-							selectOptions=[option.to_dict() for option in question_data.selectOptions]
-						)
-						session.add(new_question)
-
-			if input_data.deletedQuestionsIds:
-				for question_id in input_data.deletedQuestionsIds:
-					question = session.query(Question).filter(Question.id == question_id).first()
-					if question:
-						session.delete(question)
+		# Si ya se ha jugado, se crea una versión nueva que comparte las preguntas sin cambios
+		versioned = bool(head_of(session, assessment).assessmentInstances)
+		if versioned and not input_data.questions:
+			raise HTTPException(status_code=400, detail="No hay preguntas para guardar")
+		images = localize_images(session, [input_data.image] + [question_data.image for question_data in input_data.questions or []])
+		questions = [
+			(question_data.id, QuestionContent(
+				title=question_data.title,
+				image=images.get(question_data.image, question_data.image),
+				questionType=question_data.questionType,
+				questionOrder=question_data.questionOrder,
+				selectOptions=[option.to_dict() for option in question_data.selectOptions],
+			))
+			for question_data in input_data.questions or []
+		]
+		edit_version(
+			session,
+			assessment,
+			input_data.title,
+			images.get(input_data.image, input_data.image),
+			questions,
+			set(input_data.deletedQuestionsIds or []),
+			versioned,
+		)
 
 		session.commit()
 		return {"detail": "Assessment editado correctamente"}
@@ -481,62 +478,79 @@ async def edit_assessment(token: str, ID: int, input_data: JSON_Assessment_Edit_
 	except Exception as e:
 		session.rollback()
 		raise HTTPException(status_code=500, detail=f"Error al editar la evaluación: {str(e)}")
-	finally:
-		session.close()
+
+# RUTAS DE IMÁGENES
+@app.post("/images/upload/token={token}", dependencies=[Depends(require_admin)])
+def upload_image(file: UploadFile = File(...), session: Session = Depends(get_session)):
+	try:
+		image = store_upload(session, file.file.read(settings.image_max_bytes + 1))
+		session.commit()
+		return {"detail": "Imagen guardada correctamente", "image": image}
+	except ImageError as e:
+		raise HTTPException(status_code=400, detail=str(e))
+
+# Sin token: las piden las etiquetas <img> de los alumnos. La ruta es el hash del
+# contenido, así que nunca cambia y se puede cachear para siempre.
+@app.get("/images/{digest}")
+def get_image(digest: str = Path(pattern=DIGEST_PATTERN), w: Optional[int] = Query(None, gt=0), if_none_match: Optional[str] = Header(None)):
+	etag = f'"{digest}-{image_store.snap_width(w) or 0}"'
+	headers = {"ETag": etag, "Cache-Control": IMMUTABLE}
+	if if_none_match == etag:
+		return Response(status_code=304, headers=headers)
+	try:
+		return FileResponse(image_store.variant(digest, w), media_type=image_store.media_type(digest), headers=headers)
+	except FileNotFoundError:
+		raise HTTPException(status_code=404, detail="Imagen no encontrada")
 
 # RUTAS DE ASSESSMENT INSTANCES
-@app.get("/assessment/{id}/assessment-instance/all/token={token}", response_model=JSON_Assessment_AssessmentInstances_Output)
-async def get_all_assessment_instances(token: str, id: int):
-	await check_is_admin(token)
+@app.get("/assessment/{id}/assessment-instance/all/token={token}", response_model=JSON_Assessment_AssessmentInstances_Output, dependencies=[Depends(require_admin)])
+def get_all_assessment_instances(
+	id: int,
+	limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE),
+	cursor: Optional[str] = None,
+	fields: Optional[str] = None,
+	session: Session = Depends(get_session)
+):
+	include = parse_fields(fields, JSON_AssessmentInstance_Output)
 	try:
 		assessment = session.query(Assessment).filter(Assessment.id == id).first()
-		print(assessment)
 		if not assessment:
 			raise HTTPException(status_code=404, detail="Evaluación no encontrada")
 
-		assessmentInstances_data = []
-		for instance in assessment.assessmentInstances:
-			response_data = JSON_AssessmentInstance_Output(
-				id=instance.id,
-				title=instance.title,
-				assessment_id=instance.assessment_id,
-				users=sorted(
-					[
-						JSON_User_Output(
-							id=user.id,
-							name=user.name,
-							email=user.email,
-							order=user.order,
-							group=user.group,
-							pin=user.pin,
-							voteEveryone=user.voteEveryone
-						) for user in instance.users
-					],
-					key=lambda user: user.order
-				),
-				actual_user=None,
-				active=instance.active,
-				finished=instance.finished,
-				answers=None,
-				assessment=None
+		# Los usuarios solo se cargan si se piden; para contarlos basta un GROUP BY
+		load_users = include is None or "users" in include
+		query = session.query(AssessmentInstance).filter(AssessmentInstance.assessment_id == id)
+		if load_users:
+			query = query.options(selectinload(AssessmentInstance.users))
+		instances, next_cursor = paginate(query, AssessmentInstance.id, cursor, limit)
+		user_counts = {}
+		if instances and not load_users and "userCount" in include:
+			user_counts = dict(
+				session.query(User.assessment_instance_id, func.count(User.id))
+				.filter(User.assessment_instance_id.in_([instance.id for instance in instances]))
+				.group_by(User.assessment_instance_id)
 			)
-			assessmentInstances_data.append(response_data)
-		response = JSON_Assessment_AssessmentInstances_Output(
-			id=assessment.id,
-			title=assessment.title,
-			assessmentInstances=assessmentInstances_data
+
+		assessmentInstances_data = []
+		for instance in instances:
+			if load_users:
+				users = sorted(instance.users, key=lambda user: user.order)
+				row = instance_row(instance, users=[user_row(user) for user in users], userCount=len(users))
+			else:
+				row = instance_row(instance, userCount=user_counts.get(instance.id, 0))
+			assessmentInstances_data.append(project(row, include))
+
+		return json_response(
+			{"id": assessment.id, "title": assessment.title, "assessmentInstances": assessmentInstances_data},
+			headers=page_headers(next_cursor)
 		)
-		return response
 	except HTTPException as e:
 		raise e
 	except Exception as e:
 		raise HTTPException(status_code=500, detail=f"Error al obtener las evaluaciones: {str(e)}")
-	finally:
-		session.close()
 
-@app.post("/assessment/{id}/assessment-instance/create/token={token}")
-async def create_assessment_instance(token: str, id: int, input_data: JSON_AssessmentInstance_Input):
-	await check_is_admin(token)
+@app.post("/assessment/{id}/assessment-instance/create/token={token}", dependencies=[Depends(require_admin)])
+def create_assessment_instance(id: int, input_data: JSON_AssessmentInstance_Input, session: Session = Depends(get_session)):
 	try:
 		assessment = session.query(Assessment).filter(Assessment.id == id).first()
 		if not assessment:
@@ -557,312 +571,271 @@ async def create_assessment_instance(token: str, id: int, input_data: JSON_Asses
 	except Exception as e:
 		session.rollback()
 		raise HTTPException(status_code=500, detail=f"Error al guardar evaluación: {str(e)}")
-	finally:
-		session.close()
+
+def live_snapshot(live: LiveSession, user: Optional[LiveUser], seq: int, answers: List[Answer] = ()) -> dict:
+	# Vista de la sesión en directo: el administrador ve todos los usuarios; un alumno
+	# solo ve al evaluado y las preguntas si le toca evaluarle
+	actual_user = live.actual_user
+	actual_user_data = user_row(actual_user) if actual_user else None
+	users_data = None
+	assessment_data = None
+	if user is None:
+		users_data = [user_row(live_user) for live_user in live.users]
+	elif actual_user is None or not user.voteEveryone and user.group != actual_user.group or actual_user.id == user.id:
+		actual_user_data = None
+	else:
+		assessment_data = live.assessment
+
+	return {
+		"id": live.assessment_instance_id,
+		"title": live.title,
+		"assessment_id": live.assessment_id,
+		"users": users_data,
+		"actual_user": actual_user_data,
+		"active": True,
+		"finished": False,
+		"answers": [answer_row(answer) for answer in answers] or None,
+		"assessment": assessment_data,
+		"userCount": None,
+		"seq": seq,
+	}
+
+def resolve_live_session(session: Session, claims: TokenClaims, assessment_instance_id: Optional[int] = None) -> LiveSession:
+	# Un alumno solo puede estar en la evaluación de su token; el administrador indica
+	# la evaluación o, si solo hay una activa, se usa esa
+	if not claims.is_admin:
+		assessment_instance_id = claims.assessment_instance_id
+	elif assessment_instance_id is None:
+		active_ids = live_sessions.active_ids(session)
+		if len(active_ids) > 1:
+			raise HTTPException(status_code=409, detail="Hay varias evaluaciones activas: indica cuál")
+		assessment_instance_id = active_ids[0] if active_ids else None
+	live = live_sessions.get(session, assessment_instance_id) if assessment_instance_id is not None else None
+	if not live:
+		raise HTTPException(status_code=404, detail="No hay evaluación activa")
+	bind_instance(live.assessment_instance_id)
+	return live
 
 @app.get("/assessment-instance/active/token={token}", response_model=JSON_AssessmentInstance_Output)
-async def get_active_assessment_instance(token: str):
+@app.get("/assessment-instance/{ID}/active/token={token}", response_model=JSON_AssessmentInstance_Output)
+def get_active_assessment_instance(ID: Optional[int] = None, claims: TokenClaims = Depends(authenticate), session: Session = Depends(get_session)):
 	try:
-		token_is_admin = await (is_admin(token))
-		users_data = None
-		answers_data = None
-		assessment_data = None
-		assessmentInstance = session.query(AssessmentInstance).filter(AssessmentInstance.active == True).first()
-		if not assessmentInstance:
-			raise HTTPException(status_code=404, detail="Evaluación no encontrada")
-		actual_user = session.query(User).filter(User.id == assessmentInstance.actual_user_id).first()
-		actual_user_data = JSON_User_Output(
-			id=actual_user.id,
-			name=actual_user.name,
-			email=actual_user.email,
-			order=actual_user.order,
-			group=actual_user.group,
-			pin=actual_user.pin,
-			voteEveryone=actual_user.voteEveryone
-		) if actual_user else None
-
-		answers = session.query(Answer).filter(Answer.assessment_instance_id == assessmentInstance.id, Answer.graded_user_id == actual_user.id).all()
-		if len(answers) > 0:
-			answers_data = [
-				JSON_Answer_Output(
-					id=answer.id,
-					assessment_instance_id=answer.assessment_instance_id,
-					question_id=answer.question_id,
-					grading_user_id=answer.grading_user_id,
-					graded_user_id=answer.graded_user_id,
-					answerText=answer.answerText,
-					date=answer.date
-				) for answer in answers
-			]
-		if token_is_admin:
-			users_data = sorted(
-					[
-					JSON_User_Output(
-						id=user.id,
-						name=user.name,
-						email=user.email,
-						order=user.order,
-						group=user.group,
-						pin=user.pin,
-						voteEveryone=user.voteEveryone
-					) for user in assessmentInstance.users
-				],
-				key=lambda user: user.order
-			)
+		seq = events.last_seq
+		live = resolve_live_session(session, claims, ID)
+
+		answers_query = session.query(Answer).filter(Answer.assessment_instance_id == live.assessment_instance_id, Answer.graded_user_id == live.actual_user_id)
+		if claims.is_admin:
+			user = None
 		else:
-			user_id = await get_token_user_id(token)
-			user = session.query(User).filter(User.id == user_id).first()
+			user = live.users_by_id.get(claims.user_id)
 			if not user:
-				raise HTTPException(status_code=404, detail="Usuario no encontrado")
-
-			if user.assessment_instance_id != assessmentInstance.id:
 				raise HTTPException(status_code=404, detail="Usuario no encontrado en esta evaluación")
+			answers_query = answers_query.filter(Answer.grading_user_id == user.id)
 
-			assessment = session.query(Assessment).filter(Assessment.id == assessmentInstance.assessment_id).first()
-			assessment_data = JSON_Assessment_Output(
-				id=assessment.id,
-				title=assessment.title,
-				image=assessment.image,
-				archived=assessment.archived,
-				questions= sorted(
-					[
-						JSON_Question_Output(
-							id=question.id,
-							assessment_id=question.assessment_id,
-							title=question.title,
-							image=question.image,
-							questionType=question.questionType,
-							questionOrder=question.questionOrder,
-							selectOptions= [JSON_SelectOptions.from_dict(option) for option in question.selectOptions]
-						) for question in assessment.questions
-					],
-					key=lambda question: question.questionOrder
-				)
-			)
-			if len(answers) > 0:
-				filtered_answers = [answer for answer in answers if (answer.grading_user_id == user.id and answer.graded_user_id == actual_user.id)]
-				answers_data = [
-					JSON_Answer_Output(
-						id=answer.id,
-						assessment_instance_id=answer.assessment_instance_id,
-						question_id=answer.question_id,
-						grading_user_id=answer.grading_user_id,
-						graded_user_id=answer.graded_user_id,
-						answerText=answer.answerText,
-						date=answer.date
-					) for answer in filtered_answers
-				]
-
-			if not user.voteEveryone and user.group != actual_user.group or actual_user.id == user.id:
-				assessment_data = None
-				actual_user_data = None
-
-		response = JSON_AssessmentInstance_Output(
-			id=assessmentInstance.id,
-			title=assessmentInstance.title,
-			assessment_id=assessmentInstance.assessment_id,
-			users=users_data,
-			actual_user=actual_user_data,
-			active=assessmentInstance.active,
-			finished=assessmentInstance.finished,
-			answers=answers_data,
-			assessment=assessment_data
-		)
-		return response
+		return json_response(live_snapshot(live, user, seq, answers_query.all()))
 	except HTTPException as e:
 		raise e
 	except Exception as e:
-		print("/active", e)
+		logger.exception("Error al obtener la evaluación activa")
 		raise HTTPException(status_code=500, detail=f"Error al obtener la evaluación: {str(e)}")
-	finally:
-		session.close()
 
 @app.get("/assessment-instance/{ID}/token={token}", response_model=JSON_AssessmentInstance_Output)
-async def get_assessment_instance_by_ID(token: str, ID: int):
-	token_is_admin = await (check_is_admin(token))
-	if token_is_admin:
+def get_assessment_instance_by_ID(ID: int, fields: Optional[str] = None, claims: TokenClaims = Depends(require_admin), session: Session = Depends(get_session)):
+	include = parse_fields(fields, JSON_AssessmentInstance_Output)
+	if claims.is_admin:
 		try:
-			assessmentInstance = session.query(AssessmentInstance).filter(AssessmentInstance.id == ID).first()
+			# Solo se cargan las relaciones que aparecen en la proyección pedida
+			wanted = lambda field: include is None or field in include
+			options = []
+			if wanted("users"):
+				options.append(selectinload(AssessmentInstance.users))
+			if wanted("answers"):
+				options.append(selectinload(AssessmentInstance.answers))
+			if wanted("assessment"):
+				options.append(joinedload(AssessmentInstance.assessment).selectinload(Assessment.questions))
+			assessmentInstance = (
+				session.query(AssessmentInstance)
+				.options(*options)
+				.filter(AssessmentInstance.id == ID)
+				.first()
+			)
 			if not assessmentInstance:
 				raise HTTPException(status_code=404, detail="Evaluación no encontrada")
 
-			users_data = sorted(
-				[
-					JSON_User_Output(
-						id=user.id,
-						name=user.name,
-						email=user.email,
-						order=user.order,
-						group=user.group,
-						pin=user.pin,
-						voteEveryone=user.voteEveryone
-					) for user in assessmentInstance.users
-				],
-				key=lambda user: user.order
-			)
+			users_data = None
+			if wanted("users"):
+				users_data = [user_row(user) for user in sorted(assessmentInstance.users, key=lambda user: user.order)]
 
-			assessment = session.query(Assessment).filter(Assessment.id == assessmentInstance.assessment_id).first()
-			if not assessment:
-				raise HTTPException(status_code=404, detail="Evaluación no encontrada")
+			assessment_data = None
+			if wanted("assessment"):
+				assessment = assessmentInstance.assessment
+				if not assessment:
+					raise HTTPException(status_code=404, detail="Evaluación no encontrada")
+				assessment_data = assessment_row(assessment, sorted(assessment.questions, key=lambda question: question.questionOrder))
 
-			assessment_data = JSON_Assessment_Output(
-				id=assessment.id,
-				title=assessment.title,
-				image=assessment.image,
-				archived=assessment.archived,
-				questions=sorted(
-					[
-						JSON_Question_Output(
-							id=question.id,
-							assessment_id=question.assessment_id,
-							title=question.title,
-							image=question.image,
-							questionType=question.questionType,
-							questionOrder=question.questionOrder,
-							selectOptions=[JSON_SelectOptions.from_dict(option) for option in question.selectOptions]
-						) for question in assessment.questions
-					],
-					key=lambda question: question.questionOrder
-				)
-			)
-
-			answers = session.query(Answer).filter(Answer.assessment_instance_id == assessmentInstance.id).all()
-			if len(answers) > 0:
-				answers_data = [
-					JSON_Answer_Output(
-						id=answer.id,
-						assessment_instance_id=answer.assessment_instance_id,
-						question_id=answer.question_id,
-						grading_user_id=answer.grading_user_id,
-						graded_user_id=answer.graded_user_id,
-						answerText=answer.answerText,
-						date=answer.date
-					) for answer in answers
-				]
-			else:
-				answers_data = None
-
-			response = JSON_AssessmentInstance_Output(
-				id=assessmentInstance.id,
-				title=assessmentInstance.title,
-				assessment_id=assessmentInstance.assessment_id,
-				users=users_data,
-				active=assessmentInstance.active,
-				actual_user=None,
-				finished=assessmentInstance.finished,
-				answers=answers_data,
-				assessment=assessment_data
-			)
+			answers_data = None
+			if wanted("answers"):
+				answers_data = [answer_row(answer) for answer in assessmentInstance.answers] or None
 
-			return response
+			return json_response(project(instance_row(assessmentInstance, users=users_data, answers=answers_data, assessment=assessment_data), include))
 		except HTTPException as e:
 			raise e
 		except Exception as e:
 			raise HTTPException(status_code=500, detail=f"Error al obtener la evaluación: {str(e)}")
-		finally:
-			session.close()
 	else:
-		user_id = await get_token_user_id(token)
 		try:
-			user = session.query(User).filter(User.id == user_id).first()
+			user = session.query(User).filter(User.id == claims.user_id).first()
 			if not user:
 				raise HTTPException(status_code=404, detail="Usuario no encontrado")
 
-			assessmentInstance = session.query(AssessmentInstance).filter(AssessmentInstance.id == ID).first()
+			assessmentInstance = (
+				session.query(AssessmentInstance)
+				.options(joinedload(AssessmentInstance.assessment).selectinload(Assessment.questions))
+				.filter(AssessmentInstance.id == ID)
+				.first()
+			)
 			if not assessmentInstance:
 				raise HTTPException(status_code=404, detail="Evaluación no encontrada")
 
 			if user.assessment_instance_id != assessmentInstance.id:
 				raise HTTPException(status_code=404, detail="Usuario no encontrado en esta evaluación")
 
-			assessment = session.query(Assessment).filter(Assessment.id == assessmentInstance.assessment_id).first()
-
-			response = JSON_AssessmentInstance_Output(
-				id=assessmentInstance.id,
-				title=assessmentInstance.title,
-				assessment_id=assessmentInstance.assessment_id,
-				users=None,
-				actual_user=None,
-				active=assessmentInstance.active,
-				finished=assessmentInstance.finished,
-				answers=None,
-				assessment=JSON_Assessment_Output(
-					id=assessment.id,
-					title=assessment.title,
-					image=assessment.image,
-					archived=assessment.archived,
-					questions=sorted(
-						[
-							JSON_Question_Output(
-								id=question.id,
-								assessment_id=question.assessment_id,
-								title=question.title,
-								image=question.image,
-								questionType=question.questionType,
-								questionOrder=question.questionOrder,
-								selectOptions=[JSON_SelectOptions.from_dict(option) for option in question.selectOptions]
-							) for question in assessment.questions
-						],
-						key=lambda question: question.questionOrder
-					)
-				)
-			)
-
-			return response
+			assessment = assessmentInstance.assessment
+			assessment_data = assessment_row(assessment, sorted(assessment.questions, key=lambda question: question.questionOrder))
+			return json_response(project(instance_row(assessmentInstance, assessment=assessment_data), include))
 		except HTTPException as e:
 			raise e
 		except Exception as e:
 			raise HTTPException(status_code=500, detail=f"Error al obtener la evaluación: {str(e)}")
-		finally:
-			session.close()
-
-def generate_unique_pin(session, assessment_instance_id: int) -> str:
-	while True:
-		pin = "".join([str(random.randint(0, 9)) for _ in range(6)])
-		existing_user = session.query(User).filter_by(assessment_instance_id=assessment_instance_id, pin=pin).first()
-		if not existing_user:
-			return pin
-
-@app.post("/assessment-instance/{ID}/users/upload/token={token}")
-async def add_users_from_csv(token: str, ID: int, file: UploadFile = File(...)):
-	await check_is_admin(token)
+
+@app.get("/assessment-instance/{ID}/results/token={token}", response_model=JSON_AssessmentInstance_Results_Output, dependencies=[Depends(require_admin)])
+def get_assessment_instance_results(ID: int, session: Session = Depends(get_session)):
+	try:
+		assessmentInstance = session.query(AssessmentInstance).filter(AssessmentInstance.id == ID).first()
+		if not assessmentInstance:
+			raise HTTPException(status_code=404, detail="Evaluación no encontrada")
+		return json_response(compute_results(session, assessmentInstance))
+	except HTTPException as e:
+		raise e
+	except Exception as e:
+		raise HTTPException(status_code=500, detail=f"Error al calcular los resultados: {str(e)}")
+
+@app.get("/assessment-instance/{ID}/export/token={token}", dependencies=[Depends(require_admin)])
+def export_assessment_instance(ID: int, format: ExportFormat = "csv", session: Session = Depends(get_session)):
+	assessmentInstance = session.query(AssessmentInstance).filter(AssessmentInstance.id == ID).first()
+	if not assessmentInstance:
+		raise HTTPException(status_code=404, detail="Evaluación no encontrada")
+	return export_response(f"{assessmentInstance.title}_resultados", assessmentInstance.assessment_id, [assessmentInstance.id], format)
+
+PIN_SPACE = 10 ** 6
+ROSTER_COLUMNS = ("name", "email", "order", "group")
+
+class PinGenerator:
+	# Fisher-Yates perezoso sobre los 10^6 PINs posibles: cada PIN sale en O(1),
+	# nunca se repite y los ya usados se descartan al salir
+	def __init__(self, used_pins: set):
+		self.used_pins = used_pins
+		self.remaining = PIN_SPACE
+		self.swaps = {}
+
+	def __iter__(self):
+		return self
+
+	def __next__(self) -> str:
+		while self.remaining:
+			index = secrets.randbelow(self.remaining)
+			last = self.remaining - 1
+			value = self.swaps.get(index, index)
+			self.swaps[index] = self.swaps.pop(last, last)
+			self.remaining = last
+			pin = f"{value:06d}"
+			if pin not in self.used_pins:
+				self.used_pins.add(pin)
+				return pin
+		raise HTTPException(status_code=400, detail="No quedan PINs disponibles en esta evaluación")
+
+def parse_roster_row(row: dict, names: set, emails: set, orders: set) -> dict:
+	missing = [column for column in ROSTER_COLUMNS if not (row.get(column) or "").strip()]
+	if missing:
+		raise ValueError(f"Faltan columnas: {', '.join(missing)}")
+	name = row["name"].strip()
+	email = row["email"].strip()
+	try:
+		order = int(row["order"])
+		group = int(row["group"])
+	except ValueError:
+		raise ValueError("order y group deben ser números enteros")
+	if name in names:
+		raise ValueError(f"Nombre repetido: {name}")
+	if email in emails:
+		raise ValueError(f"Email repetido: {email}")
+	if order in orders:
+		raise ValueError(f"Orden repetido: {order}")
+	names.add(name)
+	emails.add(email)
+	orders.add(order)
+	return {
+		"name": name,
+		"email": email,
+		"order": order,
+		"group": group,
+		"voteEveryone": (row.get("voteEveryone") or "").strip() == "True" #TODO voteEveryone se tiene que rellenar como "True" para que sea True, con cualquier otro valor será False
+	}
+
+@app.post("/assessment-instance/{ID}/users/upload/token={token}", dependencies=[Depends(require_admin)])
+def add_users_from_csv(ID: int, file: UploadFile = File(...), session: Session = Depends(get_session)):
 	try:
 		assessmentInstance = session.query(AssessmentInstance).filter(AssessmentInstance.id == ID).first()
 		if not assessmentInstance:
 			raise HTTPException(status_code=404, detail="Evaluación no encontrada")
 
-		content = await file.read()
-		file_content = StringIO(content.decode("utf-8"))
-		csv_reader = csv.DictReader(file_content)
-
-		for row in csv_reader:
-			unique_pin = generate_unique_pin(session, assessmentInstance.id)
-			new_user = User(
-				name=row["name"],
-				email=row["email"],
-				assessment_instance_id=assessmentInstance.id,
-				order=row["order"],
-				group=row["group"],
-				pin=unique_pin,
-				voteEveryone=row["voteEveryone"] == "True" #TODO voteEveryone se tiene que rellenar como "True" para que sea True, con cualquier otro valor será False
-			)
-			session.add(new_user)
-			session.flush()
+		existing = session.query(User.name, User.email, User.order).filter(User.assessment_instance_id == ID).all()
+		names = {user.name for user in existing}
+		emails = {user.email for user in existing}
+		orders = {user.order for user in existing}
+		# El login es solo por PIN y puede haber varias evaluaciones activas: los PINs no
+		# se repiten entre evaluaciones que aún no han terminado
+		pins = PinGenerator({
+			pin for pin, in session.query(User.pin)
+			.join(AssessmentInstance, User.assessment_instance_id == AssessmentInstance.id)
+			.filter(AssessmentInstance.finished.isnot(True))
+		})
+
+		now = datetime.now()
+		new_users = []
+		errors = []
+		file_content = TextIOWrapper(file.file, encoding="utf-8-sig", newline="")
+		try:
+			for row_number, row in enumerate(csv.DictReader(file_content), start=2):
+				try:
+					user_data = parse_roster_row(row, names, emails, orders)
+				except ValueError as e:
+					errors.append({"row": row_number, "error": str(e)})
+					continue
+				user_data.update(assessment_instance_id=ID, pin=next(pins), createdAt=now, updatedAt=now)
+				new_users.append(user_data)
+		finally:
+			file_content.detach()
 
+		if errors:
+			raise HTTPException(status_code=400, detail={"message": "El CSV contiene filas no válidas", "errors": errors})
+		if new_users:
+			session.execute(insert(User), new_users)
 		session.commit()
+		if assessmentInstance.active:
+			from_thread.run(instance_changed, ID)
 
-		return {"detail": "Usuarios guardados correctamente"}
+		return {"detail": "Usuarios guardados correctamente", "created": len(new_users)}
 	except HTTPException as e:
 		raise e
+	except UnicodeDecodeError:
+		raise HTTPException(status_code=400, detail="El CSV debe estar codificado en UTF-8")
 	except Exception as e:
 		session.rollback()
 		raise HTTPException(status_code=500, detail=f"Error al guardar usuarios: {str(e)}")
-	finally:
-		session.close()
 
-@app.delete("/assessment-instance/{ID}/delete/token={token}")
-async def delete_assessment_instance_by_ID(token: str, ID: int):
-	await check_is_admin(token)
+@app.delete("/assessment-instance/{ID}/delete/token={token}", dependencies=[Depends(require_admin)])
+def delete_assessment_instance_by_ID(ID: int, session: Session = Depends(get_session)):
 	try:
 		assessmentInstance = session.query(AssessmentInstance).filter(AssessmentInstance.id == ID).first()
 		if not assessmentInstance:
@@ -870,6 +843,7 @@ async def delete_assessment_instance_by_ID(token: str, ID: int):
 
 		session.delete(assessmentInstance)
 		session.commit()
+		from_thread.run(instance_changed, ID, True)
 
 		return {"detail": "Evaluación eliminada correctamente"}
 	except HTTPException as e:
@@ -877,223 +851,272 @@ async def delete_assessment_instance_by_ID(token: str, ID: int):
 	except Exception as e:
 		session.rollback()
 		raise HTTPException(status_code=500, detail=f"Error al eliminar la evaluación: {str(e)}")
-	finally:
-		session.close()
+
+def activate_assessment_instance(session: Session, id: int):
+	assessmentInstance = session.query(AssessmentInstance).filter(AssessmentInstance.id == id).first()
+	if not assessmentInstance:
+		raise WebSocketException(code=1003, reason="Evaluación no encontrada")
+	if assessmentInstance.active is True:
+		raise WebSocketException(code=1003, reason="Evaluación ya está activa")
+	if assessmentInstance.finished is True:
+		raise WebSocketException(code=1003, reason="Evaluación ya está finalizada")
+	# Varias evaluaciones pueden estar activas a la vez, pero el login es solo por PIN
+	pins = session.query(User.pin).filter(User.assessment_instance_id == id)
+	shared_pin = (
+		session.query(User.id)
+		.join(AssessmentInstance, User.assessment_instance_id == AssessmentInstance.id)
+		.filter(AssessmentInstance.active == True, User.pin.in_(pins.scalar_subquery()))
+		.first()
+	)
+	if shared_pin:
+		raise WebSocketException(code=1003, reason="Algún PIN coincide con el de otra evaluación activa")
+	assessmentInstance.active = True
+	users = session.query(User).filter(User.assessment_instance_id == id).all()
+	sorted_users = sorted(users, key=lambda user: user.order)
+	filtered_users = [user for user in sorted_users if user.order != -1]
+	assessmentInstance.actual_user_id = filtered_users[0].id
+	return {
+		"mode": "LOBBY",
+		"assessment_instance_id": id,
+		"actual_user_id": assessmentInstance.actual_user_id,
+		"actual_user_name": filtered_users[0].name,
+	}
+
+def deactivate_assessment_instance(session: Session, id: int):
+	session.query(AssessmentInstance).filter(AssessmentInstance.id == id).update({AssessmentInstance.active: False})
 
 @app.websocket("/assessment-instance/{id}/start/token={token}")
 async def start_assessment_instance(websocket: WebSocket,id: int, token: str):
-	await manager.connect(websocket, is_admin=True)
-	await check_is_admin(token)
+	authenticate_websocket(token, admin=True)
+	bind_instance(id)
+	await manager.connect(websocket, is_admin=True, room=id)
 	try:
-		assessmentInstance = session.query(AssessmentInstance).filter(AssessmentInstance.id == id).first()
-		if not assessmentInstance:
-			raise WebSocketException(code=1003, reason="Evaluación no encontrada")
-		if assessmentInstance.active is True:
-			raise WebSocketException(code=1003, reason="Evaluación ya está activa")
-		if assessmentInstance.finished is True:
-			raise WebSocketException(code=1003, reason="Evaluación ya está finalizada")
-		active_assessment_instance = session.query(AssessmentInstance).filter(AssessmentInstance.active == True).first()
-		if active_assessment_instance:
-			raise WebSocketException(code=1003, reason="Ya hay una evaluación activa")
-		assessmentInstance.active = True
-		users = session.query(User).filter(User.assessment_instance_id == id).all()
-		sorted_users = sorted(users, key=lambda user: user.order)
-		filtered_users = [user for user in sorted_users if user.order != -1]
-		assessmentInstance.actual_user_id = filtered_users[0].id
-		session.commit()
-		info = {
-			"mode": "LOBBY",
-			"assessment_instance_id": id,
-			"actual_user_id": assessmentInstance.actual_user_id,
-			"actual_user_name": filtered_users[0].name,
-		}
+		info = await run_db(activate_assessment_instance, id)
+		await instance_changed(id)
 		info_json = json.dumps(info)
-		print(info_json)
+		logger.info("Evaluación iniciada", extra={"actual_user_id": info.get("actual_user_id")})
 		await manager.send_personal_message(info_json, websocket=websocket)
 		try:
 			while True:
 				message = await manager.receive_text(websocket)
 				if message == "CLOSE":
-					assessmentInstance.active = False
-					session.commit()
-					info = {
-						"event": "CLOSE",
-					}
-					info_json = json.dumps(info)
-					await manager.broadcast_admin(info_json)
-					await manager.broadcast_users(info_json)
-					await manager.disconnect(websocket, is_admin=True)
+					await run_db(deactivate_assessment_instance, id)
+					await instance_changed(id, revoke=True)
+					info_json = await events.build_async(CLOSE, assessment_instance_id=id)
+					await manager.broadcast_admin(info_json, room=id)
+					await manager.broadcast_users(info_json, room=id)
+					manager.disconnect(websocket, is_admin=True)
 					break
 				if message == "START":
-					info = {
-						"mode": "PLAYING",
-						"event": "REFRESH"
-					}
-					info_json = json.dumps(info)
-					await manager.broadcast_admin(info_json)
-					await manager.broadcast_users(info_json)
+					live = await run_db(live_sessions.get, id)
+					if not live:
+						continue
+					seq = await events.allocate_seq()
+					await manager.broadcast_admin(events.build(START, mode="PLAYING", seq=seq, actual_user_id=live.actual_user_id), room=id)
+					# Cada alumno recibe ya su vista de la ronda y no necesita pedir la instantánea
+					await manager.send_to_users({
+						user.id: events.build(START, mode="PLAYING", seq=seq, snapshot=live_snapshot(live, user, seq))
+						for user in live.users
+					})
 		except WebSocketDisconnect:
 			manager.disconnect(websocket, is_admin=True)
 	except HTTPException as e:
 		raise e
 	except Exception as e:
-		session.rollback()
-		print("/start", e)
+		logger.exception("Error en el websocket del administrador")
 		raise HTTPException(status_code=500, detail=f"Error al iniciar la evaluación: {str(e)}")
-	finally:
-		session.close()
 
 @app.post("/next/token={token}")
-async def next_user_assessment_instance(token: str):
-	await check_is_admin(token)
+@app.post("/assessment-instance/{ID}/next/token={token}")
+def next_user_assessment_instance(ID: Optional[int] = None, claims: TokenClaims = Depends(require_admin), session: Session = Depends(get_session)):
 	try:
-		assessmentInstance = session.query(AssessmentInstance).filter(AssessmentInstance.active == True).first()
-		if not assessmentInstance:
-			raise HTTPException(status_code=404, detail="No hay evaluación activa")
+		live = resolve_live_session(session, claims, ID)
+		room = live.assessment_instance_id
 
-		current_user = session.query(User).filter(User.id == assessmentInstance.actual_user_id).first()
-		if not current_user:
+		if not live.actual_user:
 			raise HTTPException(status_code=404, detail="No hay usuario actual")
-		print('current user', current_user.order)
-		assessment_users = session.query(User).filter(User.assessment_instance_id == assessmentInstance.id).all()
-		assessment_users = sorted(assessment_users, key=lambda user: user.order)
-		assessment_users = filter(lambda user: user.order != -1, assessment_users)
-		next_user = None
-		for user in assessment_users:
-			if user.order > current_user.order:
-				next_user = user
-				break
+		next_user = live.next_user()
 		if not next_user:
-			assessmentInstance.actual_user_id = None
-			assessmentInstance.active = False
-			assessmentInstance.finished = True
+			session.query(AssessmentInstance).filter(AssessmentInstance.id == live.assessment_instance_id).update({
+				AssessmentInstance.actual_user_id: None,
+				AssessmentInstance.active: False,
+				AssessmentInstance.finished: True,
+			})
 			session.commit()
-			info = {
-				"mode": "END",
-				"event": "FINISH",
-			}
-			info_json = json.dumps(info)
-			await manager.broadcast_admin(info_json)
-			await manager.broadcast_users(info_json)
+			from_thread.run(instance_changed, room, True)
+			info_json = events.build(FINISH, mode="END", assessment_instance_id=room)
+			from_thread.run(manager.broadcast_admin, info_json, room)
+			from_thread.run(manager.broadcast_users, info_json, room)
 			return {"detail": "Fin de la evaluación"}
 		else:
-			assessmentInstance.actual_user_id = next_user.id
+			session.query(AssessmentInstance).filter(AssessmentInstance.id == live.assessment_instance_id).update({
+				AssessmentInstance.actual_user_id: next_user.id,
+			})
 			session.commit()
-			info = {
-				"mode": "LOBBY",
-				"event": "REFRESH",
-			}
-			info_json = json.dumps(info)
-			await manager.broadcast_admin(info_json)
-			await manager.broadcast_users(info_json)
+			from_thread.run(instance_changed, room)
+			seq = events.next_seq()
+			info_json = events.build(NEXT, mode="LOBBY", seq=seq, actual_user_id=next_user.id, actual_user_name=next_user.name)
+			from_thread.run(manager.broadcast_admin, info_json, room)
+			# Como en START, cada alumno recibe su vista de la nueva ronda con el evento
+			next_live = live.with_actual_user(next_user.id)
+			from_thread.run(manager.send_to_users, {
+				user.id: events.build(NEXT, mode="PLAYING", seq=seq, actual_user_id=next_user.id, actual_user_name=next_user.name, snapshot=live_snapshot(next_live, user, seq))
+				for user in next_live.users
+			})
 		return {"detail": "Siguiente usuario"}
 	except HTTPException as e:
 		raise e
 	except Exception as e:
 		session.rollback()
-		print(e)
+		logger.exception("Error al pasar al siguiente usuario")
 		raise HTTPException(status_code=500, detail=f"Error al pasar al siguiente usuario: {str(e)}")
-	finally:
-		session.close()
 
 # RUTAS DE USUARIOS
 @app.post("/user-login")
-async def login(input_data: JSON_User_Login):
-	active_assessment_instance = session.query(AssessmentInstance).filter(AssessmentInstance.active == True).first()
-	if not active_assessment_instance:
+def login(input_data: JSON_User_Login, session: Session = Depends(get_session)):
+	if not live_sessions.active_ids(session):
 		raise HTTPException(status_code=404, detail="No hay evaluación activa")
 	trim_pin = input_data.pin.strip()
-	user = session.query(User).filter(User.pin == trim_pin, User.assessment_instance_id == active_assessment_instance.id).first()
-	if not user:
+	matches = live_sessions.find_by_pin(session, trim_pin)
+	if not matches:
 		raise HTTPException(status_code=404, detail="Usuario no encontrado")
+	if len(matches) > 1:
+		raise HTTPException(status_code=409, detail="El PIN está en varias evaluaciones activas")
+	live, user = matches[0]
 
-	token = jwt.encode({"user_id": user.id}, settings.jwt_secret, algorithm="HS256")
+	token = auth.issue_user_token(user.id, live.assessment_instance_id)
 	return {"detail": "Autenticación exitosa", "token": token}
 
 @app.websocket("/play/token={token}")
 async def play(websocket: WebSocket, token: str):
+	claims = authenticate_websocket(token)
+	user_id = claims.user_id
+	room = claims.assessment_instance_id
+	bind_instance(room)
 	try:
-		await manager.connect(websocket)
-		user_id = await get_token_user_id(token)
+		await manager.connect(websocket, user_id=user_id, room=room)
 		info = {
 				"mode": "LOBBY",
 			}
 		info_json = json.dumps(info)
 		await manager.send_personal_message(info_json, websocket=websocket)
-		user = session.query(User).filter(User.id == user_id).first()
+		user = await run_db(lambda session: session.query(User).filter(User.id == user_id).first())
 		if not user:
 			raise WebSocketException(code=1003, reason="Usuario no encontrado")
-		user = {
-			"mode": "LOBBY",
-			"event": "CONNECT",
-			"user_id": user_id,
-			"name": user.name,
-		}
-		user_json = json.dumps(user)
-		await manager.broadcast_admin(user_json)
+		user_json = await events.build_async(CONNECT, mode="LOBBY", user_id=user_id, name=user.name)
+		await manager.broadcast_admin(user_json, room=room)
 		#  si se desconectam enviar mensaje
 
 		while True:
 			message = await manager.receive_text(websocket)
 			if message == "CLOSE":
-				await manager.disconnect(websocket)
+				manager.disconnect(websocket)
 				break
 	except WebSocketDisconnect:
-		manager.disconnect(websocket)
-		info = {
-			"event": "DISCONNECT",
-			"user_id": user_id
-		}
-		info_json = json.dumps(info)
-		await manager.broadcast_admin(info_json)
+		# Si el alumno ya se ha reconectado, su socket anterior se expulsó y el
+		# administrador no debe verlo desconectado
+		if manager.disconnect(websocket):
+			info_json = await events.build_async(DISCONNECT, user_id=user_id)
+			await manager.broadcast_admin(info_json, room=room)
 	except HTTPException as e:
 		raise e
 	except Exception as e:
-		print("/play", e)
+		logger.exception("Error en el websocket del alumno", extra={"user_id": user_id})
 		raise HTTPException(status_code=500, detail=f"Error al iniciar la evaluación: {str(e)}")
-	finally:
-		session.close()
+
+def upsert_answers(session: Session, assessment_instance_id: int, grading_user_id: int, graded_user_id: int, answers: List[JSON_Answer_Input]):
+	# Una sola sentencia INSERT ... ON CONFLICT para todo el envío: si el usuario
+	# reenvía sus respuestas se sobrescriben en lugar de violar la restricción única
+	if not answers:
+		return
+	now = datetime.now()
+	rows = {
+		answer_data.question_id: {
+			"assessment_instance_id": assessment_instance_id,
+			"question_id": answer_data.question_id,
+			"grading_user_id": grading_user_id,
+			"graded_user_id": graded_user_id,
+			"answerText": answer_data.answerText,
+			"date": now,
+			"createdAt": now,
+			"updatedAt": now,
+		} for answer_data in answers
+	}
+	statement = sqlite_insert(Answer).values(list(rows.values()))
+	statement = statement.on_conflict_do_update(
+		index_elements=[Answer.assessment_instance_id, Answer.question_id, Answer.grading_user_id, Answer.graded_user_id],
+		set_={
+			"answerText": statement.excluded.answerText,
+			"date": statement.excluded.date,
+			"updatedAt": statement.excluded.updatedAt,
+		}
+	)
+	session.execute(statement)
 
 @app.post("/user/answer/token={token}")
-async def add_user_answer(token: str, input_data: JSON_User_Answer_Inputs):
+def add_user_answer(input_data: JSON_User_Answer_Inputs, claims: TokenClaims = Depends(require_user), session: Session = Depends(get_session)):
 	try:
-		user_id = await get_token_user_id(token)
-		assessmentInstance = session.query(AssessmentInstance).filter(AssessmentInstance.active == True).first()
-		if not assessmentInstance:
-			raise HTTPException(status_code=404, detail="No hay evaluación activa")
-		user = session.query(User).filter(User.id == user_id, User.assessment_instance_id == assessmentInstance.id).first()
+		live = resolve_live_session(session, claims)
+		user = live.users_by_id.get(claims.user_id)
 		if not user:
 			raise HTTPException(status_code=404, detail="Usuario no encontrado")
 
+		if live.actual_user_id is None or live.actual_user_id == user.id:
+			raise HTTPException(status_code=400, detail="No se puede evaluar al usuario actual")
+
+		invalid_ids = sorted({answer_data.question_id for answer_data in input_data.answers if answer_data.question_id not in live.question_ids})
+		if invalid_ids:
+			raise HTTPException(status_code=400, detail=f"Preguntas no válidas para esta evaluación: {invalid_ids}")
 		for answer_data in input_data.answers:
-			print(answer_data)
-			print(answer_data.question_id)
-			print(answer_data.answerText)
-			new_answer = Answer(
-				assessment_instance_id=assessmentInstance.id,
-				question_id=answer_data.question_id,
-				grading_user_id=user.id,
-				graded_user_id=assessmentInstance.actual_user_id,
-				answerText=answer_data.answerText,
-				date=datetime.now()
-			)
-			session.add(new_answer)
-			session.flush()
+			if answer_data.question_id in live.number_question_ids:
+				normalized = normalize_number(answer_data.answerText)
+				if normalized is None:
+					raise HTTPException(status_code=400, detail=f"La respuesta a la pregunta {answer_data.question_id} no es un número")
+				answer_data.answerText = normalized
+
+		upsert_answers(session, live.assessment_instance_id, user.id, live.actual_user_id, input_data.answers)
 
 		session.commit()
-		info = {
-			"mode": "PLAYING",
-			"event": "REFRESH",
-			"user_id": user_id,
-		}
-		# await manager.send_personal_message(json.dumps(info))
-		await manager.broadcast_admin(json.dumps(info))
+		ANSWERS.inc(amount=len(input_data.answers))
+		logger.debug("Respuestas guardadas", extra={"user_id": user.id, "graded_user_id": live.actual_user_id, "answers": len(input_data.answers)})
+		info_json = events.build(
+			ANSWER,
+			mode="PLAYING",
+			user_id=user.id,
+			grading_user_id=user.id,
+			graded_user_id=live.actual_user_id,
+			answers=[answer_data.model_dump() for answer_data in input_data.answers],
+		)
+		from_thread.run(manager.broadcast_admin, info_json, live.assessment_instance_id)
 		return {"detail": "Respuestas guardadas correctamente"}
 	except HTTPException as e:
 		raise e
 	except Exception as e:
 		session.rollback()
-		print(e)
+		logger.exception("Error al guardar respuestas")
 		raise HTTPException(status_code=500, detail=f"Error al guardar respuestas: {str(e)}")
-	finally:
-		session.close()
+
+# Informe del perfilado de SQL de este worker (ver profiling.py)
+@app.get("/debug/sql/token={token}", dependencies=[Depends(require_admin)])
+def get_sql_profile(reset: bool = False):
+	report = profiler.report()
+	if reset:
+		profiler.reset()
+	return report
+
+# Retraso del event loop de este worker y últimos bloqueos con su pila (ver watchdog.py)
+@app.get("/debug/loop/token={token}", dependencies=[Depends(require_admin)])
+def get_loop_report():
+	return watchdog.report()
+
+# Métricas en formato Prometheus (ver metrics.py)
+@app.get("/metrics", response_class=PlainTextResponse, include_in_schema=False)
+def get_metrics():
+	if not settings.metrics_enabled:
+		raise HTTPException(status_code=404, detail="Métricas desactivadas")
+	return PlainTextResponse(metrics.render(settings.metrics_flush_interval), media_type=METRICS_CONTENT_TYPE)
+
+# Modo producción: el frontend compilado se sirve desde aquí. Tiene que ir al final para
+# que el montaje en "/" no tape ninguna ruta de la API.
+if settings.frontend_dir:
+	mount_frontend(app, settings.frontend_dir)
@@ -0,0 +1,128 @@
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Dict, Optional
+
+import jwt
+from fastapi import Depends, HTTPException, WebSocketException, status
+
+from .config import Settings
+
+settings = Settings()
+
+# Autenticación por token JWT (HS256). Los tokens llevan caducidad ("exp") y fecha de
+# emisión ("iat"); los de alumno llevan además la evaluación para la que se emitieron.
+# Las claims ya verificadas se guardan en una caché LRU acotada con TTL, así que
+# durante la sesión en directo comprobar un token es una búsqueda en un diccionario
+# en lugar de un jwt.decode. Al cerrar una evaluación se revocan los tokens de sus
+# alumnos emitidos hasta ese momento.
+
+ALGORITHM = "HS256"
+
+@dataclass(frozen=True)
+class TokenClaims:
+	is_admin: bool
+	user_id: Optional[int]
+	assessment_instance_id: Optional[int]
+	issued_at: float
+	expires_at: float
+
+class Authenticator:
+	def __init__(self, secret: str, admin_ttl: float, user_ttl: float, cache_size: int, cache_ttl: float):
+		self.secret = secret
+		self.admin_ttl = admin_ttl
+		self.user_ttl = user_ttl
+		self.cache_size = cache_size
+		self.cache_ttl = cache_ttl
+		self._cache: "OrderedDict[str, tuple[TokenClaims, float]]" = OrderedDict()
+		# Evaluación -> instante de cierre: sus tokens emitidos antes quedan revocados
+		self._revoked: Dict[int, float] = {}
+		self._lock = threading.Lock()
+
+	def _encode(self, payload: dict, ttl: float) -> str:
+		now = int(time.time())
+		return jwt.encode({**payload, "iat": now, "exp": now + int(ttl)}, self.secret, algorithm=ALGORITHM)
+
+	def issue_admin_token(self) -> str:
+		return self._encode({"is_admin": True}, self.admin_ttl)
+
+	def issue_user_token(self, user_id: int, assessment_instance_id: int) -> str:
+		return self._encode({"user_id": user_id, "assessment_instance_id": assessment_instance_id}, self.user_ttl)
+
+	def _is_revoked(self, claims: TokenClaims) -> bool:
+		closed_at = self._revoked.get(claims.assessment_instance_id)
+		return closed_at is not None and claims.issued_at <= closed_at
+
+	def verify(self, token: str) -> TokenClaims:
+		if not token:
+			raise HTTPException(status_code=401, detail="Fallo de sesión")
+		now = time.time()
+		with self._lock:
+			cached = self._cache.get(token)
+			if cached is not None:
+				claims, cached_until = cached
+				if now < cached_until and now < claims.expires_at and not self._is_revoked(claims):
+					self._cache.move_to_end(token)
+					return claims
+				del self._cache[token]
+
+		try:
+			payload = jwt.decode(token, self.secret, algorithms=[ALGORITHM], options={"require": ["exp", "iat"]})
+		except jwt.ExpiredSignatureError:
+			raise HTTPException(status_code=401, detail="Sesión caducada")
+		except jwt.InvalidTokenError:
+			raise HTTPException(status_code=401, detail="Fallo de sesión")
+		claims = TokenClaims(
+			is_admin=bool(payload.get("is_admin")),
+			user_id=payload.get("user_id"),
+			assessment_instance_id=payload.get("assessment_instance_id"),
+			issued_at=payload["iat"],
+			expires_at=payload["exp"],
+		)
+
+		with self._lock:
+			if self._is_revoked(claims):
+				raise HTTPException(status_code=401, detail="Sesión revocada")
+			self._cache[token] = (claims, now + self.cache_ttl)
+			self._cache.move_to_end(token)
+			while len(self._cache) > self.cache_size:
+				self._cache.popitem(last=False)
+		return claims
+
+	def revoke_instance(self, assessment_instance_id: int, revoked_at: Optional[float] = None):
+		# Se llama en el event loop por cada cierre que publica cualquier worker: no se
+		# recorre la caché, verify() ya descarta las entradas revocadas al leerlas
+		with self._lock:
+			self._revoked[assessment_instance_id] = revoked_at if revoked_at is not None else time.time()
+
+auth = Authenticator(
+	settings.jwt_secret,
+	admin_ttl=settings.jwt_admin_ttl,
+	user_ttl=settings.jwt_user_ttl,
+	cache_size=settings.token_cache_size,
+	cache_ttl=settings.token_cache_ttl,
+)
+
+# Dependencias compartidas por las rutas: el token va en la ruta ("/token={token}")
+
+def authenticate(token: str) -> TokenClaims:
+	return auth.verify(token)
+
+def require_admin(claims: TokenClaims = Depends(authenticate)) -> TokenClaims:
+	if not claims.is_admin:
+		raise HTTPException(status_code=401, detail="No eres administrador")
+	return claims
+
+def require_user(claims: TokenClaims = Depends(authenticate)) -> TokenClaims:
+	if claims.is_admin:
+		raise HTTPException(status_code=401, detail="Eres administrador")
+	return claims
+
+def authenticate_websocket(token: str, admin: bool = False) -> TokenClaims:
+	# En un websocket no hay respuesta HTTP: un token no válido cierra la conexión
+	try:
+		claims = auth.verify(token)
+		return require_admin(claims) if admin else require_user(claims)
+	except HTTPException as e:
+		raise WebSocketException(code=status.WS_1008_POLICY_VIOLATION, reason=e.detail)
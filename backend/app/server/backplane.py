@@ -0,0 +1,163 @@
+import asyncio
+import itertools
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from collections import defaultdict
+from typing import Callable, Dict, List, Optional
+
+from anyio import to_thread
+
+from .config import Settings
+
+settings = Settings()
+logger = logging.getLogger(__name__)
+
+# Backplane de publicación/suscripción entre procesos. Todo lo que un worker tiene que
+# comunicar a los demás pasa por aquí: los mensajes de websocket (cada worker solo
+# tiene los sockets que ha aceptado), la invalidación del estado en memoria de una
+# evaluación y la revocación de tokens. También reparte los números de secuencia de
+# los eventos para que sean crecientes en todo el servidor y no por proceso.
+#
+# - LocalBackplane: un solo proceso, entrega directa (comportamiento por defecto).
+# - SQLiteBackplane: varios workers en la misma máquina. Los mensajes se añaden a un
+#   registro en un fichero SQLite (WAL) y cada worker lee periódicamente los que han
+#   publicado los demás; los propios se entregan al publicarlos.
+
+# Los handlers se ejecutan en el event loop, también para cada mensaje leído de los
+# demás workers: no pueden consultar la base de datos ni esperar cerrojos que otro
+# hilo mantenga durante una consulta.
+Handler = Callable[[dict], None]
+
+class Backplane:
+	def __init__(self):
+		self._handlers: Dict[str, List[Handler]] = defaultdict(list)
+
+	def subscribe(self, channel: str, handler: Handler):
+		self._handlers[channel].append(handler)
+
+	def _deliver(self, channel: str, data: dict):
+		for handler in self._handlers[channel]:
+			handler(data)
+
+	async def start(self):
+		pass
+
+	async def stop(self):
+		pass
+
+	async def publish(self, channel: str, data: dict):
+		raise NotImplementedError
+
+	def next_seq(self) -> int:
+		raise NotImplementedError
+
+	def last_seq(self) -> int:
+		raise NotImplementedError
+
+	async def allocate_seq(self) -> int:
+		# next_seq() desde el event loop: en SQLite la escritura puede esperar al bloqueo
+		# de otro worker y no debe parar el loop mientras tanto
+		return await to_thread.run_sync(self.next_seq)
+
+class LocalBackplane(Backplane):
+	def __init__(self):
+		super().__init__()
+		self._counter = itertools.count(1)
+		self._last_seq = 0
+
+	async def publish(self, channel: str, data: dict):
+		self._deliver(channel, data)
+
+	def next_seq(self) -> int:
+		self._last_seq = next(self._counter)
+		return self._last_seq
+
+	def last_seq(self) -> int:
+		return self._last_seq
+
+	async def allocate_seq(self) -> int:
+		return self.next_seq()
+
+class SQLiteBackplane(Backplane):
+	def __init__(self, path: str, poll_interval: float = 0.02, retention: float = 60):
+		super().__init__()
+		self.path = path
+		self.poll_interval = poll_interval
+		self.retention = retention
+		self.origin = uuid.uuid4().hex
+		self._lock = threading.Lock()
+		self._last_id = 0
+		self._poller: Optional[asyncio.Task] = None
+		os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+		self._connection = sqlite3.connect(path, timeout=30, isolation_level=None, check_same_thread=False)
+		self._connection.execute("PRAGMA journal_mode=WAL")
+		self._connection.execute("PRAGMA synchronous=NORMAL")
+		self._connection.execute(
+			"CREATE TABLE IF NOT EXISTS event_log ("
+			"id INTEGER PRIMARY KEY AUTOINCREMENT, origin TEXT NOT NULL, channel TEXT NOT NULL, "
+			"payload TEXT NOT NULL, created REAL NOT NULL)"
+		)
+		self._connection.execute("CREATE TABLE IF NOT EXISTS sequence (id INTEGER PRIMARY KEY CHECK (id = 1), value INTEGER NOT NULL)")
+		self._connection.execute("INSERT OR IGNORE INTO sequence (id, value) VALUES (1, 0)")
+
+	def _execute(self, sql: str, parameters=()) -> list:
+		with self._lock:
+			return self._connection.execute(sql, parameters).fetchall()
+
+	async def start(self):
+		self._last_id = self._execute("SELECT COALESCE(MAX(id), 0) FROM event_log")[0][0]
+		self._poller = asyncio.create_task(self._poll())
+
+	async def stop(self):
+		if self._poller is not None:
+			self._poller.cancel()
+			self._poller = None
+
+	async def publish(self, channel: str, data: dict):
+		payload = json.dumps(data)
+		await to_thread.run_sync(
+			self._execute,
+			"INSERT INTO event_log (origin, channel, payload, created) VALUES (?, ?, ?, ?)",
+			(self.origin, channel, payload, time.time()),
+		)
+		self._deliver(channel, data)
+
+	def _read(self) -> list:
+		rows = self._execute("SELECT id, origin, channel, payload FROM event_log WHERE id > ? ORDER BY id", (self._last_id,))
+		if rows:
+			self._last_id = rows[-1][0]
+		return rows
+
+	async def _poll(self):
+		last_prune = time.monotonic()
+		while True:
+			await asyncio.sleep(self.poll_interval)
+			try:
+				for _, origin, channel, payload in await to_thread.run_sync(self._read):
+					if origin != self.origin:
+						self._deliver(channel, json.loads(payload))
+				if time.monotonic() - last_prune > self.retention:
+					last_prune = time.monotonic()
+					await to_thread.run_sync(self._execute, "DELETE FROM event_log WHERE created < ?", (time.time() - self.retention,))
+			except asyncio.CancelledError:
+				raise
+			except Exception:
+				logger.exception("Error al leer el backplane")
+
+	def next_seq(self) -> int:
+		return self._execute("UPDATE sequence SET value = value + 1 WHERE id = 1 RETURNING value")[0][0]
+
+	def last_seq(self) -> int:
+		return self._execute("SELECT value FROM sequence WHERE id = 1")[0][0]
+
+def create_backplane() -> Backplane:
+	if settings.backplane == "sqlite":
+		return SQLiteBackplane(settings.backplane_path, settings.backplane_poll_interval, settings.backplane_retention)
+	return LocalBackplane()
+
+backplane = create_backplane()
@@ -0,0 +1,291 @@
+import base64
+import io
+import json
+import os
+import zipfile
+from datetime import datetime
+from typing import Dict, Iterable, Iterator, List, Literal, Optional, Set
+
+from fastapi import UploadFile
+from fastapi.responses import StreamingResponse
+from sqlalchemy import insert
+from sqlalchemy.orm import Session, selectinload
+
+from .database import session_scope
+from .db_config import Assessment, Image, Question
+from .export import CHUNK_SIZE, _ChunkWriter
+from .images import is_local, localize_images, store as image_store
+
+# Importación y exportación masiva de evaluaciones.
+#
+# - .lgqz: una evaluación en JSON. Se aceptan los dos dialectos que circulan: el que
+#   exporta la aplicación (questionType, selectOptions) y el de los ejemplos
+#   (answers con isCorrect, allocatedTime, weight), que se importa como preguntas de
+#   tipo "select" con las respuestas como opciones.
+# - .lgqzl: formato propio de lotes, una evaluación .lgqz por línea (JSON Lines).
+# - .zip: cualquier combinación de los anteriores.
+#
+# Los ficheros se leen de uno en uno (los .lgqzl línea a línea) y las evaluaciones se
+# insertan en lotes con executemany, con un commit por lote. Los títulos existentes se
+# cargan una sola vez. El resultado es un informe por fichero.
+#
+# La exportación genera un .zip con un .lgqz por evaluación o un .lgqzl, en streaming.
+# Las imágenes locales se exportan con su URL de origen o, si se subieron, como data:
+# URL, para que el fichero sirva en otro servidor.
+
+BundleFormat = Literal["zip", "lgqzl"]
+DuplicatePolicy = Literal["skip", "rename"]
+
+EXTENSIONS = (".lgqz", ".lgqzl", ".zip")
+BATCH_QUESTIONS = 5000
+EXPORT_BATCH = 200
+
+MEDIA_TYPES = {
+	"zip": "application/zip",
+	"lgqzl": "application/x-ndjson",
+}
+
+class BundleError(ValueError):
+	pass
+
+def _text(value, field: str) -> str:
+	if not isinstance(value, str) or not value.strip():
+		raise BundleError(f"Falta el campo {field}")
+	return value
+
+def parse_assessment(data) -> dict:
+	if not isinstance(data, dict):
+		raise BundleError("No es una evaluación")
+	raw_questions = data.get("questions")
+	if not isinstance(raw_questions, list) or not raw_questions:
+		raise BundleError("La evaluación no tiene preguntas")
+
+	questions = []
+	for order, raw in enumerate(raw_questions):
+		if not isinstance(raw, dict):
+			raise BundleError(f"Pregunta {order + 1} no válida")
+		if "answers" in raw and "questionType" not in raw:
+			# Dialecto de los ejemplos: respuestas de test
+			question_type = "select"
+			options = [{"title": _text(answer.get("title") if isinstance(answer, dict) else None, "answers.title")} for answer in raw["answers"] or []]
+		else:
+			question_type = raw.get("questionType")
+			if question_type not in ("text", "number", "select"):
+				raise BundleError(f"Pregunta {order + 1}: tipo de pregunta no válido")
+			options = [{"title": _text(option.get("title") if isinstance(option, dict) else None, "selectOptions.title")} for option in raw.get("selectOptions") or []]
+		question_order = raw.get("questionOrder", order)
+		if not isinstance(question_order, int):
+			raise BundleError(f"Pregunta {order + 1}: orden no válido")
+		if question_type == "select" and not options:
+			raise BundleError(f"Pregunta {order + 1}: una pregunta de selección necesita opciones")
+		questions.append({
+			"title": _text(raw.get("title"), "title"),
+			"image": raw.get("image") or None,
+			"questionType": question_type,
+			"questionOrder": question_order,
+			"selectOptions": options,
+		})
+	return {
+		"title": _text(data.get("title"), "title").strip(),
+		"image": data.get("image") or None,
+		"questions": questions,
+	}
+
+def _documents(name: str, file) -> Iterator[tuple]:
+	# (nombre, dict | excepción) por evaluación, sin cargar el fichero entero
+	extension = os.path.splitext(name)[1].lower()
+	if extension == ".lgqz":
+		try:
+			yield name, json.load(io.TextIOWrapper(file, encoding="utf-8-sig"))
+		except (ValueError, UnicodeDecodeError) as e:
+			yield name, BundleError(f"JSON no válido: {e}")
+	elif extension == ".lgqzl":
+		for number, line in enumerate(io.TextIOWrapper(file, encoding="utf-8-sig"), start=1):
+			if line.strip():
+				try:
+					yield f"{name}:{number}", json.loads(line)
+				except ValueError as e:
+					yield f"{name}:{number}", BundleError(f"JSON no válido: {e}")
+	elif extension == ".zip":
+		try:
+			archive = zipfile.ZipFile(file)
+		except zipfile.BadZipFile:
+			yield name, BundleError("Archivo .zip no válido")
+			return
+		with archive:
+			for member in archive.infolist():
+				if not member.is_dir() and member.filename.lower().endswith((".lgqz", ".lgqzl")):
+					with archive.open(member) as content:
+						yield from _documents(f"{name}/{member.filename}", content)
+	else:
+		yield name, BundleError(f"Extensión no admitida (se esperaba {', '.join(EXTENSIONS)})")
+
+class Importer:
+	def __init__(self, session: Session, duplicates: DuplicatePolicy = "skip", localize: bool = True):
+		self.session = session
+		self.duplicates = duplicates
+		self.localize = localize
+		self.titles: Set[str] = {title for title, in session.query(Assessment.title)}
+		self.pending: List[dict] = []
+		self.pending_questions = 0
+
+	def _unique_title(self, title: str) -> Optional[str]:
+		if title not in self.titles:
+			return title
+		if self.duplicates == "skip":
+			return None
+		copy = 2
+		while f"{title} ({copy})" in self.titles:
+			copy += 1
+		return f"{title} ({copy})"
+
+	def add(self, assessment: dict) -> Optional[str]:
+		# Devuelve el título con el que se importará, o None si se descarta por repetido
+		title = self._unique_title(assessment["title"])
+		if title is None:
+			return None
+		self.titles.add(title)
+		self.pending.append({**assessment, "title": title})
+		self.pending_questions += len(assessment["questions"])
+		if self.pending_questions >= BATCH_QUESTIONS:
+			self.flush()
+		return title
+
+	def flush(self):
+		if not self.pending:
+			return
+		images: Dict[str, str] = {}
+		if self.localize:
+			images = localize_images(self.session, (
+				image for assessment in self.pending
+				for image in [assessment["image"]] + [question["image"] for question in assessment["questions"]]
+			))
+		now = datetime.now()
+		ids = self.session.scalars(
+			insert(Assessment).returning(Assessment.id, sort_by_parameter_order=True),
+			[
+				{"title": assessment["title"], "image": images.get(assessment["image"], assessment["image"]), "archived": False, "createdAt": now, "updatedAt": now}
+				for assessment in self.pending
+			],
+		).all()
+		self.session.execute(insert(Question), [
+			{**question, "assessment_id": assessment_id, "image": images.get(question["image"], question["image"]), "createdAt": now, "updatedAt": now}
+			for assessment_id, assessment in zip(ids, self.pending)
+			for question in assessment["questions"]
+		])
+		self.session.commit()
+		self.pending = []
+		self.pending_questions = 0
+
+def import_files(session: Session, files: Iterable[UploadFile], duplicates: DuplicatePolicy = "skip", localize: bool = True) -> List[dict]:
+	importer = Importer(session, duplicates, localize)
+	report = []
+	for upload in files:
+		name = os.path.basename(upload.filename or "")
+		entry = {"file": name, "assessments": 0, "questions": 0, "skipped": [], "errors": []}
+		for source, document in _documents(name, upload.file):
+			try:
+				if isinstance(document, Exception):
+					raise document
+				assessment = parse_assessment(document)
+			except BundleError as e:
+				entry["errors"].append({"source": source, "detail": str(e)})
+				continue
+			if importer.add(assessment) is None:
+				entry["skipped"].append(assessment["title"])
+				continue
+			entry["assessments"] += 1
+			entry["questions"] += len(assessment["questions"])
+		report.append(entry)
+	importer.flush()
+	return report
+
+def _portable_image(value: Optional[str], sources: Dict[str, Optional[str]]) -> Optional[str]:
+	if not is_local(value):
+		return value
+	digest = value.rsplit("/", 1)[1]
+	if sources.get(digest):
+		return sources[digest]
+	try:
+		with open(image_store.path(digest), "rb") as file:
+			data = file.read()
+	except FileNotFoundError:
+		return None
+	return f"data:{image_store.media_type(digest)};base64,{base64.b64encode(data).decode()}"
+
+def _exported(archived: Optional[bool]) -> Iterator[dict]:
+	with session_scope() as session:
+		# Solo la versión vigente de cada evaluación: las anteriores tienen el mismo título
+		query = session.query(Assessment.id).filter(Assessment.actual_assessment_id.is_(None)).order_by(Assessment.id)
+		if archived is not None:
+			query = query.filter(Assessment.archived.is_(archived))
+		ids = [assessment_id for assessment_id, in query]
+		for start in range(0, len(ids), EXPORT_BATCH):
+			batch = (
+				session.query(Assessment)
+				.options(selectinload(Assessment.questions))
+				.filter(Assessment.id.in_(ids[start:start + EXPORT_BATCH]))
+				.order_by(Assessment.id)
+				.all()
+			)
+			digests = {
+				value.rsplit("/", 1)[1]
+				for assessment in batch
+				for value in [assessment.image] + [question.image for question in assessment.questions]
+				if is_local(value)
+			}
+			sources = dict(session.query(Image.digest, Image.source).filter(Image.digest.in_(digests))) if digests else {}
+			for assessment in batch:
+				yield {
+					"title": assessment.title,
+					"image": _portable_image(assessment.image, sources),
+					"questions": [
+						{
+							"title": question.title,
+							"image": _portable_image(question.image, sources),
+							"questionType": question.questionType,
+							"questionOrder": question.questionOrder,
+							"selectOptions": [{"title": option["title"]} for option in question.selectOptions or []],
+						}
+						for question in sorted(assessment.questions, key=lambda question: question.questionOrder)
+					],
+				}
+			session.expunge_all()
+
+def _lgqzl_chunks(assessments: Iterator[dict]) -> Iterator[bytes]:
+	buffer = []
+	size = 0
+	for assessment in assessments:
+		line = (json.dumps(assessment, ensure_ascii=False) + "\n").encode("utf-8")
+		buffer.append(line)
+		size += len(line)
+		if size >= CHUNK_SIZE:
+			yield b"".join(buffer)
+			buffer = []
+			size = 0
+	if buffer:
+		yield b"".join(buffer)
+
+def _zip_chunks(assessments: Iterator[dict]) -> Iterator[bytes]:
+	output = _ChunkWriter()
+	names = set()
+	with zipfile.ZipFile(output, "w", compression=zipfile.ZIP_DEFLATED) as archive:
+		for assessment in assessments:
+			name = "".join(character if character.isalnum() or character in " -_" else "_" for character in assessment["title"]).strip() or "evaluacion"
+			unique, copy = name, 2
+			while unique in names:
+				unique, copy = f"{name} ({copy})", copy + 1
+			names.add(unique)
+			archive.writestr(f"{unique}.lgqz", json.dumps(assessment, ensure_ascii=False))
+			if output.size >= CHUNK_SIZE:
+				yield output.drain()
+	yield output.drain()
+
+def bundle_response(format: BundleFormat, archived: Optional[bool] = None) -> StreamingResponse:
+	assessments = _exported(archived)
+	content = _zip_chunks(assessments) if format == "zip" else _lgqzl_chunks(assessments)
+	return StreamingResponse(
+		content,
+		media_type=MEDIA_TYPES[format],
+		headers={"Content-Disposition": f"attachment; filename=evaluaciones.{format}"},
+	)
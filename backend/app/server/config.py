@@ -1,4 +1,5 @@
 import os
+from typing import Dict, List, Literal
 
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
@@ -9,4 +10,50 @@ class Settings(BaseSettings):
     admin_user: str = "admin"
     admin_password: str = "1234"
     jwt_secret: str = "hola"
-
+    database_url: str = "sqlite:///app/db/local.db"
+    db_pool_size: int = 10
+    db_max_overflow: int = 20
+    db_pool_timeout: float = 30
+    db_pool_pre_ping: bool = True
+    ws_send_timeout: float = 5
+    ws_queue_size: int = 64
+    jwt_admin_ttl: float = 12 * 3600
+    jwt_user_ttl: float = 6 * 3600
+    token_cache_size: int = 4096
+    token_cache_ttl: float = 300
+    backplane: Literal["local", "sqlite"] = "local"
+    backplane_path: str = "app/db/backplane.db"
+    backplane_poll_interval: float = 0.02
+    backplane_retention: float = 60
+    # Puertos desde los que se sirve el frontend: el servidor de desarrollo (3000) y, en
+    # modo producción, el de la propia API. Se aceptan peticiones CORS desde cualquier
+    # host con esos puertos (la página se puede abrir por IP o por nombre)
+    cors_ports: List[int] = [3000]
+    # Directorio del frontend compilado que sirve la API (modo producción); vacío para no servirlo
+    frontend_dir: str = ""
+    image_dir: str = "app/db/images"
+    image_max_bytes: int = 10 * 1024 * 1024
+    image_fetch_timeout: float = 10
+    image_widths: List[int] = [320, 640, 1280]
+    # Perfilado de SQL: fracción de peticiones perfiladas; en modo debug, todas y con cabeceras X-DB-*
+    profiling_sample_rate: float = 0.01
+    profiling_debug: bool = False
+    profiling_n_plus_one: int = 5
+    profiling_slowest: int = 5
+    metrics_enabled: bool = True
+    # Con varios workers, directorio donde cada uno vuelca sus métricas para sumarlas en /metrics
+    metrics_dir: str = ""
+    metrics_flush_interval: float = 5
+    # Vigilancia del event loop: cada cuánto se mide el retraso y a partir de cuánto se captura la pila
+    loop_watchdog_enabled: bool = True
+    loop_watchdog_interval: float = 0.025
+    loop_watchdog_threshold: float = 0.05
+    # Registro: nivel general, niveles por módulo ({"server.api": "DEBUG"}) y fichero rotativo en JSON
+    log_level: str = "INFO"
+    log_levels: Dict[str, str] = {"httpx": "WARNING", "httpcore": "WARNING"}
+    log_file: str = "app/logs/server.log"
+    log_max_bytes: int = 10 * 1024 * 1024
+    log_backups: int = 5
+    log_console: bool = True
+    # Un fichero por proceso (server.<pid>.log) cuando hay varios workers
+    log_per_process: bool = False
@@ -0,0 +1,171 @@
+import asyncio
+import time
+from dataclasses import dataclass, field
+from typing import Dict, Optional, Set
+
+from fastapi import WebSocket
+from pydantic import Json
+from starlette.websockets import WebSocketState
+
+from .backplane import Backplane, LocalBackplane
+from .metrics import BROADCAST_SECONDS, WS_CONNECTIONS, WS_SEND_FAILURES
+
+WS_CHANNEL = "ws"
+
+@dataclass(eq=False)
+class Connection:
+	websocket: WebSocket
+	is_admin: bool
+	user_id: Optional[int]
+	queue: asyncio.Queue
+	room: Optional[int] = None
+	sender: Optional[asyncio.Task] = field(default=None, repr=False)
+
+@dataclass
+class Room:
+	admin_connections: Dict[int, Connection] = field(default_factory=dict)
+	user_connections: Dict[int, Connection] = field(default_factory=dict)
+
+	def role_connections(self, is_admin: bool) -> Dict[int, Connection]:
+		return self.admin_connections if is_admin else self.user_connections
+
+class ConnectionManager:
+	# Registro de websockets indexado por rol y por usuario. Cada conexión tiene una
+	# cola de salida acotada y una tarea que la vacía con un timeout por envío, así
+	# que un broadcast solo encola: un alumno lento o medio caído no retrasa al resto.
+	# Las conexiones cuya cola se llena o cuyo envío falla se expulsan. Cada conexión
+	# pertenece a la sala de su evaluación y los broadcasts con sala solo llegan a ella.
+	# Los envíos se publican en el backplane para que lleguen también a los sockets
+	# aceptados por otros workers; cada worker los entrega a los suyos.
+	def __init__(self, send_timeout: float = 5.0, queue_size: int = 64, backplane: Optional[Backplane] = None):
+		self.send_timeout = send_timeout
+		self.queue_size = queue_size
+		self.backplane = backplane or LocalBackplane()
+		self.backplane.subscribe(WS_CHANNEL, self._deliver)
+		self.admin_connections: Dict[int, Connection] = {}
+		self.user_connections: Dict[int, Connection] = {}
+		self.connections_by_user_id: Dict[int, Connection] = {}
+		self.rooms: Dict[int, Room] = {}
+		self._closing: Set[asyncio.Task] = set()
+
+	@property
+	def active_connections(self) -> list[Connection]:
+		return [*self.admin_connections.values(), *self.user_connections.values()]
+
+	def _role_connections(self, is_admin: bool) -> Dict[int, Connection]:
+		return self.admin_connections if is_admin else self.user_connections
+
+	def _room_connections(self, is_admin: bool, room: Optional[int]) -> Dict[int, Connection]:
+		if room is None:
+			return self._role_connections(is_admin)
+		return self.rooms[room].role_connections(is_admin) if room in self.rooms else {}
+
+	async def connect(self, websocket: WebSocket, is_admin: bool = False, user_id: Optional[int] = None, room: Optional[int] = None) -> Connection:
+		await websocket.accept()
+		connection = Connection(websocket, is_admin, user_id, asyncio.Queue(maxsize=self.queue_size), room)
+		connection.sender = asyncio.create_task(self._sender(connection))
+		self._role_connections(is_admin)[id(websocket)] = connection
+		WS_CONNECTIONS.inc("admin" if is_admin else "user")
+		if room is not None:
+			self.rooms.setdefault(room, Room()).role_connections(is_admin)[id(websocket)] = connection
+		if user_id is not None:
+			previous = self.connections_by_user_id.get(user_id)
+			if previous is not None and previous.websocket is not websocket:
+				self._evict(previous)
+			self.connections_by_user_id[user_id] = connection
+		return connection
+
+	def disconnect(self, websocket: WebSocket, is_admin: bool = False) -> bool:
+		# Devuelve si se ha quitado la conexión registrada del usuario: False si ya no
+		# estaba (expulsada) o si el usuario se ha reconectado con otro socket
+		connection = self._role_connections(is_admin).pop(id(websocket), None)
+		if connection is None:
+			return False
+		WS_CONNECTIONS.dec("admin" if is_admin else "user")
+		registered = connection.user_id is None or self.connections_by_user_id.get(connection.user_id) is connection
+		if connection.user_id is not None and registered:
+			del self.connections_by_user_id[connection.user_id]
+		room = self.rooms.get(connection.room)
+		if room is not None:
+			room.role_connections(is_admin).pop(id(websocket), None)
+			if not room.admin_connections and not room.user_connections:
+				del self.rooms[connection.room]
+		# El centinela deja que la tarea de envío vacíe lo ya encolado y termine
+		try:
+			connection.queue.put_nowait(None)
+		except asyncio.QueueFull:
+			connection.sender.cancel()
+		return registered
+
+	def _evict(self, connection: Connection):
+		self.disconnect(connection.websocket, connection.is_admin)
+		if connection.websocket.client_state == WebSocketState.CONNECTED:
+			task = asyncio.create_task(self._close(connection.websocket))
+			self._closing.add(task)
+			task.add_done_callback(self._closing.discard)
+
+	async def _close(self, websocket: WebSocket):
+		try:
+			await asyncio.wait_for(websocket.close(code=1008), timeout=self.send_timeout)
+		except Exception:
+			pass
+
+	async def _sender(self, connection: Connection):
+		while True:
+			message = await connection.queue.get()
+			if message is None:
+				return
+			try:
+				await asyncio.wait_for(connection.websocket.send_text(message), timeout=self.send_timeout)
+			except Exception as e:
+				WS_SEND_FAILURES.inc("timeout" if isinstance(e, asyncio.TimeoutError) else "error")
+				self._evict(connection)
+				return
+
+	def _enqueue(self, connection: Connection, message: Json):
+		try:
+			connection.queue.put_nowait(message)
+		except asyncio.QueueFull:
+			WS_SEND_FAILURES.inc("queue_full")
+			self._evict(connection)
+
+	async def send_personal_message(self, message: Json, websocket: WebSocket):
+		for connections in (self.admin_connections, self.user_connections):
+			connection = connections.get(id(websocket))
+			if connection is not None:
+				self._enqueue(connection, message)
+				return
+		await asyncio.wait_for(websocket.send_text(message), timeout=self.send_timeout)
+
+	def _deliver(self, data: dict):
+		if data["target"] == "users_each":
+			for user_id, message in data["messages"].items():
+				connection = self.connections_by_user_id.get(int(user_id))
+				if connection is not None:
+					self._enqueue(connection, message)
+			return
+		for connection in list(self._room_connections(data["target"] == "admin", data["room"]).values()):
+			self._enqueue(connection, data["message"])
+
+	async def send_to_user(self, message: Json, user_id: int):
+		await self.send_to_users({user_id: message})
+
+	async def send_to_users(self, messages: Dict[int, Json]):
+		# Un solo mensaje en el backplane con el de cada usuario
+		await self._publish({"target": "users_each", "messages": {str(user_id): message for user_id, message in messages.items()}})
+
+	async def broadcast_admin(self, message: Json, room: Optional[int] = None):
+		await self._publish({"target": "admin", "room": room, "message": message})
+
+	async def broadcast_users(self, message: Json, room: Optional[int] = None):
+		await self._publish({"target": "users", "room": room, "message": message})
+
+	async def _publish(self, data: dict):
+		# Incluye la entrega a los sockets de este worker, que el backplane hace al publicar
+		start = time.perf_counter()
+		await self.backplane.publish(WS_CHANNEL, data)
+		BROADCAST_SECONDS.observe(time.perf_counter() - start, data["target"])
+
+	async def receive_text(self, websocket: WebSocket):
+		message = await websocket.receive_text()
+		return message
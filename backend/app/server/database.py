@@ -0,0 +1,71 @@
+from contextlib import contextmanager
+from functools import partial
+from typing import Callable, Iterator, TypeVar
+
+from anyio import CapacityLimiter, to_thread
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session, sessionmaker
+from sqlalchemy.pool import QueuePool
+
+from .config import Settings
+from .metrics import DB_POOL
+
+settings = Settings()
+
+# Las sesiones se crean y se usan en hilos distintos del threadpool de FastAPI,
+# por eso SQLite no debe comprobar el hilo de la conexión.
+connect_args = {"check_same_thread": False} if settings.database_url.startswith("sqlite") else {}
+
+engine = create_engine(
+	settings.database_url,
+	poolclass=QueuePool,
+	pool_size=settings.db_pool_size,
+	max_overflow=settings.db_max_overflow,
+	pool_timeout=settings.db_pool_timeout,
+	pool_pre_ping=settings.db_pool_pre_ping,
+	connect_args=connect_args,
+)
+SessionLocal = sessionmaker(bind=engine, expire_on_commit=False)
+
+# Nunca hay más hilos trabajando con la base de datos que conexiones en el pool
+DB_THREADS = settings.db_pool_size + settings.db_max_overflow
+db_limiter = CapacityLimiter(DB_THREADS)
+
+DB_POOL.set_function(lambda: {
+	("checked_out",): engine.pool.checkedout(),
+	("idle",): engine.pool.checkedin(),
+	# overflow() es negativo mientras no se han abierto todas las conexiones base
+	("overflow",): max(0, engine.pool.overflow()),
+	("capacity",): DB_THREADS,
+})
+
+T = TypeVar("T")
+
+@contextmanager
+def session_scope() -> Iterator[Session]:
+	session = SessionLocal()
+	try:
+		yield session
+		session.commit()
+	except BaseException:
+		session.rollback()
+		raise
+	finally:
+		session.close()
+
+def get_session() -> Iterator[Session]:
+	with session_scope() as session:
+		yield session
+
+def configure_threadpool():
+	# Las rutas síncronas de FastAPI se ejecutan en el threadpool por defecto de anyio
+	to_thread.current_default_thread_limiter().total_tokens = DB_THREADS
+
+def _run_in_session(fn: Callable[..., T], *args) -> T:
+	with session_scope() as session:
+		return fn(session, *args)
+
+async def run_db(fn: Callable[..., T], *args) -> T:
+	"""Ejecuta fn(session, *args) en un hilo del pool acotado, fuera del event loop."""
+	return await to_thread.run_sync(partial(_run_in_session, fn, *args), limiter=db_limiter)
@@ -1,33 +1,74 @@
-from sqlalchemy import create_engine, Column, Integer, String, Boolean, ForeignKey, Enum, JSON, Float, DateTime, UniqueConstraint, CheckConstraint
+import hashlib
+import json
+
+from sqlalchemy import create_engine, Column, Integer, String, Boolean, ForeignKey, Enum, JSON, DateTime, UniqueConstraint, CheckConstraint, Index, and_, or_, func
 from sqlalchemy.orm import declarative_base
-from sqlalchemy.orm import relationship
+from sqlalchemy.orm import relationship, configure_mappers, foreign
 
 Base = declarative_base()
 
+def content_hash(title, image, questionType, questionOrder, selectOptions) -> str:
+	data = json.dumps([title, image, questionType, questionOrder, selectOptions or []], ensure_ascii=False, sort_keys=True)
+	return hashlib.sha256(data.encode("utf-8")).hexdigest()
+
+def _question_content_hash(context) -> str:
+	parameters = context.get_current_parameters()
+	return content_hash(parameters.get("title"), parameters.get("image"), parameters["questionType"], parameters["questionOrder"], parameters.get("selectOptions"))
+
 class Assessment(Base):
 	__tablename__ = 'assessment'
 	id = Column(Integer, primary_key=True, autoincrement=True)
 	title = Column(String, nullable=False)
 	image = Column(String)
 	archived = Column(Boolean, default=False)
+	# Versiones (ver versions.py): la versión que sustituyó a esta (None en la vigente),
+	# la primera versión del linaje (None en la primera) y, solo en la primera, la vigente
 	actual_assessment_id = Column(Integer, default=None)
-	questions = relationship("Question", backref="assessment", cascade="all, delete-orphan")
+	lineage_id = Column(Integer, default=None)
+	head_id = Column(Integer, default=None)
+	# Preguntas de esta versión: las del linaje introducidas en ella o antes y no retiradas
+	questions = relationship(
+		"Question",
+		primaryjoin=lambda: and_(
+			foreign(Question.lineage_id) == func.coalesce(Assessment.lineage_id, Assessment.id),
+			Question.assessment_id <= Assessment.id,
+			or_(Question.retired_id.is_(None), Question.retired_id > Assessment.id),
+		),
+		order_by=lambda: Question.questionOrder,
+		viewonly=True,
+	)
 	assessmentInstances = relationship("AssessmentInstance", backref="assessment", cascade="all, delete-orphan")
 	createdAt = Column(DateTime)
 	updatedAt = Column(DateTime)
 
+	__table_args__ = (
+			Index('ix_assessment_actual_assessment_id', 'actual_assessment_id'),
+			Index('ix_assessment_title', 'title'),
+			Index('ix_assessment_lineage', 'lineage_id'),
+		)
+
 class Question(Base):
 	__tablename__ = 'question'
 	id = Column(Integer, primary_key=True, autoincrement=True)
+	# Versión en la que se introdujo, primera versión del linaje y versión desde la que
+	# ya no forma parte (None si sigue en la vigente)
 	assessment_id = Column(Integer, ForeignKey('assessment.id'), nullable=False)
+	lineage_id = Column(Integer, default=lambda context: context.get_current_parameters()["assessment_id"])
+	retired_id = Column(Integer, default=None)
 	title = Column(String, nullable=False)
 	image = Column(String)
 	questionType = Column(Enum('text', 'number', 'select'), nullable=False)
 	questionOrder = Column(Integer, nullable=False)
 	selectOptions = Column(JSON)
+	contentHash = Column(String, default=_question_content_hash)
 	createdAt = Column(DateTime)
 	updatedAt = Column(DateTime)
 
+	__table_args__ = (
+			Index('ix_question_assessment_order', 'assessment_id', 'questionOrder'),
+			Index('ix_question_lineage', 'lineage_id', 'assessment_id'),
+		)
+
 class AssessmentInstance(Base):
 	__tablename__ = 'assessment_instance'
 	id = Column(Integer, primary_key=True, autoincrement=True)
@@ -41,6 +82,12 @@ class AssessmentInstance(Base):
 	createdAt = Column(DateTime)
 	updatedAt = Column(DateTime)
 
+	__table_args__ = (
+			Index('ix_assessment_instance_assessment_id', 'assessment_id'),
+			# Índice parcial: solo contiene las evaluaciones activas (normalmente una)
+			Index('ix_assessment_instance_active', 'id', sqlite_where=active == True),
+		)
+
 
 class User(Base):
 	__tablename__ = 'user'
@@ -60,6 +107,7 @@ class User(Base):
 			UniqueConstraint('assessment_instance_id', 'pin', name='unique_assessment_instance_pin'),
 			UniqueConstraint('assessment_instance_id', 'name', name='unique_assessment_instance_name'),
 			UniqueConstraint('assessment_instance_id', 'email', name='unique_assessment_instance_email'),
+			Index('ix_user_pin', 'pin'),
 		)
 
 class Answer(Base):
@@ -77,6 +125,22 @@ class Answer(Base):
 	__table_args__ = (
 			UniqueConstraint('assessment_instance_id', 'question_id', 'grading_user_id', 'graded_user_id', name='unique_assessment_instance_question_grading_user_graded_user'),
 			CheckConstraint('grading_user_id != graded_user_id', name='check_grading_graded_user_different'),
+			Index('ix_answer_instance_graded_user', 'assessment_instance_id', 'graded_user_id'),
+			Index('ix_answer_instance_grading_graded_user', 'assessment_instance_id', 'grading_user_id', 'graded_user_id'),
+		)
+
+class Image(Base):
+	__tablename__ = 'image'
+	# Nombre del fichero en el almacén local: sha256 del contenido
+	digest = Column(String, primary_key=True)
+	mediaType = Column(String, nullable=False)
+	size = Column(Integer, nullable=False)
+	# URL de la que se descargó (None si se subió o venía en una data: URL)
+	source = Column(String)
+	createdAt = Column(DateTime)
+
+	__table_args__ = (
+			Index('ix_image_source', 'source'),
 		)
 
 # class Game(Base):
@@ -102,5 +166,11 @@ class Answer(Base):
 # 	answer_id = Column(Integer, ForeignKey('answer.id'))
 # 	time = Column(Float, nullable=False)
 
-engine = create_engine('sqlite:///app/db/local.db')
-Base.metadata.create_all(engine)
+# Configura los mappers ya para que los backref (p. ej. AssessmentInstance.assessment)
+# se puedan usar en opciones de carga antes de la primera consulta
+configure_mappers()
+
+if __name__ == "__main__":
+	engine = create_engine('sqlite:///app/db/local.db')
+	Base.metadata.create_all(engine)
+
@@ -0,0 +1,47 @@
+from typing import Optional
+
+from .backplane import Backplane, backplane
+from .serialization import dumps
+
+# Protocolo de eventos de la sesión en directo. Cada mensaje lleva el cambio concreto
+# (respuesta enviada, nuevo usuario evaluado, conexión/desconexión...) y un número de
+# secuencia creciente. Los clientes piden una instantánea completa
+# (/assessment-instance/active, que devuelve su "seq") solo al entrar y después
+# aplican los eventos con seq mayor.
+
+CONNECT = "CONNECT"
+DISCONNECT = "DISCONNECT"
+START = "START"
+ANSWER = "ANSWER"
+NEXT = "NEXT"
+FINISH = "FINISH"
+CLOSE = "CLOSE"
+
+class EventStream:
+	# Los números de secuencia los reparte el backplane para que sean crecientes
+	# también cuando hay varios workers
+	def __init__(self, backplane: Backplane):
+		self.backplane = backplane
+
+	def next_seq(self) -> int:
+		# Solo desde un hilo (rutas síncronas); en el event loop, allocate_seq()
+		return self.backplane.next_seq()
+
+	async def allocate_seq(self) -> int:
+		return await self.backplane.allocate_seq()
+
+	@property
+	def last_seq(self) -> int:
+		return self.backplane.last_seq()
+
+	async def build_async(self, event: str, mode: Optional[str] = None, **data) -> str:
+		return self.build(event, mode, seq=await self.allocate_seq(), **data)
+
+	def build(self, event: str, mode: Optional[str] = None, seq: Optional[int] = None, **data) -> str:
+		message = {"event": event, "seq": seq if seq is not None else self.next_seq()}
+		if mode is not None:
+			message["mode"] = mode
+		message.update(data)
+		return dumps(message).decode()
+
+events = EventStream(backplane)
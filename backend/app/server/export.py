@@ -0,0 +1,197 @@
+import csv
+import json
+import zipfile
+from io import StringIO
+from itertools import groupby
+from typing import Iterable, Iterator, List, Literal
+from urllib.parse import quote
+from xml.sax.saxutils import escape
+
+from fastapi.responses import StreamingResponse
+from sqlalchemy import select, tuple_
+
+from .database import session_scope
+from .db_config import Answer, AssessmentInstance, Question, User
+from .versions import version_questions
+
+# Exportación en streaming de la matriz de evaluaciones (evaluador, evaluado y una
+# columna por pregunta). Las respuestas se leen por lotes con paginación por clave
+# (evaluador, evaluado, pregunta) y cada fila se escribe en cuanto se completa, así
+# que la memoria no depende del número de respuestas. Cada lote se lee en una sesión
+# corta que se cierra antes de enviar nada: la base de datos principal no está en
+# modo WAL y un cursor abierto durante toda la descarga mantendría el bloqueo
+# compartido, y los envíos de respuestas fallarían con "database is locked".
+
+ExportFormat = Literal["csv", "jsonl", "xlsx"]
+
+MEDIA_TYPES = {
+	"csv": "text/csv; charset=utf-8",
+	"jsonl": "application/x-ndjson",
+	"xlsx": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+}
+
+BATCH_SIZE = 1000
+CHUNK_SIZE = 64 * 1024
+
+def _answers(assessment_instance_id: int) -> Iterator[tuple]:
+	key = (Answer.grading_user_id, Answer.graded_user_id, Answer.question_id)
+	last = None
+	while True:
+		query = (
+			select(*key, Answer.answerText)
+			.where(Answer.assessment_instance_id == assessment_instance_id)
+			.order_by(*key)
+			.limit(BATCH_SIZE)
+		)
+		if last is not None:
+			query = query.where(tuple_(*key) > tuple_(*last))
+		with session_scope() as session:
+			batch = session.execute(query).all()
+		yield from batch
+		if len(batch) < BATCH_SIZE:
+			return
+		last = tuple(batch[-1][:3])
+
+def grading_matrix(assessment_id: int, assessment_instance_ids: List[int]) -> Iterator[dict]:
+	with session_scope() as session:
+		questions = (
+			session.query(Question.id, Question.title)
+			.filter(version_questions(assessment_id))
+			.order_by(Question.questionOrder)
+			.all()
+		)
+	yield {"questions": [title for _, title in questions]}
+	question_ids = [question_id for question_id, _ in questions]
+
+	for assessment_instance_id in assessment_instance_ids:
+		with session_scope() as session:
+			title = session.query(AssessmentInstance.title).filter(AssessmentInstance.id == assessment_instance_id).scalar()
+			names = dict(session.query(User.id, User.name).filter(User.assessment_instance_id == assessment_instance_id))
+		for (grading_user_id, graded_user_id), group in groupby(_answers(assessment_instance_id), key=lambda answer: (answer[0], answer[1])):
+			texts = {question_id: answer_text for _, _, question_id, answer_text in group}
+			yield {
+				"assessment_instance_id": assessment_instance_id,
+				"assessment_instance": title,
+				"grading_user": names.get(grading_user_id, ""),
+				"graded_user": names.get(graded_user_id, ""),
+				"answers": [texts.get(question_id, "") for question_id in question_ids],
+			}
+
+def _table(matrix: Iterator[dict]) -> Iterator[list]:
+	header = next(matrix)
+	yield ["Evaluación", "Nombre de Evaluador", "Nombre de Evaluado", *header["questions"]]
+	for row in matrix:
+		yield [row["assessment_instance"], row["grading_user"], row["graded_user"], *row["answers"]]
+
+def _chunks(parts: Iterable[str]) -> Iterator[bytes]:
+	buffer = []
+	size = 0
+	for part in parts:
+		buffer.append(part)
+		size += len(part)
+		if size >= CHUNK_SIZE:
+			yield "".join(buffer).encode("utf-8")
+			buffer = []
+			size = 0
+	if buffer:
+		yield "".join(buffer).encode("utf-8")
+
+def _csv_lines(matrix: Iterator[dict]) -> Iterator[str]:
+	line = StringIO()
+	writer = csv.writer(line)
+	# BOM para que Excel detecte UTF-8
+	yield "\ufeff"
+	for row in _table(matrix):
+		writer.writerow(row)
+		yield line.getvalue()
+		line.seek(0)
+		line.truncate()
+
+def _jsonl_lines(matrix: Iterator[dict]) -> Iterator[str]:
+	questions = next(matrix)["questions"]
+	for row in matrix:
+		row["answers"] = dict(zip(questions, row["answers"]))
+		yield json.dumps(row, ensure_ascii=False) + "\n"
+
+class _ChunkWriter:
+	# Destino no posicionable para zipfile: lo escrito se recoge y se vacía en cada chunk
+	def __init__(self):
+		self.parts: List[bytes] = []
+		self.size = 0
+
+	def write(self, data: bytes) -> int:
+		self.parts.append(data)
+		self.size += len(data)
+		return len(data)
+
+	def flush(self):
+		pass
+
+	def drain(self) -> bytes:
+		data = b"".join(self.parts)
+		self.parts = []
+		self.size = 0
+		return data
+
+XLSX_PARTS = {
+	"[Content_Types].xml": (
+		'<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+		'<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+		'<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+		'<Default Extension="xml" ContentType="application/xml"/>'
+		'<Override PartName="/xl/workbook.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+		'<Override PartName="/xl/worksheets/sheet1.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+		'</Types>'
+	),
+	"_rels/.rels": (
+		'<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+		'<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+		'<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" Target="xl/workbook.xml"/>'
+		'</Relationships>'
+	),
+	"xl/workbook.xml": (
+		'<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+		'<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+		'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+		'<sheets><sheet name="Resultados" sheetId="1" r:id="rId1"/></sheets>'
+		'</workbook>'
+	),
+	"xl/_rels/workbook.xml.rels": (
+		'<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+		'<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+		'<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet" Target="worksheets/sheet1.xml"/>'
+		'</Relationships>'
+	),
+}
+
+def _xlsx_chunks(matrix: Iterator[dict]) -> Iterator[bytes]:
+	output = _ChunkWriter()
+	with zipfile.ZipFile(output, "w", compression=zipfile.ZIP_DEFLATED) as archive:
+		for name, content in XLSX_PARTS.items():
+			archive.writestr(name, content)
+		with archive.open("xl/worksheets/sheet1.xml", "w") as sheet:
+			sheet.write(
+				b'<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+				b'<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main"><sheetData>'
+			)
+			for row in _table(matrix):
+				cells = "".join(f'<c t="inlineStr"><is><t>{escape(str(value))}</t></is></c>' for value in row)
+				sheet.write(f"<row>{cells}</row>".encode("utf-8"))
+				if output.size >= CHUNK_SIZE:
+					yield output.drain()
+			sheet.write(b"</sheetData></worksheet>")
+	yield output.drain()
+
+def export_response(filename: str, assessment_id: int, assessment_instance_ids: List[int], format: ExportFormat) -> StreamingResponse:
+	matrix = grading_matrix(assessment_id, assessment_instance_ids)
+	if format == "csv":
+		content = _chunks(_csv_lines(matrix))
+	elif format == "jsonl":
+		content = _chunks(_jsonl_lines(matrix))
+	else:
+		content = _xlsx_chunks(matrix)
+	return StreamingResponse(
+		content,
+		media_type=MEDIA_TYPES[format],
+		headers={"Content-Disposition": f"attachment; filename*=UTF-8''{quote(filename)}.{format}"},
+	)
@@ -0,0 +1,194 @@
+import base64
+import binascii
+import hashlib
+import io
+import logging
+import os
+import re
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import httpx
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import Session
+
+from .config import Settings
+from .db_config import Image
+
+try:
+	from PIL import Image as PILImage
+except ImportError:
+	PILImage = None
+
+settings = Settings()
+logger = logging.getLogger(__name__)
+
+# Caché local de las imágenes de evaluaciones y preguntas. Al guardar una evaluación,
+# las URL externas y las data: URL se descargan/decodifican una sola vez y se guardan
+# en disco con el sha256 del contenido como nombre; en la base de datos queda la ruta
+# local (/images/<sha256>), así que los alumnos las piden al servidor del aula y no a
+# internet. Como el contenido de una ruta nunca cambia, se sirven como inmutables.
+# Con Pillow (en requirements.txt) se generan bajo demanda versiones reducidas a los
+# anchos de image_widths; si no está instalado se sirve siempre el original.
+
+IMAGE_PREFIX = "/images/"
+DIGEST_PATTERN = "^[0-9a-f]{64}$"
+DATA_URL = re.compile(r"^data:(image/[\w.+-]+)?;base64,(.*)$", re.DOTALL)
+FETCH_THREADS = 8
+
+# Solo formatos de mapa de bits: un SVG puede llevar scripts
+SIGNATURES = [
+	(b"\x89PNG\r\n\x1a\n", "image/png"),
+	(b"\xff\xd8\xff", "image/jpeg"),
+	(b"GIF87a", "image/gif"),
+	(b"GIF89a", "image/gif"),
+]
+
+class ImageError(Exception):
+	pass
+
+def sniff(data: bytes) -> Optional[str]:
+	for signature, media_type in SIGNATURES:
+		if data.startswith(signature):
+			return media_type
+	if data[:4] == b"RIFF" and data[8:12] == b"WEBP":
+		return "image/webp"
+	return None
+
+def is_local(value: Optional[str]) -> bool:
+	return bool(value) and value.startswith(IMAGE_PREFIX)
+
+def local_url(digest: str) -> str:
+	return IMAGE_PREFIX + digest
+
+class ImageStore:
+	def __init__(self, directory: str, max_bytes: int, fetch_timeout: float, widths: List[int]):
+		self.directory = directory
+		self.max_bytes = max_bytes
+		self.fetch_timeout = fetch_timeout
+		self.widths = sorted(widths)
+
+	def path(self, digest: str, width: Optional[int] = None) -> str:
+		name = digest if width is None else f"{digest}_w{width}"
+		return os.path.join(self.directory, digest[:2], name)
+
+	def _write(self, path: str, data: bytes):
+		# Escritura atómica: otro worker puede estar sirviendo o generando el mismo fichero
+		os.makedirs(os.path.dirname(path), exist_ok=True)
+		descriptor, temporary = tempfile.mkstemp(dir=os.path.dirname(path))
+		with os.fdopen(descriptor, "wb") as file:
+			file.write(data)
+		os.replace(temporary, path)
+
+	def put(self, data: bytes) -> Tuple[str, str]:
+		if len(data) > self.max_bytes:
+			raise ImageError("La imagen es demasiado grande")
+		media_type = sniff(data)
+		if media_type is None:
+			raise ImageError("El fichero no es una imagen")
+		digest = hashlib.sha256(data).hexdigest()
+		if not os.path.isfile(self.path(digest)):
+			self._write(self.path(digest), data)
+		return digest, media_type
+
+	def download(self, url: str) -> bytes:
+		chunks = []
+		size = 0
+		with httpx.stream("GET", url, timeout=self.fetch_timeout, follow_redirects=True) as response:
+			response.raise_for_status()
+			for chunk in response.iter_bytes():
+				size += len(chunk)
+				if size > self.max_bytes:
+					raise ImageError("La imagen es demasiado grande")
+				chunks.append(chunk)
+		return b"".join(chunks)
+
+	def media_type(self, digest: str) -> Optional[str]:
+		with open(self.path(digest), "rb") as file:
+			return sniff(file.read(16))
+
+	def snap_width(self, width: Optional[int]) -> Optional[int]:
+		# Solo se generan los anchos configurados: el menor que cubre el pedido
+		if width is None or not self.widths:
+			return None
+		return next((candidate for candidate in self.widths if candidate >= width), self.widths[-1])
+
+	def variant(self, digest: str, width: Optional[int]) -> str:
+		original = self.path(digest)
+		width = self.snap_width(width)
+		if PILImage is None or width is None:
+			return original
+		target = self.path(digest, width)
+		if os.path.isfile(target):
+			return target
+		with PILImage.open(original) as image:
+			# Las animadas y las que ya son pequeñas se sirven tal cual
+			if image.width <= width or getattr(image, "is_animated", False):
+				return original
+			resized = image.resize((width, max(1, round(image.height * width / image.width))), PILImage.LANCZOS)
+			buffer = io.BytesIO()
+			resized.save(buffer, format=image.format, optimize=True, **({"quality": 85} if image.format in ("JPEG", "WEBP") else {}))
+		self._write(target, buffer.getvalue())
+		return target
+
+store = ImageStore(settings.image_dir, settings.image_max_bytes, settings.image_fetch_timeout, settings.image_widths)
+
+def _image_row(digest: str, media_type: str, size: int, source: Optional[str]) -> dict:
+	return dict(digest=digest, mediaType=media_type, size=size, source=source, createdAt=datetime.now())
+
+def store_upload(session: Session, data: bytes, source: Optional[str] = None) -> str:
+	digest, media_type = store.put(data)
+	session.execute(sqlite_insert(Image).values(_image_row(digest, media_type, len(data), source)).on_conflict_do_nothing())
+	return local_url(digest)
+
+def _load(value: str) -> bytes:
+	match = DATA_URL.match(value)
+	if match is not None:
+		try:
+			return base64.b64decode(match.group(2), validate=False)
+		except binascii.Error:
+			raise ImageError("data: URL no válida")
+	return store.download(value)
+
+def localize_images(session: Session, values: Iterable[Optional[str]]) -> Dict[str, str]:
+	# Devuelve {valor original: ruta local} para las imágenes que se han podido guardar;
+	# las que fallan (sin conexión, no es una imagen...) se quedan con su URL original.
+	# Primero se descarga y se guarda en disco todo, sin tocar la base de datos; las filas
+	# de Image se insertan al final en una sola sentencia, así la transacción de escritura
+	# no queda abierta mientras se espera a la red
+	pending = {
+		value for value in values
+		if value and not is_local(value) and (value.startswith(("http://", "https://")) or DATA_URL.match(value))
+	}
+	if not pending:
+		return {}
+
+	urls = [value for value in pending if not value.startswith("data:")]
+	localized = {
+		source: local_url(digest)
+		for digest, source in session.query(Image.digest, Image.source).filter(Image.source.in_(urls))
+	} if urls else {}
+	pending -= localized.keys()
+
+	def fetch(value: str):
+		try:
+			data = _load(value)
+			return value, store.put(data), len(data), None
+		except Exception as e:
+			return value, None, 0, e
+
+	rows: Dict[str, dict] = {}
+	with ThreadPoolExecutor(max_workers=min(FETCH_THREADS, len(pending) or 1)) as executor:
+		for value, stored, size, error in executor.map(fetch, pending):
+			if error is not None:
+				logger.warning("Imagen no guardada: %s", error, extra={"source": value[:80]})
+				continue
+			digest, media_type = stored
+			localized[value] = local_url(digest)
+			rows.setdefault(digest, _image_row(digest, media_type, size, None if value.startswith("data:") else value))
+
+	if rows:
+		session.execute(sqlite_insert(Image).values(list(rows.values())).on_conflict_do_nothing())
+	return localized
@@ -0,0 +1,56 @@
+import base64
+from typing import Any, List, Optional, Set, Tuple
+
+from fastapi import HTTPException
+from pydantic import BaseModel
+from sqlalchemy.orm import Query
+
+# Paginación por cursor (keyset) y proyección de campos para los listados. El cursor
+# es el último id devuelto: la página siguiente se lee con "id > cursor" sobre el
+# índice, sin OFFSET, así que el coste no crece con el número de páginas. El cursor de
+# la página siguiente va en la cabecera X-Next-Cursor para no cambiar el cuerpo.
+
+MAX_PAGE_SIZE = 500
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+def encode_cursor(last_id: int) -> str:
+	return base64.urlsafe_b64encode(str(last_id).encode()).decode().rstrip("=")
+
+def decode_cursor(cursor: Optional[str]) -> Optional[int]:
+	if not cursor:
+		return None
+	try:
+		return int(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode())
+	except ValueError:
+		raise HTTPException(status_code=400, detail="Cursor no válido")
+
+def paginate(query: Query, id_column, cursor: Optional[str], limit: Optional[int]) -> Tuple[List[Any], Optional[str]]:
+	last_id = decode_cursor(cursor)
+	if last_id is not None:
+		query = query.filter(id_column > last_id)
+	query = query.order_by(id_column)
+	if limit is None:
+		return query.all(), None
+	# Se pide una fila de más para saber si hay página siguiente
+	rows = query.limit(limit + 1).all()
+	if len(rows) <= limit:
+		return rows, None
+	rows = rows[:limit]
+	return rows, encode_cursor(rows[-1].id)
+
+def parse_fields(fields: Optional[str], model: type[BaseModel]) -> Optional[Set[str]]:
+	if not fields:
+		return None
+	requested = {field.strip() for field in fields.split(",") if field.strip()}
+	unknown = requested - set(model.model_fields)
+	if unknown:
+		raise HTTPException(status_code=400, detail=f"Campos desconocidos: {', '.join(sorted(unknown))}")
+	return requested | {"id"}
+
+def project(row: dict, include: Optional[Set[str]]) -> dict:
+	if include is None:
+		return row
+	return {key: value for key, value in row.items() if key in include}
+
+def page_headers(next_cursor: Optional[str]) -> Optional[dict]:
+	return {NEXT_CURSOR_HEADER: next_cursor} if next_cursor else None
@@ -0,0 +1,173 @@
+import threading
+from dataclasses import dataclass, field, replace
+from typing import Dict, FrozenSet, List, Optional, Tuple
+
+from sqlalchemy.orm import Session, selectinload
+
+from .db_config import Assessment, AssessmentInstance
+from .serialization import assessment_row
+
+# Estado en memoria de las evaluaciones activas (puede haber varias a la vez, una por
+# aula). Las rutas calientes de la sesión en directo (login de alumnos, respuestas,
+# /next, /assessment-instance/active) lo leen en lugar de consultar SQLite. Solo las
+# transiciones (start, next, CLOSE y cambios en los usuarios de una evaluación
+# activa) invalidan la evaluación afectada; la siguiente lectura la reconstruye desde
+# la base de datos, también al arrancar tras una caída.
+
+@dataclass(frozen=True)
+class LiveUser:
+	id: int
+	name: str
+	email: str
+	order: int
+	group: int
+	pin: str
+	voteEveryone: bool
+
+@dataclass(frozen=True)
+class LiveSession:
+	assessment_instance_id: int
+	title: str
+	assessment_id: int
+	actual_user_id: Optional[int]
+	users: List[LiveUser]
+	queue: List[LiveUser]
+	question_ids: FrozenSet[int]
+	number_question_ids: FrozenSet[int]
+	assessment: dict
+	users_by_id: Dict[int, LiveUser] = field(repr=False)
+	users_by_pin: Dict[str, LiveUser] = field(repr=False)
+
+	@property
+	def actual_user(self) -> Optional[LiveUser]:
+		return self.users_by_id.get(self.actual_user_id)
+
+	def next_user(self) -> Optional[LiveUser]:
+		actual_user = self.actual_user
+		for user in self.queue:
+			if actual_user is None or user.order > actual_user.order:
+				return user
+		return None
+
+	def with_actual_user(self, user_id: Optional[int]) -> "LiveSession":
+		# La misma sesión tras pasar a otro evaluado, sin reconstruirla desde la base de datos
+		return replace(self, actual_user_id=user_id)
+
+def load_live_session(session: Session, assessment_instance_id: int) -> Optional[LiveSession]:
+	assessmentInstance = (
+		session.query(AssessmentInstance)
+		.options(
+			selectinload(AssessmentInstance.users),
+			selectinload(AssessmentInstance.assessment).selectinload(Assessment.questions),
+		)
+		.filter(AssessmentInstance.id == assessment_instance_id, AssessmentInstance.active == True)
+		.first()
+	)
+	if not assessmentInstance:
+		return None
+
+	users = sorted(
+		[
+			LiveUser(
+				id=user.id,
+				name=user.name,
+				email=user.email,
+				order=user.order,
+				group=user.group,
+				pin=user.pin,
+				voteEveryone=user.voteEveryone
+			) for user in assessmentInstance.users
+		],
+		key=lambda user: user.order
+	)
+	assessment = assessmentInstance.assessment
+	questions = sorted(assessment.questions, key=lambda question: question.questionOrder)
+	return LiveSession(
+		assessment_instance_id=assessmentInstance.id,
+		title=assessmentInstance.title,
+		assessment_id=assessmentInstance.assessment_id,
+		actual_user_id=assessmentInstance.actual_user_id,
+		users=users,
+		queue=[user for user in users if user.order != -1],
+		question_ids=frozenset(question.id for question in questions),
+		number_question_ids=frozenset(question.id for question in questions if question.questionType == "number"),
+		assessment=assessment_row(assessment, questions),
+		users_by_id={user.id: user for user in users},
+		users_by_pin={user.pin: user for user in users},
+	)
+
+class LiveSessionCache:
+	# _lock solo protege los diccionarios y nunca se mantiene durante una consulta:
+	# invalidate() se llama desde el event loop (backplane) y no debe esperar a la base
+	# de datos. Cada evaluación tiene su propio cerrojo de carga, así que un fallo de
+	# caché en un aula no retiene las de las demás, y un contador de generación evita
+	# guardar lo que se cargó antes de una invalidación.
+	def __init__(self):
+		self._lock = threading.Lock()
+		# _epoch cambia con cada invalidación (lista de activas); _cleared solo al vaciar todo
+		self._epoch = 0
+		self._cleared = 0
+		self._generations: Dict[int, int] = {}
+		self._loading: Dict[Optional[int], threading.Lock] = {}
+		self._active_ids: Optional[List[int]] = None
+		self._live_sessions: Dict[int, Optional[LiveSession]] = {}
+
+	def _load_lock(self, key: Optional[int]) -> threading.Lock:
+		with self._lock:
+			return self._loading.setdefault(key, threading.Lock())
+
+	def _generation(self, assessment_instance_id: int) -> Tuple[int, int]:
+		return self._cleared, self._generations.get(assessment_instance_id, 0)
+
+	def active_ids(self, session: Session) -> List[int]:
+		active_ids = self._active_ids
+		if active_ids is not None:
+			return active_ids
+		with self._load_lock(None):
+			if self._active_ids is not None:
+				return self._active_ids
+			epoch = self._epoch
+			active_ids = [
+				assessment_instance_id for assessment_instance_id, in
+				session.query(AssessmentInstance.id).filter(AssessmentInstance.active == True).order_by(AssessmentInstance.id)
+			]
+			with self._lock:
+				if self._epoch == epoch:
+					self._active_ids = active_ids
+			return active_ids
+
+	def get(self, session: Session, assessment_instance_id: int) -> Optional[LiveSession]:
+		try:
+			return self._live_sessions[assessment_instance_id]
+		except KeyError:
+			pass
+		with self._load_lock(assessment_instance_id):
+			try:
+				return self._live_sessions[assessment_instance_id]
+			except KeyError:
+				pass
+			generation = self._generation(assessment_instance_id)
+			live = load_live_session(session, assessment_instance_id)
+			with self._lock:
+				if self._generation(assessment_instance_id) == generation:
+					self._live_sessions[assessment_instance_id] = live
+			return live
+
+	def all(self, session: Session) -> List[LiveSession]:
+		return [live for live in (self.get(session, assessment_instance_id) for assessment_instance_id in self.active_ids(session)) if live]
+
+	def find_by_pin(self, session: Session, pin: str) -> List[Tuple[LiveSession, LiveUser]]:
+		return [(live, live.users_by_pin[pin]) for live in self.all(session) if pin in live.users_by_pin]
+
+	def invalidate(self, assessment_instance_id: Optional[int] = None):
+		with self._lock:
+			self._epoch += 1
+			self._active_ids = None
+			if assessment_instance_id is None:
+				self._cleared += 1
+				self._live_sessions.clear()
+			else:
+				self._generations[assessment_instance_id] = self._generations.get(assessment_instance_id, 0) + 1
+				self._live_sessions.pop(assessment_instance_id, None)
+
+live_sessions = LiveSessionCache()
@@ -0,0 +1,148 @@
+import atexit
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import uuid
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from typing import Dict, Optional
+
+from starlette.datastructures import MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+# Registro estructurado. Los módulos usan logging.getLogger(__name__) como siempre;
+# el logger raíz solo tiene un QueueHandler, que deja el registro en una cola en
+# memoria, y un hilo (QueueListener) lo formatea y lo escribe en un fichero rotativo
+# en JSON (una línea por registro) y, si log_console, en stderr en texto. Así, quien
+# registra, sea el event loop o una petición del threadpool, nunca espera a la E/S.
+#
+# Cada registro lleva el request_id de la petición o websocket en curso y el
+# instance_id de la evaluación cuando se conoce. Los dos van en ContextVar: los fija
+# el middleware y bind_instance(), y se leen al registrar, en el hilo de quien registra.
+# Los niveles se ajustan por módulo con log_levels, p. ej.
+# LOG_LEVELS='{"server.api": "DEBUG", "server.backplane": "WARNING"}'.
+
+REQUEST_ID_HEADER = "X-Request-ID"
+
+request_id: ContextVar[Optional[str]] = ContextVar("request_id", default=None)
+instance_id: ContextVar[Optional[int]] = ContextVar("instance_id", default=None)
+
+# Atributos propios de LogRecord; el resto son los campos pasados con extra=
+RESERVED = set(vars(logging.makeLogRecord({}))) | {"message", "asctime", "request_id", "instance_id"}
+
+def bind_instance(assessment_instance_id: Optional[int]):
+	instance_id.set(assessment_instance_id)
+
+class ContextFilter(logging.Filter):
+	def filter(self, record: logging.LogRecord) -> bool:
+		record.request_id = request_id.get()
+		record.instance_id = instance_id.get()
+		return True
+
+class JsonFormatter(logging.Formatter):
+	def format(self, record: logging.LogRecord) -> str:
+		data = {
+			"time": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+			"level": record.levelname,
+			"logger": record.name,
+			"message": record.getMessage(),
+			"pid": record.process,
+		}
+		for key in ("request_id", "instance_id"):
+			if getattr(record, key, None) is not None:
+				data[key] = getattr(record, key)
+		for key, value in vars(record).items():
+			if key not in RESERVED:
+				data[key] = value
+		if record.exc_text:
+			data["exception"] = record.exc_text
+		return json.dumps(data, ensure_ascii=False, default=str)
+
+class TextFormatter(logging.Formatter):
+	def __init__(self):
+		super().__init__("%(asctime)s %(levelname)s %(name)s: %(message)s")
+
+	def format(self, record: logging.LogRecord) -> str:
+		text = super().format(record)
+		extra = {key: value for key, value in vars(record).items() if key not in RESERVED and value is not None}
+		for key in ("request_id", "instance_id"):
+			if getattr(record, key, None) is not None:
+				extra[key] = getattr(record, key)
+		return text + (" " + " ".join(f"{key}={value}" for key, value in extra.items()) if extra else "")
+
+class _QueueHandler(logging.handlers.QueueHandler):
+	def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+		# El mensaje y la traza se resuelven aquí, en el hilo de quien registra; los
+		# argumentos pueden cambiar o no ser serializables cuando los lea el escritor
+		record = logging.makeLogRecord(vars(record))
+		record.msg = record.getMessage()
+		record.args = None
+		if record.exc_info:
+			record.exc_text = logging.Formatter().formatException(record.exc_info)
+			record.exc_info = None
+		return record
+
+_listener: Optional[logging.handlers.QueueListener] = None
+
+def log_path(path: str, per_process: bool) -> str:
+	if not per_process:
+		return path
+	base, extension = os.path.splitext(path)
+	return f"{base}.{os.getpid()}{extension}"
+
+def setup_logging(level: str = "INFO", levels: Optional[Dict[str, str]] = None, file: str = "", max_bytes: int = 10 * 1024 * 1024, backups: int = 5, console: bool = True, per_process: bool = False):
+	global _listener
+	if _listener is not None:
+		return
+	handlers = []
+	if file:
+		path = log_path(file, per_process)
+		os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+		file_handler = logging.handlers.RotatingFileHandler(path, maxBytes=max_bytes, backupCount=backups, encoding="utf-8")
+		file_handler.setFormatter(JsonFormatter())
+		handlers.append(file_handler)
+	if console:
+		console_handler = logging.StreamHandler()
+		console_handler.setFormatter(TextFormatter())
+		handlers.append(console_handler)
+
+	log_queue = queue.SimpleQueue()
+	queue_handler = _QueueHandler(log_queue)
+	queue_handler.addFilter(ContextFilter())
+	root = logging.getLogger()
+	root.addHandler(queue_handler)
+	root.setLevel(level.upper())
+	for name, module_level in (levels or {}).items():
+		logging.getLogger(name).setLevel(module_level.upper())
+
+	_listener = logging.handlers.QueueListener(log_queue, *handlers, respect_handler_level=True)
+	_listener.start()
+	# Al salir se vacía la cola antes de cerrar los ficheros
+	atexit.register(_listener.stop)
+
+class RequestIdMiddleware:
+	def __init__(self, app: ASGIApp):
+		self.app = app
+
+	async def __call__(self, scope: Scope, receive: Receive, send: Send):
+		if scope["type"] not in ("http", "websocket"):
+			await self.app(scope, receive, send)
+			return
+		# Se respeta el identificador que traiga un proxy delante
+		incoming = dict(scope["headers"]).get(REQUEST_ID_HEADER.lower().encode())
+		current = incoming.decode("latin-1")[:64] if incoming else uuid.uuid4().hex[:16]
+		request_token = request_id.set(current)
+		instance_token = instance_id.set(None)
+
+		async def send_with_id(message: Message):
+			if message["type"] == "http.response.start":
+				MutableHeaders(scope=message).append(REQUEST_ID_HEADER, current)
+			await send(message)
+
+		try:
+			await self.app(scope, receive, send_with_id)
+		finally:
+			request_id.reset(request_token)
+			instance_id.reset(instance_token)
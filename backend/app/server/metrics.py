@@ -0,0 +1,295 @@
+import asyncio
+import bisect
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+# Métricas en formato de texto de Prometheus (GET /metrics), sin dependencias ni
+# servicios externos. Para no bloquear en el camino caliente cada hilo escribe en su
+# propio diccionario (shard) y solo ese hilo lo modifica; al exportar se suman todos.
+# Copiar un dict o una lista es atómico con el GIL, así que la lectura no necesita
+# lock. Los shards de los hilos que terminan se acumulan en uno "retirado".
+#
+# Con varios workers cada proceso tiene sus métricas. Si metrics_dir está definido,
+# cada worker vuelca las suyas a <metrics_dir>/<pid>.json cada metrics_flush_interval
+# segundos y /metrics suma las de todos los ficheros recientes, así que da igual qué
+# worker atienda al scraper. Al reiniciar un worker sus contadores vuelven a cero,
+# que es lo que Prometheus espera de un contador.
+
+logger = logging.getLogger(__name__)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+LAG_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5)
+
+Labels = Tuple[str, ...]
+
+def _escape(value: str) -> str:
+	return value.replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+def _format_labels(names: Sequence[str], values: Sequence[str]) -> str:
+	if not names:
+		return ""
+	return "{" + ",".join(f'{name}="{_escape(str(value))}"' for name, value in zip(names, values)) + "}"
+
+def _format_value(value: float) -> str:
+	if value == float("inf"):
+		return "+Inf"
+	return repr(float(value)) if value != int(value) else str(int(value))
+
+def _add(target: dict, key, value):
+	if isinstance(value, list):
+		current = target.get(key)
+		if current is None:
+			target[key] = list(value)
+		else:
+			for index, item in enumerate(value):
+				current[index] += item
+	else:
+		target[key] = target.get(key, 0) + value
+
+class Registry:
+	def __init__(self):
+		self.metrics: List["Metric"] = []
+		self._local = threading.local()
+		self._lock = threading.Lock()
+		self._shards: List[Tuple[threading.Thread, dict]] = []
+		self._retired: dict = {}
+		self._flusher: Optional[asyncio.Task] = None
+		self.directory: Optional[str] = None
+
+	def register(self, metric: "Metric"):
+		self.metrics.append(metric)
+
+	def shard(self) -> dict:
+		try:
+			return self._local.shard
+		except AttributeError:
+			shard = self._local.shard = {}
+			with self._lock:
+				self._shards.append((threading.current_thread(), shard))
+			return shard
+
+	def values(self) -> dict:
+		# {(métrica, etiquetas): valor} de este proceso
+		totals: dict = {}
+		with self._lock:
+			alive = []
+			for thread, shard in self._shards:
+				if thread.is_alive():
+					alive.append((thread, shard))
+				else:
+					for key, value in shard.copy().items():
+						_add(self._retired, key, value)
+			self._shards = alive
+			shards = [shard for _, shard in alive] + [self._retired]
+			for shard in shards:
+				for key, value in shard.copy().items():
+					_add(totals, key, list(value) if isinstance(value, list) else value)
+		for metric in self.metrics:
+			for labels, value in metric.sample().items():
+				_add(totals, (metric.name, labels), value)
+		return totals
+
+	def _path(self, pid: int) -> str:
+		return os.path.join(self.directory, f"{pid}.json")
+
+	def dump(self):
+		values = [[name, list(labels), value] for (name, labels), value in self.values().items()]
+		descriptor, temporary = tempfile.mkstemp(dir=self.directory)
+		with os.fdopen(descriptor, "w") as file:
+			json.dump(values, file)
+		os.replace(temporary, self._path(os.getpid()))
+
+	def merged(self, max_age: float) -> dict:
+		self.dump()
+		totals: dict = {}
+		now = time.time()
+		for name in os.listdir(self.directory):
+			path = os.path.join(self.directory, name)
+			if not name.endswith(".json"):
+				continue
+			try:
+				if now - os.path.getmtime(path) > max_age:
+					# Worker que ya no existe
+					os.remove(path)
+					continue
+				with open(path) as file:
+					for metric, labels, value in json.load(file):
+						_add(totals, (metric, tuple(labels)), value)
+			except (OSError, ValueError):
+				continue
+		return totals
+
+	async def start(self, directory: str, interval: float):
+		self.directory = directory
+		os.makedirs(directory, exist_ok=True)
+		self._flusher = asyncio.create_task(self._flush(interval))
+
+	async def stop(self):
+		if self._flusher is None:
+			return
+		self._flusher.cancel()
+		self._flusher = None
+		try:
+			os.remove(self._path(os.getpid()))
+		except OSError:
+			pass
+
+	async def _flush(self, interval: float):
+		while True:
+			await asyncio.sleep(interval)
+			try:
+				self.dump()
+			except OSError:
+				logger.warning("No se pudieron volcar las métricas", exc_info=True)
+
+	def render(self, interval: float) -> str:
+		# Se consideran vivos los ficheros actualizados en los últimos tres intervalos
+		values = self.merged(3 * interval) if self.directory else self.values()
+		lines = []
+		for metric in self.metrics:
+			lines.append(f"# HELP {metric.name} {metric.help}")
+			lines.append(f"# TYPE {metric.name} {metric.kind}")
+			samples = sorted((labels, value) for (name, labels), value in values.items() if name == metric.name)
+			if not samples and not metric.label_names:
+				samples = [((), metric.empty())]
+			for labels, value in samples:
+				lines.extend(metric.format(labels, value))
+		return "\n".join(lines) + "\n"
+
+class Metric:
+	kind = ""
+
+	def __init__(self, registry: Registry, name: str, help: str, label_names: Sequence[str] = ()):
+		self.registry = registry
+		self.name = name
+		self.help = help
+		self.label_names = tuple(label_names)
+		registry.register(self)
+
+	def sample(self) -> Dict[Labels, float]:
+		# Valores calculados al exportar (solo los Gauge con función)
+		return {}
+
+	def empty(self):
+		return 0
+
+	def format(self, labels: Labels, value) -> List[str]:
+		return [f"{self.name}{_format_labels(self.label_names, labels)} {_format_value(value)}"]
+
+class Counter(Metric):
+	kind = "counter"
+
+	def inc(self, *labels: str, amount: float = 1):
+		shard = self.registry.shard()
+		key = (self.name, labels)
+		shard[key] = shard.get(key, 0) + amount
+
+class Gauge(Metric):
+	kind = "gauge"
+
+	def __init__(self, registry: Registry, name: str, help: str, label_names: Sequence[str] = (), function: Optional[Callable[[], Dict[Labels, float]]] = None):
+		super().__init__(registry, name, help, label_names)
+		self.function = function
+
+	def inc(self, *labels: str, amount: float = 1):
+		shard = self.registry.shard()
+		key = (self.name, labels)
+		shard[key] = shard.get(key, 0) + amount
+
+	def dec(self, *labels: str, amount: float = 1):
+		self.inc(*labels, amount=-amount)
+
+	def set_function(self, function: Callable[[], Dict[Labels, float]]):
+		self.function = function
+
+	def sample(self) -> Dict[Labels, float]:
+		if self.function is None:
+			return {}
+		try:
+			return self.function()
+		except Exception:
+			return {}
+
+class Histogram(Metric):
+	kind = "histogram"
+
+	def __init__(self, registry: Registry, name: str, help: str, label_names: Sequence[str] = (), buckets: Sequence[float] = LATENCY_BUCKETS):
+		super().__init__(registry, name, help, label_names)
+		self.buckets = tuple(sorted(buckets))
+
+	def observe(self, value: float, *labels: str):
+		shard = self.registry.shard()
+		key = (self.name, labels)
+		# Cuenta por cubeta (la última es +Inf), suma y número de observaciones
+		counts = shard.get(key)
+		if counts is None:
+			counts = shard[key] = [0] * (len(self.buckets) + 3)
+		counts[bisect.bisect_left(self.buckets, value)] += 1
+		counts[-2] += value
+		counts[-1] += 1
+
+	def empty(self):
+		return [0] * (len(self.buckets) + 3)
+
+	def format(self, labels: Labels, counts) -> List[str]:
+		lines = []
+		cumulative = 0
+		for bucket, count in zip(self.buckets + (float("inf"),), counts):
+			cumulative += count
+			lines.append(f"{self.name}_bucket{_format_labels(self.label_names + ('le',), labels + (_format_value(bucket),))} {_format_value(cumulative)}")
+		label_text = _format_labels(self.label_names, labels)
+		lines.append(f"{self.name}_sum{label_text} {_format_value(counts[-2])}")
+		lines.append(f"{self.name}_count{label_text} {_format_value(counts[-1])}")
+		return lines
+
+registry = Registry()
+
+REQUEST_SECONDS = Histogram(registry, "conalma_http_request_duration_seconds", "Duración de las peticiones HTTP por ruta", ("method", "route"))
+REQUESTS = Counter(registry, "conalma_http_requests_total", "Peticiones HTTP atendidas por ruta y código", ("method", "route", "status"))
+IN_FLIGHT = Gauge(registry, "conalma_http_requests_in_flight", "Peticiones HTTP en curso")
+WS_CONNECTIONS = Gauge(registry, "conalma_ws_connections", "Websockets abiertos por rol", ("role",))
+BROADCAST_SECONDS = Histogram(registry, "conalma_broadcast_duration_seconds", "Duración de los broadcast (publicación y encolado en los websockets)", ("target",))
+WS_SEND_FAILURES = Counter(registry, "conalma_ws_send_failures_total", "Envíos por websocket fallidos; la conexión se expulsa", ("reason",))
+ANSWERS = Counter(registry, "conalma_answers_total", "Respuestas de alumnos guardadas")
+LOOP_LAG = Histogram(registry, "conalma_event_loop_lag_seconds", "Retraso del event loop al despertar una tarea", buckets=LAG_BUCKETS)
+LOOP_STALLS = Counter(registry, "conalma_event_loop_stalls_total", "Bloqueos del event loop por encima del umbral, por ruta", ("route",))
+DB_POOL = Gauge(registry, "conalma_db_pool_connections", "Conexiones del pool de la base de datos por estado", ("state",))
+
+def route_label(scope: Scope) -> str:
+	# La plantilla de la ruta (p. ej. /play/token={token}), nunca la URL con el token
+	return getattr(scope.get("route"), "path", None) or "(sin ruta)"
+
+class MetricsMiddleware:
+	def __init__(self, app: ASGIApp):
+		self.app = app
+
+	async def __call__(self, scope: Scope, receive: Receive, send: Send):
+		if scope["type"] != "http":
+			await self.app(scope, receive, send)
+			return
+
+		status = "500"
+
+		async def send_with_status(message: Message):
+			nonlocal status
+			if message["type"] == "http.response.start":
+				status = str(message["status"])
+			await send(message)
+
+		IN_FLIGHT.inc()
+		start = time.perf_counter()
+		try:
+			await self.app(scope, receive, send_with_status)
+		finally:
+			IN_FLIGHT.dec()
+			route = route_label(scope)
+			REQUEST_SECONDS.observe(time.perf_counter() - start, scope["method"], route)
+			REQUESTS.inc(scope["method"], route, status)
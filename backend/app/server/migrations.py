@@ -0,0 +1,107 @@
+import json
+from typing import Callable, List, Set
+
+from sqlalchemy import Connection, Engine
+
+from .db_config import Base, Assessment, Question, AssessmentInstance, User, Answer, Image, content_hash
+
+# La versión del esquema se guarda en PRAGMA user_version de SQLite. Cada migración
+# debe ser idempotente: si el proceso muere a mitad, se vuelve a aplicar entera.
+
+def _columns(connection: Connection, table: str) -> Set[str]:
+	return {row[1] for row in connection.exec_driver_sql(f"PRAGMA table_info({table})")}
+
+def create_schema(connection: Connection):
+	Base.metadata.create_all(connection)
+
+def create_index(connection: Connection, model, name: str):
+	index = next(index for index in model.__table__.indexes if index.name == name)
+	index.create(connection, checkfirst=True)
+
+def create_lookup_indexes(connection: Connection):
+	for model in (Assessment, Question, AssessmentInstance, User, Answer):
+		columns = _columns(connection, model.__tablename__)
+		for index in model.__table__.indexes:
+			# Los índices de columnas añadidas más tarde los crea su propia migración
+			if all(column.name in columns for column in index.columns):
+				index.create(connection, checkfirst=True)
+
+def create_export_index(connection: Connection):
+	create_index(connection, Answer, 'ix_answer_instance_grading_graded_user')
+
+def create_image_table(connection: Connection):
+	Image.__table__.create(connection, checkfirst=True)
+
+def create_title_index(connection: Connection):
+	create_index(connection, Assessment, 'ix_assessment_title')
+
+def add_question_versions(connection: Connection):
+	# Columnas de las versiones con copia en escritura (ver versions.py). En una base de
+	# datos nueva ya las ha creado create_schema. En una existente se añaden y se rellenan
+	# a partir del modelo anterior, en el que cada versión copiaba todas las preguntas y
+	# todas las versiones antiguas apuntaban a la vigente con actual_assessment_id.
+	assessment_columns = _columns(connection, "assessment")
+	question_columns = _columns(connection, "question")
+	backfill = "retired_id" not in question_columns
+	for column in ("lineage_id", "head_id"):
+		if column not in assessment_columns:
+			connection.exec_driver_sql(f"ALTER TABLE assessment ADD COLUMN {column} INTEGER")
+	for column, type in (("lineage_id", "INTEGER"), ("retired_id", "INTEGER"), ("contentHash", "VARCHAR")):
+		if column not in question_columns:
+			connection.exec_driver_sql(f'ALTER TABLE question ADD COLUMN "{column}" {type}')
+
+	if backfill:
+		# Linaje: la vigente y las versiones que apuntan a ella; la primera es la de menor id
+		for head_id, oldest_id in connection.exec_driver_sql(
+			"SELECT actual_assessment_id, MIN(id) FROM assessment WHERE actual_assessment_id IS NOT NULL GROUP BY actual_assessment_id"
+		).all():
+			root_id = min(head_id, oldest_id)
+			connection.exec_driver_sql(
+				"UPDATE assessment SET lineage_id = ? WHERE (actual_assessment_id = ? OR id = ?) AND id != ?",
+				(root_id, head_id, head_id, root_id),
+			)
+			connection.exec_driver_sql("UPDATE assessment SET head_id = ? WHERE id = ?", (head_id, root_id))
+		connection.exec_driver_sql(
+			"UPDATE question SET lineage_id = (SELECT COALESCE(a.lineage_id, a.id) FROM assessment a WHERE a.id = question.assessment_id)"
+		)
+		# Las preguntas copiadas de cada versión antigua valen hasta la versión siguiente
+		connection.exec_driver_sql(
+			"UPDATE question SET retired_id = (SELECT MIN(a.id) FROM assessment a "
+			"WHERE (a.lineage_id = question.lineage_id OR a.id = question.lineage_id) AND a.id > question.assessment_id)"
+		)
+
+	rows = connection.exec_driver_sql(
+		'SELECT id, title, image, "questionType", "questionOrder", "selectOptions" FROM question WHERE "contentHash" IS NULL'
+	).all()
+	if rows:
+		connection.exec_driver_sql('UPDATE question SET "contentHash" = ? WHERE id = ?', [
+			(content_hash(title, image, question_type, order, json.loads(options) if options else None), question_id)
+			for question_id, title, image, question_type, order, options in rows
+		])
+	create_index(connection, Assessment, 'ix_assessment_lineage')
+	create_index(connection, Question, 'ix_question_lineage')
+
+MIGRATIONS: List[Callable[[Connection], None]] = [
+	create_schema,
+	create_lookup_indexes,
+	create_export_index,
+	create_image_table,
+	create_title_index,
+	add_question_versions,
+]
+
+def schema_version(connection: Connection) -> int:
+	return connection.exec_driver_sql("PRAGMA user_version").scalar()
+
+def migrate(engine: Engine) -> int:
+	with engine.begin() as connection:
+		# Con varios workers arrancando a la vez, el bloqueo de escritura serializa las
+		# migraciones: el segundo lee la versión ya actualizada y no hace nada
+		if engine.dialect.name == "sqlite":
+			connection.exec_driver_sql("BEGIN IMMEDIATE")
+		version = schema_version(connection)
+		for target, migration in enumerate(MIGRATIONS[version:], start=version + 1):
+			migration(connection)
+			connection.exec_driver_sql(f"PRAGMA user_version = {target}")
+		connection.exec_driver_sql("PRAGMA optimize")
+		return schema_version(connection)
@@ -0,0 +1,193 @@
+import os
+import random
+import re
+import threading
+import time
+from contextvars import ContextVar
+from typing import Dict, List, Optional
+
+from sqlalchemy import Engine, event
+from starlette.datastructures import MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from .metrics import route_label
+
+# Perfilado de SQL por petición. Un middleware ASGI marca una fracción de las
+# peticiones HTTP (profiling_sample_rate) y los eventos del engine de SQLAlchemy
+# anotan en ellas cada sentencia con su duración. Al terminar la petición se agrega
+# por ruta (la plantilla, p. ej. /assessment-instance/active/token={token}, nunca la
+# URL con el token): número de sentencias, tiempo en base de datos, las más lentas y
+# las sentencias idénticas repetidas muchas veces en una misma petición, que suelen
+# ser un N+1 (una consulta por fila en lugar de una carga en bloque).
+#
+# Las peticiones no muestreadas solo pagan un random() en el middleware y un
+# ContextVar.get() por sentencia. Con profiling_debug se perfilan todas y cada
+# respuesta lleva las cabeceras X-DB-*. El informe es por proceso.
+
+STATEMENTS_HEADER = "X-DB-Statements"
+TIME_HEADER = "X-DB-Time-Ms"
+N_PLUS_ONE_HEADER = "X-DB-N-Plus-One"
+HEADERS = [STATEMENTS_HEADER, TIME_HEADER, N_PLUS_ONE_HEADER]
+
+IN_LIST = re.compile(r"\bIN \(\s*\?(?:\s*,\s*\?)*\s*\)", re.IGNORECASE)
+WHITESPACE = re.compile(r"\s+")
+
+def normalize(statement: str) -> str:
+	# Las listas IN de distinta longitud cuentan como la misma sentencia
+	return IN_LIST.sub("IN (?, ...)", WHITESPACE.sub(" ", statement).strip())
+
+class RequestProfile:
+	__slots__ = ("count", "time", "statements")
+
+	def __init__(self):
+		self.count = 0
+		self.time = 0.0
+		# Sentencia -> [ejecuciones, tiempo total, tiempo máximo]
+		self.statements: Dict[str, list] = {}
+
+	def record(self, statement: str, elapsed: float):
+		self.count += 1
+		self.time += elapsed
+		entry = self.statements.get(statement)
+		if entry is None:
+			self.statements[statement] = [1, elapsed, elapsed]
+		else:
+			entry[0] += 1
+			entry[1] += elapsed
+			entry[2] = max(entry[2], elapsed)
+
+	def repeated(self, threshold: int) -> Dict[str, int]:
+		return {
+			statement: entry[0] for statement, entry in self.statements.items()
+			if entry[0] >= threshold and statement.startswith("SELECT")
+		}
+
+class RouteStats:
+	def __init__(self):
+		self.requests = 0
+		self.statements = 0
+		self.max_statements = 0
+		self.db_time = 0.0
+		self.request_time = 0.0
+		# Sentencia -> [peticiones en las que se repitió, máximo de repeticiones]
+		self.n_plus_one: Dict[str, list] = {}
+		# [(tiempo, sentencia)] de las más lentas, ordenadas de mayor a menor
+		self.slowest: List[tuple] = []
+
+_current: ContextVar[Optional[RequestProfile]] = ContextVar("sql_profile", default=None)
+
+class SQLProfiler:
+	def __init__(self, sample_rate: float, debug: bool, n_plus_one_threshold: int, slowest: int):
+		self.sample_rate = 1.0 if debug else sample_rate
+		self.debug = debug
+		self.n_plus_one_threshold = n_plus_one_threshold
+		self.slowest_count = slowest
+		self.routes: Dict[str, RouteStats] = {}
+		self.started = time.time()
+		self._lock = threading.Lock()
+
+	@property
+	def enabled(self) -> bool:
+		return self.sample_rate > 0
+
+	def install(self, engine: Engine):
+		if not self.enabled:
+			return
+
+		@event.listens_for(engine, "before_cursor_execute")
+		def before_cursor_execute(connection, cursor, statement, parameters, context, executemany):
+			if _current.get() is not None:
+				context._profiling_start = time.perf_counter()
+
+		@event.listens_for(engine, "after_cursor_execute")
+		def after_cursor_execute(connection, cursor, statement, parameters, context, executemany):
+			profile = _current.get()
+			start = getattr(context, "_profiling_start", None)
+			if profile is not None and start is not None:
+				profile.record(normalize(statement), time.perf_counter() - start)
+
+	def sampled(self) -> bool:
+		return self.sample_rate >= 1 or random.random() < self.sample_rate
+
+	def collect(self, route: str, profile: RequestProfile, elapsed: float):
+		repeated = profile.repeated(self.n_plus_one_threshold)
+		slowest = sorted(((entry[2], statement) for statement, entry in profile.statements.items()), reverse=True)[:self.slowest_count]
+		with self._lock:
+			stats = self.routes.get(route)
+			if stats is None:
+				stats = self.routes[route] = RouteStats()
+			stats.requests += 1
+			stats.statements += profile.count
+			stats.max_statements = max(stats.max_statements, profile.count)
+			stats.db_time += profile.time
+			stats.request_time += elapsed
+			for statement, count in repeated.items():
+				entry = stats.n_plus_one.setdefault(statement, [0, 0])
+				entry[0] += 1
+				entry[1] = max(entry[1], count)
+			# Cada sentencia aparece una vez, con su peor tiempo
+			merged = dict((statement, seconds) for seconds, statement in reversed(stats.slowest))
+			for seconds, statement in slowest:
+				merged[statement] = max(seconds, merged.get(statement, 0))
+			stats.slowest = sorted(((seconds, statement) for statement, seconds in merged.items()), reverse=True)[:self.slowest_count]
+
+	def report(self) -> dict:
+		with self._lock:
+			routes = [
+				{
+					"route": route,
+					"requests": stats.requests,
+					"statements_avg": round(stats.statements / stats.requests, 2),
+					"statements_max": stats.max_statements,
+					"db_time_ms_avg": round(stats.db_time / stats.requests * 1000, 3),
+					"db_time_ms_total": round(stats.db_time * 1000, 3),
+					"request_time_ms_avg": round(stats.request_time / stats.requests * 1000, 3),
+					"n_plus_one": [
+						{"statement": statement, "requests": requests, "max_repeats": repeats}
+						for statement, (requests, repeats) in sorted(stats.n_plus_one.items(), key=lambda item: -item[1][1])
+					],
+					"slowest": [{"statement": statement, "ms": round(seconds * 1000, 3)} for seconds, statement in stats.slowest],
+				}
+				for route, stats in self.routes.items()
+			]
+		routes.sort(key=lambda route: -route["db_time_ms_total"])
+		return {
+			"pid": os.getpid(),
+			"since": self.started,
+			"sample_rate": self.sample_rate,
+			"n_plus_one_threshold": self.n_plus_one_threshold,
+			"routes": routes,
+		}
+
+	def reset(self):
+		with self._lock:
+			self.routes = {}
+			self.started = time.time()
+
+class ProfilingMiddleware:
+	def __init__(self, app: ASGIApp, profiler: SQLProfiler):
+		self.app = app
+		self.profiler = profiler
+
+	async def __call__(self, scope: Scope, receive: Receive, send: Send):
+		if scope["type"] != "http" or not self.profiler.sampled():
+			await self.app(scope, receive, send)
+			return
+
+		profile = RequestProfile()
+		token = _current.set(profile)
+		start = time.perf_counter()
+
+		async def send_with_headers(message: Message):
+			if message["type"] == "http.response.start" and self.profiler.debug:
+				headers = MutableHeaders(scope=message)
+				headers.append(STATEMENTS_HEADER, str(profile.count))
+				headers.append(TIME_HEADER, f"{profile.time * 1000:.3f}")
+				headers.append(N_PLUS_ONE_HEADER, str(len(profile.repeated(self.profiler.n_plus_one_threshold))))
+			await send(message)
+
+		try:
+			await self.app(scope, receive, send_with_headers)
+		finally:
+			_current.reset(token)
+			self.profiler.collect(f"{scope['method']} {route_label(scope)}", profile, time.perf_counter() - start)
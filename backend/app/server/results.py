@@ -0,0 +1,193 @@
+import math
+from collections import Counter, defaultdict
+from typing import Dict, List, Optional
+
+from sqlalchemy import Engine, Float, and_, event, func, or_, select
+from sqlalchemy.orm import Session, aliased
+
+from .db_config import Answer, AssessmentInstance, Question, User
+from .versions import version_questions
+
+# Agregación de resultados de una evaluación en SQL: el cliente recibe estadísticas
+# por usuario evaluado y por pregunta en lugar de todas las respuestas en bruto.
+#
+# Las respuestas numéricas se guardan como texto. parse_number las interpreta igual al
+# guardarlas (la coma decimal se normaliza y lo que no es un número se rechaza) y al
+# agregarlas, como función SQL: las que no son un número (p. ej. guardadas antes de
+# validarlas) quedan fuera de las estadísticas en lugar de contar como 0.
+
+NUMBER_FUNCTION = "parse_number"
+
+def parse_number(text: Optional[str]) -> Optional[float]:
+	if text is None:
+		return None
+	try:
+		value = float(str(text).strip().replace(",", "."))
+	except ValueError:
+		return None
+	return value if math.isfinite(value) else None
+
+def normalize_number(text: str) -> Optional[str]:
+	# Texto con el que se guarda una respuesta numérica; None si no es un número
+	text = text.strip()
+	if not text:
+		return text
+	return text.replace(",", ".") if parse_number(text) is not None else None
+
+def install(engine: Engine):
+	@event.listens_for(engine, "connect")
+	def register_functions(dbapi_connection, connection_record):
+		dbapi_connection.create_function(NUMBER_FUNCTION, 1, parse_number, deterministic=True)
+
+def _number_stats(session: Session, assessment_instance_id: int, question_ids: List[int], keys: list, median: bool = True) -> Dict[tuple, dict]:
+	if not question_ids:
+		return {}
+	value = getattr(func, NUMBER_FUNCTION)(Answer.answerText, type_=Float)
+	numeric = and_(
+		Answer.assessment_instance_id == assessment_instance_id,
+		Answer.question_id.in_(question_ids),
+		value.is_not(None),
+	)
+
+	stats = {}
+	rows = session.execute(
+		select(*keys, func.count(), func.avg(value), func.min(value), func.max(value))
+		.where(numeric)
+		.group_by(*keys)
+	)
+	for *key, count, mean, minimum, maximum in rows:
+		stats[tuple(key)] = {"count": count, "mean": mean, "min": minimum, "max": maximum, "median": None}
+	if not median:
+		return stats
+
+	# Mediana con funciones de ventana: media de los uno o dos valores centrales
+	ranked = (
+		select(
+			*keys,
+			value.label("value"),
+			func.row_number().over(partition_by=keys, order_by=value).label("rn"),
+			func.count().over(partition_by=keys).label("n"),
+		)
+		.where(numeric)
+		.subquery()
+	)
+	ranked_keys = [ranked.c[key.key] for key in keys]
+	rows = session.execute(
+		select(*ranked_keys, func.avg(ranked.c.value))
+		.where(ranked.c.rn.in_([(ranked.c.n + 1) // 2, (ranked.c.n + 2) // 2]))
+		.group_by(*ranked_keys)
+	)
+	for *key, median in rows:
+		stats[tuple(key)]["median"] = median
+	return stats
+
+def _option_histograms(session: Session, assessment_instance_id: int, question_ids: List[int]) -> Dict[tuple, Counter]:
+	histograms = defaultdict(Counter)
+	if not question_ids:
+		return histograms
+	rows = session.execute(
+		select(Answer.graded_user_id, Answer.question_id, Answer.answerText, func.count())
+		.where(Answer.assessment_instance_id == assessment_instance_id, Answer.question_id.in_(question_ids))
+		.group_by(Answer.graded_user_id, Answer.question_id, Answer.answerText)
+	)
+	for graded_user_id, question_id, answer_text, count in rows:
+		histograms[(graded_user_id, question_id)][answer_text] += count
+		histograms[(question_id,)][answer_text] += count
+	return histograms
+
+def _question_stats(question: Question, key: tuple, counts: Counter, number_stats: dict, histograms: dict) -> dict:
+	stats = {"question_id": question.id, "questionType": question.questionType, "count": counts.get(key, 0)}
+	if question.questionType == "number":
+		stats.update(number_stats.get(key, {}))
+	elif question.questionType == "select":
+		options = {option["title"]: 0 for option in question.selectOptions or []}
+		options.update(histograms.get(key, {}))
+		stats["options"] = options
+	return stats
+
+def compute_results(session: Session, assessmentInstance: AssessmentInstance) -> dict:
+	instance_id = assessmentInstance.id
+	questions = (
+		session.query(Question)
+		.filter(version_questions(assessmentInstance.assessment_id))
+		.order_by(Question.questionOrder)
+		.all()
+	)
+	users = session.query(User).filter(User.assessment_instance_id == instance_id).order_by(User.order).all()
+	number_ids = [question.id for question in questions if question.questionType == "number"]
+	select_ids = [question.id for question in questions if question.questionType == "select"]
+
+	counts = Counter()
+	for graded_user_id, question_id, count in session.execute(
+		select(Answer.graded_user_id, Answer.question_id, func.count())
+		.where(Answer.assessment_instance_id == instance_id)
+		.group_by(Answer.graded_user_id, Answer.question_id)
+	):
+		counts[(graded_user_id, question_id)] += count
+		counts[(question_id,)] += count
+	# Solo cuentan los evaluadores que podían evaluarle (mismo grupo o votan a todos),
+	# los mismos que se esperan abajo, así que la compleción nunca pasa de 1
+	grading_user = aliased(User)
+	graded_user = aliased(User)
+	graders = dict(session.execute(
+		select(Answer.graded_user_id, func.count(func.distinct(Answer.grading_user_id)))
+		.join(grading_user, grading_user.id == Answer.grading_user_id)
+		.join(graded_user, graded_user.id == Answer.graded_user_id)
+		.where(
+			Answer.assessment_instance_id == instance_id,
+			or_(grading_user.group == graded_user.group, grading_user.voteEveryone == True),
+		)
+		.group_by(Answer.graded_user_id)
+	).all())
+	number_stats = _number_stats(session, instance_id, number_ids, [Answer.graded_user_id, Answer.question_id])
+	number_stats.update(_number_stats(session, instance_id, number_ids, [Answer.question_id]))
+	# Puntuación de cada evaluado: media de todas las respuestas numéricas que ha recibido
+	scores = _number_stats(session, instance_id, number_ids, [Answer.graded_user_id], median=False)
+	histograms = _option_histograms(session, instance_id, select_ids)
+
+	# Evaluadores esperados: los de su grupo más los que votan a todos, sin contarse a sí mismo
+	group_sizes = Counter(user.group for user in users)
+	vote_everyone = Counter(user.group for user in users if user.voteEveryone)
+	total_vote_everyone = sum(vote_everyone.values())
+
+	graded_users = []
+	total_graders = 0
+	total_expected = 0
+	for user in users:
+		if user.order == -1:
+			continue
+		expected = group_sizes[user.group] - 1 + total_vote_everyone - vote_everyone[user.group]
+		received = graders.get(user.id, 0)
+		score = scores.get((user.id,), {}).get("mean")
+		total_graders += received
+		total_expected += expected
+		graded_users.append({
+			"user_id": user.id,
+			"name": user.name,
+			"order": user.order,
+			"group": user.group,
+			"graders": received,
+			"expected_graders": expected,
+			"completion": received / expected if expected else 0.0,
+			"score": score,
+			"questions": [
+				_question_stats(question, (user.id, question.id), counts, number_stats, histograms)
+				for question in questions
+			],
+		})
+
+	# Clasificación por puntuación; los que no tienen respuestas numéricas, al final
+	ranking = sorted(graded_users, key=lambda graded: (graded["score"] is None, -(graded["score"] or 0), graded["order"]))
+
+	return {
+		"id": instance_id,
+		"title": assessmentInstance.title,
+		"assessment_id": assessmentInstance.assessment_id,
+		"completion": total_graders / total_expected if total_expected else 0.0,
+		"graded_users": graded_users,
+		"ranking": [{"user_id": graded["user_id"], "name": graded["name"], "score": graded["score"]} for graded in ranking],
+		"questions": [
+			_question_stats(question, (question.id,), counts, number_stats, histograms)
+			for question in questions
+		],
+	}
@@ -0,0 +1,90 @@
+from typing import Any, Iterable, Mapping, Optional
+
+import orjson
+from fastapi.responses import ORJSONResponse
+
+# Serialización directa de filas ORM a JSON. Las rutas de lectura construyen dicts
+# con la misma forma que los modelos JSON_*_Output (que siguen declarados como
+# response_model para la documentación) y los devuelven en un ORJSONResponse: FastAPI
+# no vuelve a validar la respuesta y orjson la codifica sin pasar por el codificador
+# estándar. Los datetime se serializan en ISO 8601 igual que con pydantic.
+
+def user_row(user) -> dict:
+	# Vale tanto para User como para LiveUser
+	return {
+		"id": user.id,
+		"name": user.name,
+		"email": user.email,
+		"order": user.order,
+		"group": user.group,
+		"pin": user.pin,
+		"voteEveryone": user.voteEveryone,
+	}
+
+def answer_row(answer) -> dict:
+	return {
+		"id": answer.id,
+		"assessment_instance_id": answer.assessment_instance_id,
+		"question_id": answer.question_id,
+		"grading_user_id": answer.grading_user_id,
+		"graded_user_id": answer.graded_user_id,
+		"answerText": answer.answerText,
+		"date": answer.date,
+	}
+
+def question_row(question, assessment_id: int) -> dict:
+	# Con las versiones, question.assessment_id es la versión que introdujo la pregunta;
+	# la respuesta lleva la versión que se está sirviendo, como antes de versionar
+	return {
+		"id": question.id,
+		"assessment_id": assessment_id,
+		"title": question.title,
+		"image": question.image,
+		"questionType": question.questionType,
+		"questionOrder": question.questionOrder,
+		"selectOptions": [{"title": option["title"]} for option in question.selectOptions or []],
+	}
+
+def assessment_row(assessment, questions: Optional[Iterable] = None) -> dict:
+	return {
+		"id": assessment.id,
+		"title": assessment.title,
+		"image": assessment.image,
+		"archived": assessment.archived,
+		"questions": None if questions is None else [question_row(question, assessment.id) for question in questions],
+	}
+
+def assessment_full_row(assessment, questions: Optional[Iterable] = None) -> dict:
+	return {
+		"id": assessment.id,
+		"title": assessment.title,
+		"image": assessment.image,
+		"archived": assessment.archived,
+		"createdAt": assessment.createdAt,
+		"updatedAt": assessment.updatedAt,
+		"questions": None if questions is None else [question_row(question, assessment.id) for question in questions],
+		"assessmentInstances": None,
+	}
+
+def instance_row(instance, users: Optional[list] = None, answers: Optional[list] = None, assessment: Optional[dict] = None, **extra) -> dict:
+	row = {
+		"id": instance.id,
+		"title": instance.title,
+		"assessment_id": instance.assessment_id,
+		"users": users,
+		"actual_user": None,
+		"active": instance.active,
+		"finished": instance.finished,
+		"answers": answers,
+		"assessment": assessment,
+		"userCount": None,
+		"seq": None,
+	}
+	row.update(extra)
+	return row
+
+def dumps(content: Any) -> bytes:
+	return orjson.dumps(content, default=str)
+
+def json_response(content: Any, headers: Optional[Mapping[str, str]] = None) -> ORJSONResponse:
+	return ORJSONResponse(content, headers=headers)
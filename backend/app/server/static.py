@@ -0,0 +1,110 @@
+import gzip
+import mimetypes
+import os
+
+from anyio import to_thread
+from fastapi import FastAPI
+from fastapi.routing import APIRoute
+from starlette.datastructures import Headers
+from starlette.exceptions import HTTPException
+from starlette.responses import FileResponse, Response
+from starlette.staticfiles import NotModifiedResponse, StaticFiles
+from starlette.types import Scope
+
+try:
+	import brotli
+except ImportError:
+	brotli = None
+
+# Frontend compilado (npm run build) servido por la propia API en modo producción.
+# Los ficheros de build/static llevan el hash del contenido en el nombre, así que se
+# cachean un año como inmutables; index.html y el resto se revalidan siempre para que
+# un build nuevo se vea al recargar. Si junto a un fichero hay una versión
+# precomprimida (.br o .gz, generadas por precompress) y el navegador la acepta, se
+# sirve esa. Las rutas del router de React que no son ficheros devuelven index.html.
+
+IMMUTABLE = "public, max-age=31536000, immutable"
+REVALIDATE = "no-cache"
+COMPRESSIBLE = (".html", ".js", ".css", ".json", ".map", ".svg", ".txt", ".ico")
+MIN_COMPRESS_SIZE = 1024
+# En orden de preferencia
+ENCODINGS = (("br", ".br"), ("gzip", ".gz"))
+
+def accepted_encodings(scope: Scope) -> set:
+	header = Headers(scope=scope).get("accept-encoding", "")
+	return {part.split(";")[0].strip() for part in header.split(",")}
+
+class FrontendFiles(StaticFiles):
+	def __init__(self, directory: str):
+		super().__init__(directory=directory, html=True)
+
+	async def get_response(self, path: str, scope: Scope) -> Response:
+		try:
+			return await super().get_response(path, scope)
+		except HTTPException as e:
+			# Una ruta del router de React (sin extensión): se sirve la aplicación
+			if e.status_code != 404 or os.path.splitext(path)[1]:
+				raise
+			full_path, stat_result = await to_thread.run_sync(self.lookup_path, "index.html")
+			if stat_result is None:
+				raise
+			return self.file_response(full_path, stat_result, scope)
+
+	def file_response(self, full_path, stat_result: os.stat_result, scope: Scope, status_code: int = 200) -> Response:
+		relative = os.path.relpath(os.path.realpath(full_path), os.path.realpath(self.directory)).replace(os.sep, "/")
+		headers = {"Cache-Control": IMMUTABLE if relative.startswith("static/") else REVALIDATE}
+		media_type = None
+		if full_path.endswith(COMPRESSIBLE):
+			headers["Vary"] = "Accept-Encoding"
+			accepted = accepted_encodings(scope)
+			for encoding, suffix in ENCODINGS:
+				if encoding in accepted and os.path.isfile(full_path + suffix):
+					# El tipo es el del original, no el del .br/.gz
+					media_type = mimetypes.guess_type(full_path)[0]
+					full_path = full_path + suffix
+					stat_result = os.stat(full_path)
+					headers["Content-Encoding"] = encoding
+					break
+
+		response = FileResponse(full_path, status_code=status_code, headers=headers, media_type=media_type, stat_result=stat_result)
+		if self.is_not_modified(response.headers, Headers(scope=scope)):
+			return NotModifiedResponse(response.headers)
+		return response
+
+def precompress(directory: str) -> int:
+	# Genera las versiones .gz (y .br si está instalado brotli) de los ficheros de
+	# texto del build. Los que ya están al día no se vuelven a comprimir.
+	written = 0
+	for root, _, files in os.walk(directory):
+		for name in files:
+			path = os.path.join(root, name)
+			if not name.endswith(COMPRESSIBLE) or os.path.getsize(path) < MIN_COMPRESS_SIZE:
+				continue
+			mtime = os.stat(path).st_mtime
+			with open(path, "rb") as file:
+				data = None
+				for suffix, compress in ((".gz", lambda raw: gzip.compress(raw, compresslevel=9, mtime=0)), (".br", brotli and brotli.compress)):
+					target = path + suffix
+					if compress is None or os.path.isfile(target) and os.stat(target).st_mtime >= mtime:
+						continue
+					data = data if data is not None else file.read()
+					with open(target, "wb") as out:
+						out.write(compress(data))
+					written += 1
+	return written
+
+def mount_frontend(app: FastAPI, directory: str):
+	if not os.path.isfile(os.path.join(directory, "index.html")):
+		raise RuntimeError(f"No se encuentra el frontend compilado en {directory} (npm run build)")
+
+	async def index(request):
+		return await app.state.frontend.get_response("index.html", request.scope)
+
+	# Rutas del frontend que coinciden con una ruta POST de la API (p. ej. /login):
+	# sin esto un GET al recargar la página daría 405 en lugar de la aplicación
+	for route in list(app.routes):
+		if isinstance(route, APIRoute) and "GET" not in route.methods and "{" not in route.path:
+			app.add_route(route.path, index, methods=["GET", "HEAD"], include_in_schema=False)
+
+	app.state.frontend = FrontendFiles(directory)
+	app.mount("/", app.state.frontend, name="frontend")
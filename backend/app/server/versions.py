@@ -0,0 +1,142 @@
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Dict, List, Optional, Set
+
+from sqlalchemy import and_, func, or_, select
+from sqlalchemy.orm import Session
+
+from .db_config import Assessment, Question, content_hash
+
+# Versiones de una evaluación con copia en escritura. Una evaluación que ya se ha jugado
+# no se modifica: al editarla se crea una versión nueva y las partidas anteriores siguen
+# apuntando a la suya. Todas las versiones forman un linaje identificado por la primera.
+#
+# - Una pregunta pertenece al linaje y vale desde la versión en la que se introdujo
+#   (assessment_id) hasta la versión en la que se retiró (retired_id, exclusiva). Las
+#   preguntas que no cambian se comparten entre versiones sin copiarlas; cambiar una
+#   pregunta la retira y añade una fila nueva. Editar una pregunta de 200 escribe una
+#   sola fila de pregunta, y las respuestas a las preguntas compartidas siguen
+#   apuntando al mismo id en todas las versiones.
+# - contentHash (sha256 del contenido) decide si una pregunta enviada ha cambiado.
+# - La primera versión guarda en head_id la vigente, así que llegar a la vigente desde
+#   cualquier versión son dos búsquedas por clave. actual_assessment_id indica qué
+#   versión sustituyó a cada una (None en la vigente, que es lo que filtra el listado)
+#   y al crear una versión solo se actualiza la anterior.
+#
+# Los ids de las versiones de un linaje son crecientes, así que "versión v o anterior"
+# es assessment_id <= v.
+
+@dataclass
+class QuestionContent:
+	title: str
+	image: Optional[str]
+	questionType: str
+	questionOrder: int
+	selectOptions: List[dict]
+
+	@property
+	def hash(self) -> str:
+		return content_hash(self.title, self.image, self.questionType, self.questionOrder, self.selectOptions)
+
+def lineage_of(assessment: Assessment) -> int:
+	return assessment.lineage_id or assessment.id
+
+def version_questions(assessment_id: int):
+	# Condición sobre Question con las preguntas de una versión, sin cargarla antes
+	lineage = select(func.coalesce(Assessment.lineage_id, Assessment.id)).where(Assessment.id == assessment_id).scalar_subquery()
+	return and_(
+		Question.lineage_id == lineage,
+		Question.assessment_id <= assessment_id,
+		or_(Question.retired_id.is_(None), Question.retired_id > assessment_id),
+	)
+
+def lineage_versions(lineage_id: int):
+	return or_(Assessment.id == lineage_id, Assessment.lineage_id == lineage_id)
+
+def head_of(session: Session, assessment: Assessment) -> Assessment:
+	root = assessment if assessment.lineage_id is None else session.get(Assessment, assessment.lineage_id)
+	if root is None or root.head_id is None:
+		return root or assessment
+	return session.get(Assessment, root.head_id)
+
+def _new_question(version: Assessment, lineage_id: int, content: QuestionContent, now: datetime) -> Question:
+	return Question(
+		assessment_id=version.id,
+		lineage_id=lineage_id,
+		title=content.title,
+		image=content.image,
+		questionType=content.questionType,
+		questionOrder=content.questionOrder,
+		selectOptions=content.selectOptions,
+		contentHash=content.hash,
+		createdAt=now,
+		updatedAt=now,
+	)
+
+def edit_version(session: Session, assessment: Assessment, title: Optional[str], image: Optional[str], questions: List[tuple], deleted_ids: Set[int], versioned: bool) -> Assessment:
+	"""Aplica una edición a la versión vigente de `assessment` y devuelve la versión editada.
+
+	`questions` son pares (id o None, QuestionContent). Con `versioned` se crea una
+	versión nueva y las preguntas vigentes que no se envían se retiran; si no, se edita
+	la vigente en su sitio (solo las preguntas que no comparte con versiones anteriores).
+	"""
+	now = datetime.now()
+	head = head_of(session, assessment)
+	lineage_id = lineage_of(head)
+	current: Dict[int, Question] = {question.id: question for question in head.questions}
+
+	if versioned:
+		version = Assessment(
+			title=title or head.title,
+			image=image,
+			lineage_id=lineage_id,
+			createdAt=now,
+			updatedAt=now,
+		)
+		session.add(version)
+		session.flush()
+		head.actual_assessment_id = version.id
+		root = head if head.id == lineage_id else session.get(Assessment, lineage_id)
+		root.head_id = version.id
+		sent = {question_id for question_id, _ in questions if question_id is not None}
+		deleted_ids = deleted_ids | (current.keys() - sent)
+	else:
+		version = head
+		if title:
+			version.title = title
+		if image:
+			version.image = image
+		version.updatedAt = now
+
+	def retire(question: Question):
+		# Las preguntas introducidas en esta misma versión no las ve ninguna otra
+		if question.assessment_id == version.id:
+			session.delete(question)
+		else:
+			question.retired_id = version.id
+
+	for question_id, content in questions:
+		question = current.get(question_id)
+		if question is None:
+			session.add(_new_question(version, lineage_id, content, now))
+			continue
+		if question.contentHash == content.hash:
+			continue
+		if question.assessment_id == version.id:
+			question.title = content.title
+			question.image = content.image
+			question.questionType = content.questionType
+			question.questionOrder = content.questionOrder
+			question.selectOptions = content.selectOptions
+			question.contentHash = content.hash
+			question.updatedAt = now
+		else:
+			retire(question)
+			session.add(_new_question(version, lineage_id, content, now))
+
+	for question_id in deleted_ids:
+		question = current.get(question_id)
+		if question is not None:
+			retire(question)
+
+	return version
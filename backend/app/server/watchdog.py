@@ -0,0 +1,134 @@
+import asyncio
+import logging
+import statistics
+import sys
+import threading
+import time
+import traceback
+from collections import deque
+from typing import Deque, Dict, Optional
+
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+from .metrics import LOOP_LAG, LOOP_STALLS, route_label
+
+# Vigilancia del event loop. Una tarea se despierta cada `interval` y mide cuánto
+# tarde lo hace: ese retraso es el tiempo que el loop ha estado ocupado con otra cosa
+# (trabajo síncrono dentro de un `async def`, un print a una consola lenta...), y
+# durante ese tiempo ningún websocket recibe nada. Las medidas van al histograma de
+# /metrics y a los percentiles de /debug/loop.
+#
+# Mientras el loop está bloqueado la tarea no puede ejecutarse, así que la pila la
+# captura un hilo aparte: si el despertar se retrasa más de `threshold`, toma la pila
+# del hilo del loop en ese momento (la del código que está bloqueando) y la atribuye
+# a la ruta o al websocket de la tarea en curso. El middleware registra qué tarea
+# atiende cada petición; las tareas sin petición (backplane, envíos) se identifican
+# por el nombre de su corrutina.
+
+logger = logging.getLogger(__name__)
+
+STACK_FRAMES = 25
+LAG_SAMPLES = 2400
+STALLS_KEPT = 50
+
+class LoopWatchdog:
+	def __init__(self, interval: float, threshold: float):
+		self.interval = interval
+		self.threshold = threshold
+		self.running: Dict[asyncio.Task, Scope] = {}
+		self.lags: Deque[float] = deque(maxlen=LAG_SAMPLES)
+		self.stalls: Deque[dict] = deque(maxlen=STALLS_KEPT)
+		self._loop: Optional[asyncio.AbstractEventLoop] = None
+		self._loop_thread: Optional[int] = None
+		self._deadline = 0.0
+		self._captured: Optional[dict] = None
+		self._ticker: Optional[asyncio.Task] = None
+		self._stopped = threading.Event()
+
+	async def start(self):
+		self._loop = asyncio.get_running_loop()
+		self._loop_thread = threading.get_ident()
+		self._deadline = time.monotonic() + self.interval
+		self._stopped.clear()
+		self._ticker = asyncio.create_task(self._tick())
+		threading.Thread(target=self._watch, name="loop-watchdog", daemon=True).start()
+
+	async def stop(self):
+		self._stopped.set()
+		if self._ticker is not None:
+			self._ticker.cancel()
+			self._ticker = None
+
+	async def _tick(self):
+		previous_lag = 0.0
+		while True:
+			deadline = self._deadline = time.monotonic() + self.interval
+			await asyncio.sleep(self.interval)
+			lag = max(0.0, time.monotonic() - deadline)
+			self.lags.append(lag)
+			LOOP_LAG.observe(lag)
+			stall = self._captured
+			if stall is not None:
+				# El bloqueo ha terminado: se completa con su duración real. Si el hilo lo
+				# capturó justo cuando el loop ya despertaba, es el de la vuelta anterior.
+				self._captured = None
+				stall["lag_ms"] = round((lag if stall.pop("deadline") == deadline else previous_lag) * 1000, 1)
+				self.stalls.append(stall)
+				LOOP_STALLS.inc(stall["route"])
+				logger.warning("Event loop bloqueado %s ms en %s", stall["lag_ms"], stall["route"], extra={"stack": stall["stack"][-3:]})
+			previous_lag = lag
+
+	def _watch(self):
+		while not self._stopped.wait(self.interval / 2):
+			deadline = self._deadline
+			if self._captured is None and time.monotonic() - deadline > self.threshold:
+				self._captured = self._capture(deadline)
+
+	def _capture(self, deadline: float) -> dict:
+		frame = sys._current_frames().get(self._loop_thread)
+		stack = traceback.format_stack(frame)[-STACK_FRAMES:] if frame is not None else []
+		task = asyncio.current_task(self._loop)
+		scope = self.running.get(task)
+		if scope is not None:
+			route = f"{scope.get('method', 'WS')} {route_label(scope)}"
+		elif task is not None:
+			route = getattr(task.get_coro(), "__qualname__", task.get_name())
+		else:
+			route = "(fuera de una tarea)"
+		return {"time": time.time(), "deadline": deadline, "route": route, "stack": [line.rstrip() for line in stack]}
+
+	def report(self) -> dict:
+		lags = sorted(self.lags)
+		percentiles = {}
+		if len(lags) > 1:
+			quantiles = statistics.quantiles(lags, n=100, method="inclusive")
+			percentiles = {
+				"p50_ms": round(quantiles[49] * 1000, 2),
+				"p95_ms": round(quantiles[94] * 1000, 2),
+				"p99_ms": round(quantiles[98] * 1000, 2),
+				"max_ms": round(lags[-1] * 1000, 2),
+			}
+		return {
+			"interval_ms": self.interval * 1000,
+			"threshold_ms": self.threshold * 1000,
+			"samples": len(lags),
+			"lag": percentiles,
+			"stalls": list(reversed(self.stalls)),
+		}
+
+class LoopWatchdogMiddleware:
+	def __init__(self, app: ASGIApp, watchdog: LoopWatchdog):
+		self.app = app
+		self.watchdog = watchdog
+
+	async def __call__(self, scope: Scope, receive: Receive, send: Send):
+		if scope["type"] not in ("http", "websocket"):
+			await self.app(scope, receive, send)
+			return
+		# Se guarda el scope: la ruta solo se conoce cuando el router la ha resuelto
+		task = asyncio.current_task()
+		self.watchdog.running[task] = scope
+		try:
+			await self.app(scope, receive, send)
+		finally:
+			self.watchdog.running.pop(task, None)
@@ -0,0 +1,86 @@
+"""Latencia de /user/answer con muchos evaluadores enviando a la vez.
+
+Uso (desde backend/): python bench/bench_answers.py --graders 50 --questions 10
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+APP_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "app")
+
+def setup_database(graders: int, questions: int):
+	from server.database import engine, session_scope
+	from server.db_config import Assessment, Question, AssessmentInstance, User
+	from server.migrations import migrate
+
+	migrate(engine)
+	with session_scope() as session:
+		assessment = Assessment(title="bench")
+		session.add(assessment)
+		session.flush()
+		session.add_all([
+			Question(assessment_id=assessment.id, title=f"q{i}", questionType="number", questionOrder=i, selectOptions=[])
+			for i in range(questions)
+		])
+		instance = AssessmentInstance(title="bench", assessment_id=assessment.id, active=True)
+		session.add(instance)
+		session.flush()
+		users = [
+			User(name=f"u{i}", email=f"u{i}@bench", assessment_instance_id=instance.id, order=i, group=0, pin=f"{i:06d}")
+			for i in range(graders + 1)
+		]
+		session.add_all(users)
+		session.flush()
+		instance.actual_user_id = users[0].id
+		question_ids = [question.id for question in assessment.questions]
+		return instance.id, [user.id for user in users[1:]], question_ids
+
+async def run(graders: int, questions: int, rounds: int):
+	import httpx
+	from server.api import app
+	from server.auth import auth
+
+	instance_id, grader_ids, question_ids = setup_database(graders, questions)
+	tokens = [auth.issue_user_token(user_id, instance_id) for user_id in grader_ids]
+	payload = {"answers": [{"question_id": question_id, "answerText": "5"} for question_id in question_ids]}
+	latencies = []
+	errors = 0
+
+	async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench") as client:
+		async def submit(token):
+			nonlocal errors
+			start = time.perf_counter()
+			response = await client.post(f"/user/answer/token={token}", json=payload)
+			latencies.append(time.perf_counter() - start)
+			if response.status_code != 200:
+				errors += 1
+
+		start = time.perf_counter()
+		for _ in range(rounds):
+			await asyncio.gather(*(submit(token) for token in tokens))
+		elapsed = time.perf_counter() - start
+
+	latencies.sort()
+	quantiles = statistics.quantiles(latencies, n=100)
+	print(f"graders={graders} questions={questions} rounds={rounds} submissions={len(latencies)} errors={errors}")
+	print(f"p50={quantiles[49] * 1000:.1f}ms p95={quantiles[94] * 1000:.1f}ms max={latencies[-1] * 1000:.1f}ms")
+	print(f"throughput={len(latencies) / elapsed:.0f} envíos/s")
+
+def main():
+	parser = argparse.ArgumentParser()
+	parser.add_argument("--graders", type=int, default=50)
+	parser.add_argument("--questions", type=int, default=10)
+	parser.add_argument("--rounds", type=int, default=5)
+	args = parser.parse_args()
+
+	workdir = tempfile.mkdtemp()
+	os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(workdir, 'bench.db')}"
+	sys.path.insert(0, APP_DIR)
+	asyncio.run(run(args.graders, args.questions, args.rounds))
+
+if __name__ == "__main__":
+	main()
@@ -0,0 +1,294 @@
+"""Simulación de una clase completa en directo contra el servidor real.
+
+Crea una evaluación con N alumnos repartidos en grupos (algunos con voteEveryone) y
+la juega entera como lo haría el frontend:
+
+- el administrador abre /assessment-instance/{ID}/start;
+- cada alumno entra por /user-login y mantiene su websocket /play;
+- en cada ronda el administrador llama a /next. Al recibir el evento, cada alumno
+  pide /assessment-instance/active y, si le toca evaluar (mismo grupo o
+  voteEveryone), envía /user/answer;
+- la ronda termina cuando el administrador ha recibido todas las respuestas
+  esperadas.
+
+Mide la latencia de cada endpoint (p50/p95/p99/máx. y errores). También mide el
+reparto de los broadcast: desde la llamada a /next hasta que el evento llega a
+cada alumno, y desde cada /user/answer hasta que el administrador recibe el
+ANSWER. Escribe el resultado en JSON (stdout o --output) para compararlo entre
+versiones.
+
+El servidor se arranca en el mismo proceso (uvicorn en un hilo) o, con --workers N,
+como subproceso con N workers y el backplane SQLite.
+
+Uso (desde backend/): python bench/bench_classroom.py --students 60 --groups 4 --vote-everyone 3 [--workers 4] [--output resultado.json]
+"""
+import argparse
+import asyncio
+import contextlib
+import json
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from collections import defaultdict
+
+from bench_rooms import APP_DIR, free_port, start_server, start_workers
+
+def setup_database(students: int, groups: int, vote_everyone: int, questions: int):
+	from server.database import engine, session_scope
+	from server.db_config import Assessment, AssessmentInstance, Question, User
+	from server.migrations import migrate
+
+	migrate(engine)
+	with session_scope() as session:
+		assessment = Assessment(title="clase")
+		session.add(assessment)
+		session.flush()
+		session.add_all([
+			Question(assessment_id=assessment.id, title=f"q{i}", questionType="number", questionOrder=i, selectOptions=[])
+			for i in range(questions)
+		])
+		instance = AssessmentInstance(title="clase", assessment_id=assessment.id)
+		session.add(instance)
+		session.flush()
+		users = [
+			User(
+				name=f"alumno{i}", email=f"alumno{i}@bench", assessment_instance_id=instance.id, order=i,
+				group=i % groups, pin=f"{i:06d}", voteEveryone=i < vote_everyone,
+			)
+			for i in range(students)
+		]
+		session.add_all(users)
+		session.flush()
+		roster = [{"id": user.id, "pin": user.pin, "group": user.group, "voteEveryone": user.voteEveryone} for user in users]
+		return instance.id, roster, [question.id for question in assessment.questions]
+
+def summary(values: list) -> dict:
+	if not values:
+		return {"count": 0}
+	values = sorted(values)
+	quantiles = statistics.quantiles(values, n=100) if len(values) > 1 else values * 99
+	return {
+		"count": len(values),
+		"p50_ms": round(quantiles[49] * 1000, 2),
+		"p95_ms": round(quantiles[94] * 1000, 2),
+		"p99_ms": round(quantiles[98] * 1000, 2),
+		"max_ms": round(values[-1] * 1000, 2),
+	}
+
+class Metrics:
+	def __init__(self):
+		self.latencies = defaultdict(list)
+		self.errors = defaultdict(int)
+
+	def endpoints(self) -> dict:
+		return {
+			name: {**summary(self.latencies[name]), "errors": self.errors[name]}
+			for name in sorted(set(self.latencies) | set(self.errors))
+		}
+
+class Inbox:
+	# Mensajes recibidos por un websocket con la hora de llegada
+	def __init__(self, websocket):
+		self.websocket = websocket
+		self.messages = []
+		self.changed = asyncio.Event()
+
+	async def read(self):
+		try:
+			async for raw in self.websocket:
+				self.messages.append((time.perf_counter(), json.loads(raw)))
+				self.changed.set()
+		except Exception:
+			pass
+		self.changed.set()
+
+	async def wait_for(self, predicate, start: int = 0, timeout: float = 30):
+		deadline = time.perf_counter() + timeout
+		index = start
+		while True:
+			while index < len(self.messages):
+				received_at, message = self.messages[index]
+				index += 1
+				if predicate(message):
+					return received_at, message
+			remaining = deadline - time.perf_counter()
+			if remaining <= 0:
+				return None, None
+			self.changed.clear()
+			try:
+				await asyncio.wait_for(self.changed.wait(), remaining)
+			except asyncio.TimeoutError:
+				return None, None
+
+async def run(args, workdir: str) -> dict:
+	import httpx
+	import websockets
+	from server.auth import auth
+
+	instance_id, roster, question_ids = setup_database(args.students, args.groups, args.vote_everyone, args.questions)
+	port = free_port()
+	stop = start_workers(port, args.workers, workdir) if args.workers > 1 else start_server(port)
+	base = f"127.0.0.1:{port}"
+	admin_token = auth.issue_admin_token()
+	payload = {"answers": [{"question_id": question_id, "answerText": "7"} for question_id in question_ids]}
+	metrics = Metrics()
+	next_fanout = []
+	answer_fanout = []
+	answers_sent = 0
+	# Comprobaciones de la sesión, aparte de los errores HTTP de cada endpoint
+	checks = {"next_not_delivered": 0, "answers_not_delivered": 0, "eligibility_mismatches": 0}
+	tasks = []
+
+	async with httpx.AsyncClient(base_url=f"http://{base}", timeout=30, limits=httpx.Limits(max_connections=args.students + 10)) as client:
+		async def request(name: str, method: str, path: str, **kwargs):
+			start = time.perf_counter()
+			try:
+				response = await client.request(method, path, **kwargs)
+			except httpx.HTTPError:
+				metrics.errors[name] += 1
+				return None
+			metrics.latencies[name].append(time.perf_counter() - start)
+			if response.status_code != 200:
+				metrics.errors[name] += 1
+				return None
+			return response
+
+		async def connect(name: str, url: str) -> Inbox:
+			start = time.perf_counter()
+			inbox = Inbox(await websockets.connect(url, max_size=None))
+			metrics.latencies[name].append(time.perf_counter() - start)
+			tasks.append(asyncio.create_task(inbox.read()))
+			return inbox
+
+		admin = await connect("ws_start", f"ws://{base}/assessment-instance/{instance_id}/start/token={admin_token}")
+		await admin.wait_for(lambda message: True)
+
+		async def join(student: dict):
+			response = await request("user_login", "POST", "/user-login", json={"pin": student["pin"]})
+			student["token"] = response.json()["token"]
+			student["inbox"] = await connect("ws_play", f"ws://{base}/play/token={student['token']}")
+
+		await asyncio.gather(*(join(student) for student in roster))
+
+		async def play(student: dict) -> bool:
+			if args.think_ms:
+				await asyncio.sleep(random.uniform(0, args.think_ms) / 1000)
+			response = await request("active", "GET", f"/assessment-instance/active/token={student['token']}")
+			if response is None or not response.json().get("assessment"):
+				return False
+			sent_at = time.perf_counter()
+			if await request("answer", "POST", f"/user/answer/token={student['token']}", json=payload) is None:
+				return False
+			student["sent_at"] = sent_at
+			return True
+
+		by_id = {student["id"]: student for student in roster}
+		rounds = min(args.rounds or args.students, args.students)
+		start = time.perf_counter()
+		actual_user_id = roster[0]["id"]
+		for round_number in range(rounds):
+			if round_number > 0:
+				marks = [len(student["inbox"].messages) for student in roster]
+				sent_at = time.perf_counter()
+				await request("next", "POST", f"/assessment-instance/{instance_id}/next/token={admin_token}")
+				arrivals = await asyncio.gather(*(
+					student["inbox"].wait_for(lambda message: message.get("event") == "NEXT", mark)
+					for student, mark in zip(roster, marks)
+				))
+				received = [received_at for received_at, _ in arrivals if received_at is not None]
+				checks["next_not_delivered"] += len(arrivals) - len(received)
+				next_fanout.extend(received_at - sent_at for received_at in received)
+				actual_user_id = next((message["actual_user_id"] for _, message in arrivals if message), actual_user_id)
+
+			admin_mark = len(admin.messages)
+			actual = by_id[actual_user_id]
+			expected = sum(
+				1 for student in roster
+				if student["id"] != actual_user_id and (student["voteEveryone"] or student["group"] == actual["group"])
+			)
+			answered = sum(await asyncio.gather(*(play(student) for student in roster)))
+			answers_sent += answered
+			checks["eligibility_mismatches"] += abs(expected - answered)
+
+			# El administrador tiene que ver todas las respuestas de la ronda
+			pending = {student["id"] for student in roster if "sent_at" in student}
+			while pending:
+				received_at, message = await admin.wait_for(
+					lambda message: message.get("event") == "ANSWER" and message.get("user_id") in pending, admin_mark
+				)
+				if message is None:
+					checks["answers_not_delivered"] += len(pending)
+					break
+				pending.discard(message["user_id"])
+				answer_fanout.append(received_at - by_id[message["user_id"]]["sent_at"])
+			for student in roster:
+				student.pop("sent_at", None)
+		elapsed = time.perf_counter() - start
+
+		await admin.websocket.send("CLOSE")
+		await asyncio.sleep(0.5)
+		await admin.websocket.close()
+		for student in roster:
+			await student["inbox"].websocket.close()
+		await asyncio.gather(*tasks)
+
+	stop()
+	return {
+		"config": {
+			"students": args.students,
+			"groups": args.groups,
+			"vote_everyone": args.vote_everyone,
+			"questions": args.questions,
+			"rounds": rounds,
+			"workers": args.workers,
+			"think_ms": args.think_ms,
+		},
+		"duration_s": round(elapsed, 3),
+		"throughput": {
+			"answers": answers_sent,
+			"answers_per_s": round(answers_sent / elapsed, 1),
+			"requests_per_s": round(sum(len(values) for values in metrics.latencies.values()) / elapsed, 1),
+		},
+		"endpoints": metrics.endpoints(),
+		"broadcast": {
+			"next_to_students": summary(next_fanout),
+			"answer_to_admin": summary(answer_fanout),
+		},
+		"checks": checks,
+		"errors": sum(metrics.errors.values()) + sum(checks.values()),
+	}
+
+def main():
+	parser = argparse.ArgumentParser()
+	parser.add_argument("--students", type=int, default=30)
+	parser.add_argument("--groups", type=int, default=3)
+	parser.add_argument("--vote-everyone", type=int, default=2)
+	parser.add_argument("--questions", type=int, default=5)
+	parser.add_argument("--rounds", type=int, default=0, help="por defecto, una por alumno")
+	parser.add_argument("--think-ms", type=float, default=0, help="retraso aleatorio máximo de cada alumno antes de responder")
+	parser.add_argument("--workers", type=int, default=1)
+	parser.add_argument("--seed", type=int, default=1)
+	parser.add_argument("--output", help="fichero JSON de salida (por defecto, stdout)")
+	args = parser.parse_args()
+	if args.students < 2 or args.groups < 1:
+		parser.error("hacen falta al menos 2 alumnos y 1 grupo")
+	random.seed(args.seed)
+
+	workdir = tempfile.mkdtemp()
+	os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(workdir, 'bench.db')}"
+	sys.path.insert(0, APP_DIR)
+	# El servidor en proceso escribe en stdout: se desvía para que el JSON salga limpio
+	with contextlib.redirect_stdout(sys.stderr):
+		result = asyncio.run(run(args, workdir))
+	output = json.dumps(result, indent=2, ensure_ascii=False)
+	if args.output:
+		with open(args.output, "w") as file:
+			file.write(output + "\n")
+	else:
+		print(output)
+
+if __name__ == "__main__":
+	main()
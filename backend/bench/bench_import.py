@@ -0,0 +1,77 @@
+"""Importación de un banco de preguntas grande: ruta de creación una a una frente a /assessment/import.
+
+Genera un banco sintético (evaluaciones × preguntas) y lo importa de dos formas sobre
+bases de datos temporales distintas: llamando a /assessment/create por cada
+evaluación, como hacía el frontend, y subiendo un único .lgqzl a /assessment/import.
+
+Uso (desde backend/): python bench/bench_import.py --assessments 500 --questions 20
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+
+APP_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "app")
+
+def bank(assessments: int, questions: int) -> list:
+	types = ["text", "number", "select"]
+	return [
+		{
+			"title": f"Banco {i}",
+			"image": None,
+			"questions": [
+				{
+					"title": f"Pregunta {j}",
+					"image": None,
+					"questionType": types[j % 3],
+					"questionOrder": j,
+					"selectOptions": [{"title": "Sí"}, {"title": "No"}] if types[j % 3] == "select" else [],
+				}
+				for j in range(questions)
+			],
+		}
+		for i in range(assessments)
+	]
+
+def run(mode: str, assessments: list):
+	from fastapi.testclient import TestClient
+	from server.api import app
+	from server.auth import auth
+
+	token = auth.issue_admin_token()
+	with TestClient(app) as client:
+		start = time.perf_counter()
+		if mode == "create":
+			for assessment in assessments:
+				client.post(f"/assessment/create/token={token}", json=assessment).raise_for_status()
+		else:
+			content = "\n".join(json.dumps(assessment, ensure_ascii=False) for assessment in assessments).encode("utf-8")
+			response = client.post(f"/assessment/import/token={token}?localize=false", files=[("files", ("banco.lgqzl", content))])
+			response.raise_for_status()
+		elapsed = time.perf_counter() - start
+	questions = sum(len(assessment["questions"]) for assessment in assessments)
+	print(f"{mode:<7} assessments={len(assessments)} questions={questions} time={elapsed:.2f}s ({questions / elapsed:.0f} preguntas/s)")
+
+def main():
+	parser = argparse.ArgumentParser()
+	parser.add_argument("--assessments", type=int, default=500)
+	parser.add_argument("--questions", type=int, default=20)
+	parser.add_argument("--mode", choices=["create", "import"], help="uso interno: un modo por proceso")
+	args = parser.parse_args()
+
+	if args.mode is None:
+		# Cada modo en un proceso con su propia base de datos
+		import subprocess
+		for mode in ("create", "import"):
+			subprocess.run([sys.executable, __file__, "--assessments", str(args.assessments), "--questions", str(args.questions), "--mode", mode], check=True)
+		return
+
+	workdir = tempfile.mkdtemp()
+	os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(workdir, 'bench.db')}"
+	sys.path.insert(0, APP_DIR)
+	run(args.mode, bank(args.assessments, args.questions))
+
+if __name__ == "__main__":
+	main()
@@ -0,0 +1,229 @@
+"""Varias aulas en paralelo sobre el mismo servidor, comprobando que no hay cruce de mensajes.
+
+Arranca uvicorn con una base de datos temporal, activa N evaluaciones a la vez (una
+conexión de administrador por evaluación y una por alumno), y en cada ronda todos los
+alumnos de todas las aulas envían sus respuestas a la vez y cada administrador pasa
+al siguiente evaluado. Al final comprueba que cada socket solo ha recibido eventos de
+su propia evaluación y que el administrador ha visto todas las respuestas.
+
+Con --workers N > 1 el servidor se lanza como proceso aparte con N workers y el
+backplane SQLite: los sockets y las peticiones se reparten entre workers, así que
+también comprueba la entrega entre procesos.
+
+Uso (desde backend/): python bench/bench_rooms.py --rooms 4 --users 30 --rounds 5 [--workers 4]
+"""
+import argparse
+import asyncio
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+APP_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "app")
+
+def setup_database(rooms: int, users: int, questions: int):
+	from server.database import engine, session_scope
+	from server.db_config import Assessment, AssessmentInstance, Question, User
+	from server.migrations import migrate
+
+	migrate(engine)
+	with session_scope() as session:
+		assessment = Assessment(title="bench")
+		session.add(assessment)
+		session.flush()
+		session.add_all([
+			Question(assessment_id=assessment.id, title=f"q{i}", questionType="number", questionOrder=i, selectOptions=[])
+			for i in range(questions)
+		])
+		classrooms = []
+		for room in range(rooms):
+			instance = AssessmentInstance(title=f"aula{room}", assessment_id=assessment.id)
+			session.add(instance)
+			session.flush()
+			members = [
+				User(name=f"u{room}_{i}", email=f"u{room}_{i}@bench", assessment_instance_id=instance.id, order=i, group=0, pin=f"{room:02d}{i:04d}")
+				for i in range(users)
+			]
+			session.add_all(members)
+			session.flush()
+			classrooms.append({"id": instance.id, "users": [(user.id, user.pin) for user in members]})
+		question_ids = [question.id for question in assessment.questions]
+		return classrooms, question_ids
+
+def free_port() -> int:
+	with socket.socket() as sock:
+		sock.bind(("127.0.0.1", 0))
+		return sock.getsockname()[1]
+
+def start_server(port: int):
+	import uvicorn
+	from server.api import app
+
+	server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning"))
+	thread = threading.Thread(target=server.run, daemon=True)
+	thread.start()
+	while not server.started:
+		time.sleep(0.05)
+
+	def stop():
+		server.should_exit = True
+		thread.join()
+	return stop
+
+def start_workers(port: int, workers: int, workdir: str):
+	import httpx
+
+	env = dict(os.environ, BACKPLANE="sqlite", BACKPLANE_PATH=os.path.join(workdir, "backplane.db"))
+	process = subprocess.Popen(
+		[sys.executable, "-m", "uvicorn", "server.api:app", "--host", "127.0.0.1", "--port", str(port), "--workers", str(workers), "--log-level", "warning"],
+		cwd=APP_DIR,
+		env=env,
+		stdout=sys.stderr,
+	)
+	deadline = time.monotonic() + 60
+	while True:
+		try:
+			if httpx.get(f"http://127.0.0.1:{port}/docs").status_code == 200:
+				break
+		except httpx.TransportError:
+			pass
+		if time.monotonic() > deadline or process.poll() is not None:
+			process.kill()
+			raise RuntimeError("El servidor no ha arrancado")
+		time.sleep(0.2)
+	# Margen para que arranquen todos los workers, no solo el primero que responde
+	time.sleep(1)
+
+	def stop():
+		process.terminate()
+		process.wait(timeout=30)
+	return stop
+
+async def collect(websocket, inbox: list):
+	try:
+		async for message in websocket:
+			inbox.append(json.loads(message))
+	except Exception:
+		pass
+
+def foreign_events(inbox: list, room_id: int, room_user_ids: set) -> int:
+	# Un evento es ajeno si menciona una evaluación o un usuario de otra aula
+	foreign = 0
+	for message in inbox:
+		instance_id = message.get("assessment_instance_id")
+		user_ids = {message.get(key) for key in ("user_id", "grading_user_id", "actual_user_id")} - {None}
+		if instance_id is not None and instance_id != room_id or not user_ids <= room_user_ids:
+			foreign += 1
+	return foreign
+
+async def run(rooms: int, users: int, rounds: int, questions: int, workers: int, think: float, workdir: str):
+	import httpx
+	import websockets
+	from server.auth import auth
+
+	classrooms, question_ids = setup_database(rooms, users, questions)
+	port = free_port()
+	stop = start_workers(port, workers, workdir) if workers > 1 else start_server(port)
+	base = f"127.0.0.1:{port}"
+	admin_token = auth.issue_admin_token()
+	payload = {"answers": [{"question_id": question_id, "answerText": "5"} for question_id in question_ids]}
+	latencies = []
+	errors = 0
+
+	async with httpx.AsyncClient(base_url=f"http://{base}", timeout=30, limits=httpx.Limits(max_connections=200)) as client:
+		async def post(path: str, **kwargs):
+			nonlocal errors
+			start = time.perf_counter()
+			response = await client.post(path, **kwargs)
+			latencies.append(time.perf_counter() - start)
+			if response.status_code != 200:
+				errors += 1
+			return response
+
+		sockets = []
+		tasks = []
+		for classroom in classrooms:
+			admin = await websockets.connect(f"ws://{base}/assessment-instance/{classroom['id']}/start/token={admin_token}")
+			await admin.recv()
+			classroom["admin_inbox"] = []
+			tasks.append(asyncio.create_task(collect(admin, classroom["admin_inbox"])))
+			classroom["admin"] = admin
+			sockets.append(admin)
+
+		for classroom in classrooms:
+			classroom["tokens"] = []
+			classroom["user_inboxes"] = []
+			for _, pin in classroom["users"]:
+				token = (await post("/user-login", json={"pin": pin})).json()["token"]
+				player = await websockets.connect(f"ws://{base}/play/token={token}")
+				inbox = []
+				tasks.append(asyncio.create_task(collect(player, inbox)))
+				classroom["tokens"].append(token)
+				classroom["user_inboxes"].append(inbox)
+				sockets.append(player)
+
+		start = time.perf_counter()
+		for round_number in range(rounds):
+			await asyncio.gather(*(
+				post(f"/user/answer/token={token}", json=payload)
+				for classroom in classrooms
+				for index, token in enumerate(classroom["tokens"]) if index != round_number
+			))
+			await asyncio.gather(*(
+				post(f"/assessment-instance/{classroom['id']}/next/token={admin_token}")
+				for classroom in classrooms
+			))
+			# Tiempo de reacción del aula; con varios workers cubre también la propagación
+			# de la invalidación por el backplane
+			await asyncio.sleep(think)
+		elapsed = time.perf_counter() - start
+
+		for classroom in classrooms:
+			await classroom["admin"].send("CLOSE")
+		await asyncio.sleep(0.5)
+		for websocket in sockets:
+			await websocket.close()
+		await asyncio.gather(*tasks)
+
+	stop()
+
+	cross_talk = 0
+	answers_seen = 0
+	for classroom in classrooms:
+		room_user_ids = {user_id for user_id, _ in classroom["users"]}
+		cross_talk += foreign_events(classroom["admin_inbox"], classroom["id"], room_user_ids)
+		answers_seen += sum(1 for message in classroom["admin_inbox"] if message.get("event") == "ANSWER")
+		for inbox in classroom["user_inboxes"]:
+			cross_talk += foreign_events(inbox, classroom["id"], room_user_ids)
+
+	latencies.sort()
+	quantiles = statistics.quantiles(latencies, n=100)
+	expected_answers = rooms * rounds * (users - 1)
+	print(f"workers={workers} rooms={rooms} users={users} rounds={rounds} requests={len(latencies)} errors={errors}")
+	print(f"answers_seen={answers_seen}/{expected_answers} cross_talk={cross_talk}")
+	print(f"p50={quantiles[49] * 1000:.1f}ms p95={quantiles[94] * 1000:.1f}ms throughput={rooms * rounds * (users - 1) / elapsed:.0f} envíos/s")
+
+def main():
+	parser = argparse.ArgumentParser()
+	parser.add_argument("--rooms", type=int, default=4)
+	parser.add_argument("--users", type=int, default=30)
+	parser.add_argument("--rounds", type=int, default=5)
+	parser.add_argument("--questions", type=int, default=5)
+	parser.add_argument("--workers", type=int, default=1)
+	parser.add_argument("--think", type=float, default=0.1)
+	args = parser.parse_args()
+	if args.rounds >= args.users:
+		parser.error("--rounds debe ser menor que --users")
+
+	workdir = tempfile.mkdtemp()
+	os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(workdir, 'bench.db')}"
+	sys.path.insert(0, APP_DIR)
+	asyncio.run(run(args.rooms, args.users, args.rounds, args.questions, args.workers, args.think, workdir))
+
+if __name__ == "__main__":
+	main()
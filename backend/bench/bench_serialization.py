@@ -0,0 +1,172 @@
+"""Tiempo de construcción del JSON de /assessment-instance/{ID} para una evaluación grande.
+
+Compara el camino anterior (modelos JSON_*_Output construidos a mano, revalidados
+contra response_model y codificados con json) con el actual (dicts desde las filas
+ORM codificados con orjson), y mide también la ruta completa.
+
+Uso (desde backend/): python bench/bench_serialization.py --users 100 --answers 5000
+"""
+import argparse
+import itertools
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+APP_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "app")
+
+def setup_database(users: int, answers: int, questions: int) -> int:
+	from server.database import engine, session_scope
+	from server.db_config import Answer, Assessment, AssessmentInstance, Question, User
+	from server.migrations import migrate
+
+	migrate(engine)
+	with session_scope() as session:
+		assessment = Assessment(title="bench")
+		session.add(assessment)
+		session.flush()
+		session.add_all([
+			Question(assessment_id=assessment.id, title=f"q{i}", questionType="select", questionOrder=i, selectOptions=[{"title": "a"}, {"title": "b"}])
+			for i in range(questions)
+		])
+		instance = AssessmentInstance(title="bench", assessment_id=assessment.id)
+		session.add(instance)
+		session.flush()
+		session.add_all([
+			User(name=f"u{i}", email=f"u{i}@bench", assessment_instance_id=instance.id, order=i, group=i % 4, pin=f"{i:06d}")
+			for i in range(users)
+		])
+		session.flush()
+		user_ids = [user.id for user in instance.users]
+		question_ids = [question.id for question in assessment.questions]
+		now = datetime.now()
+		pairs = ((grading, graded, question) for grading in user_ids for graded in user_ids if grading != graded for question in question_ids)
+		rows = [
+			Answer(
+				assessment_instance_id=instance.id,
+				question_id=question_id,
+				grading_user_id=grading_user_id,
+				graded_user_id=graded_user_id,
+				answerText="a",
+				date=now,
+			) for grading_user_id, graded_user_id, question_id in itertools.islice(pairs, answers)
+		]
+		session.add_all(rows)
+		return instance.id
+
+def pydantic_payload(assessmentInstance) -> bytes:
+	from pydantic import TypeAdapter
+	from server.api import (
+		JSON_Answer_Output, JSON_Assessment_Output, JSON_AssessmentInstance_Output,
+		JSON_Question_Output, JSON_SelectOptions, JSON_User_Output,
+	)
+
+	assessment = assessmentInstance.assessment
+	model = JSON_AssessmentInstance_Output(
+		id=assessmentInstance.id,
+		title=assessmentInstance.title,
+		assessment_id=assessmentInstance.assessment_id,
+		users=sorted(
+			[
+				JSON_User_Output(id=user.id, name=user.name, email=user.email, order=user.order, group=user.group, pin=user.pin, voteEveryone=user.voteEveryone)
+				for user in assessmentInstance.users
+			],
+			key=lambda user: user.order
+		),
+		actual_user=None,
+		active=assessmentInstance.active,
+		finished=assessmentInstance.finished,
+		answers=[
+			JSON_Answer_Output(
+				id=answer.id, assessment_instance_id=answer.assessment_instance_id, question_id=answer.question_id,
+				grading_user_id=answer.grading_user_id, graded_user_id=answer.graded_user_id, answerText=answer.answerText, date=answer.date
+			) for answer in assessmentInstance.answers
+		],
+		assessment=JSON_Assessment_Output(
+			id=assessment.id,
+			title=assessment.title,
+			image=assessment.image,
+			archived=assessment.archived,
+			questions=[
+				JSON_Question_Output(
+					id=question.id, assessment_id=question.assessment_id, title=question.title, image=question.image,
+					questionType=question.questionType, questionOrder=question.questionOrder,
+					selectOptions=[JSON_SelectOptions.from_dict(option) for option in question.selectOptions]
+				) for question in assessment.questions
+			]
+		)
+	)
+	# Lo que hacía FastAPI con response_model: volcar, revalidar, serializar y json.dumps
+	adapter = TypeAdapter(JSON_AssessmentInstance_Output)
+	content = adapter.dump_python(adapter.validate_python(model.model_dump()), mode="json")
+	return json.dumps(content, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+def orjson_payload(assessmentInstance) -> bytes:
+	from server.serialization import answer_row, assessment_row, dumps, instance_row, user_row
+
+	assessment = assessmentInstance.assessment
+	return dumps(instance_row(
+		assessmentInstance,
+		users=[user_row(user) for user in sorted(assessmentInstance.users, key=lambda user: user.order)],
+		answers=[answer_row(answer) for answer in assessmentInstance.answers],
+		assessment=assessment_row(assessment, assessment.questions),
+	))
+
+def timed(fn, repeat: int) -> list:
+	times = []
+	for _ in range(repeat):
+		start = time.perf_counter()
+		fn()
+		times.append(time.perf_counter() - start)
+	return times
+
+def report(label: str, times: list):
+	print(f"{label:<10} p50={statistics.median(times) * 1000:.1f}ms min={min(times) * 1000:.1f}ms")
+
+def run(users: int, answers: int, questions: int, repeat: int):
+	from fastapi.testclient import TestClient
+	from sqlalchemy.orm import joinedload, selectinload
+	from server.api import app
+	from server.auth import auth
+	from server.database import session_scope
+	from server.db_config import Assessment, AssessmentInstance
+
+	instance_id = setup_database(users, answers, questions)
+	with session_scope() as session:
+		assessmentInstance = (
+			session.query(AssessmentInstance)
+			.options(
+				selectinload(AssessmentInstance.users),
+				selectinload(AssessmentInstance.answers),
+				joinedload(AssessmentInstance.assessment).selectinload(Assessment.questions),
+			)
+			.filter(AssessmentInstance.id == instance_id)
+			.one()
+		)
+		size = len(orjson_payload(assessmentInstance))
+		print(f"users={users} answers={len(assessmentInstance.answers)} questions={questions} payload={size / 1024:.0f}KiB")
+		report("pydantic", timed(lambda: pydantic_payload(assessmentInstance), repeat))
+		report("orjson", timed(lambda: orjson_payload(assessmentInstance), repeat))
+
+	token = auth.issue_admin_token()
+	with TestClient(app) as client:
+		report("ruta", timed(lambda: client.get(f"/assessment-instance/{instance_id}/token={token}").raise_for_status(), repeat))
+
+def main():
+	parser = argparse.ArgumentParser()
+	parser.add_argument("--users", type=int, default=100)
+	parser.add_argument("--answers", type=int, default=5000)
+	parser.add_argument("--questions", type=int, default=10)
+	parser.add_argument("--repeat", type=int, default=20)
+	args = parser.parse_args()
+
+	workdir = tempfile.mkdtemp()
+	os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(workdir, 'bench.db')}"
+	sys.path.insert(0, APP_DIR)
+	run(args.users, args.answers, args.questions, args.repeat)
+
+if __name__ == "__main__":
+	main()
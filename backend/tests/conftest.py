@@ -0,0 +1,58 @@
+import os
+import shutil
+import tempfile
+
+import pytest
+
+# La configuración se lee al importar los módulos del servidor, así que el entorno de
+# las pruebas se fija antes: base de datos, imágenes y backplane en un directorio
+# temporal, sin fichero de registro y sin los hilos de vigilancia.
+DATA_DIR = tempfile.mkdtemp(prefix="conalma-tests-")
+os.environ.update({
+	"DATABASE_URL": f"sqlite:///{os.path.join(DATA_DIR, 'test.db')}",
+	"IMAGE_DIR": os.path.join(DATA_DIR, "images"),
+	"BACKPLANE": "local",
+	"BACKPLANE_PATH": os.path.join(DATA_DIR, "backplane.db"),
+	"LOG_FILE": "",
+	"LOG_CONSOLE": "false",
+	"LOOP_WATCHDOG_ENABLED": "false",
+	"PROFILING_SAMPLE_RATE": "0",
+	"METRICS_DIR": "",
+	# Como en modo producción (python app/main.py --prod)
+	"CORS_PORTS": "[3000, 8000]",
+})
+
+from fastapi.testclient import TestClient
+
+from server.api import app, settings
+
+def pytest_sessionfinish(session, exitstatus):
+	shutil.rmtree(DATA_DIR, ignore_errors=True)
+
+@pytest.fixture(scope="session")
+def client():
+	with TestClient(app) as client:
+		yield client
+
+@pytest.fixture(scope="session")
+def token(client) -> str:
+	response = client.post("/login", json={"username": settings.admin_user, "password": settings.admin_password})
+	return response.json()["token"]
+
+def question(order: int, title: str = None, questionType: str = "number") -> dict:
+	return {"title": title or f"Pregunta {order}", "image": None, "questionType": questionType, "questionOrder": order, "selectOptions": []}
+
+def create_assessment(client, token: str, title: str, questions: list) -> int:
+	response = client.post(f"/assessment/create/token={token}", json={"title": title, "image": None, "questions": questions})
+	assert response.status_code == 200, response.text
+	return int(response.json()["detail"].split(": ")[1])
+
+def create_instance(client, token: str, assessment_id: int, title: str, users: int = 0, groups: int = 1) -> int:
+	response = client.post(f"/assessment/{assessment_id}/assessment-instance/create/token={token}", json={"title": title})
+	assert response.status_code == 200, response.text
+	instance_id = int(response.json()["detail"].split(": ")[1])
+	if users:
+		roster = "name,email,order,group,voteEveryone\n" + "\n".join(f"u{i},u{i}@example.com,{i},{i % groups},False" for i in range(1, users + 1))
+		response = client.post(f"/assessment-instance/{instance_id}/users/upload/token={token}", files={"file": ("users.csv", roster)})
+		assert response.status_code == 200, response.text
+	return instance_id
@@ -0,0 +1,31 @@
+import json
+
+from conftest import create_assessment, create_instance, question
+
+# Exportar e importar: de cada evaluación solo sale la versión vigente. Si salieran
+# también las versiones anteriores (mismo título), al importar con duplicates=skip
+# ganaría la primera, que es la más antigua.
+
+def test_export_import_keeps_current_version(client, token):
+	assessment_id = create_assessment(client, token, "Versiones", [question(1, "Antes")])
+	create_instance(client, token, assessment_id, "Versiones")
+	question_id = client.get(f"/assessment/{assessment_id}/view/token={token}").json()["questions"][0]["id"]
+	edit = {"title": None, "image": None, "questions": [{**question(1, "Después"), "id": question_id}], "deletedQuestionsIds": []}
+	assert client.put(f"/assessment/{assessment_id}/edit/token={token}", json=edit).status_code == 200
+
+	response = client.get(f"/assessment/bundle/token={token}", params={"format": "lgqzl"})
+	assert response.status_code == 200
+	exported = [line for line in response.text.splitlines() if json.loads(line)["title"] == "Versiones"]
+	assert len(exported) == 1
+	assert [question["title"] for question in json.loads(exported[0])["questions"]] == ["Después"]
+
+	# En otro servidor (aquí, tras borrar el linaje) se importa la versión vigente
+	assert client.delete(f"/assessment/{assessment_id}/delete/token={token}").status_code == 200
+	files = {"files": ("versiones.lgqzl", "\n".join(exported))}
+	response = client.post(f"/assessment/import/token={token}", params={"duplicates": "skip"}, files=files)
+	assert response.status_code == 200, response.text
+	assert response.json()["files"][0]["assessments"] == 1
+	imported = [assessment for assessment in client.get(f"/assessment/all/token={token}").json() if assessment["title"] == "Versiones"]
+	assert len(imported) == 1
+	view = client.get(f"/assessment/{imported[0]['id']}/view/token={token}").json()
+	assert [question["title"] for question in view["questions"]] == ["Después"]
@@ -0,0 +1,16 @@
+import pytest
+
+# El frontend se abre desde el servidor de desarrollo (:3000) o, en producción, desde
+# la propia API (:8000), por IP o por nombre; otros orígenes no reciben cabeceras CORS.
+
+@pytest.mark.parametrize("origin, allowed", [
+	("http://localhost:3000", True),
+	("http://192.168.1.20:3000", True),
+	("http://192.168.1.20:8000", True),
+	("http://aula.local:8000", True),
+	("http://192.168.1.20", False),
+	("http://example.com:8080", False),
+])
+def test_cors_origins(client, origin, allowed):
+	response = client.options("/login", headers={"Origin": origin, "Access-Control-Request-Method": "POST"})
+	assert (response.headers.get("access-control-allow-origin") == origin) == allowed
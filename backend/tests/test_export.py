@@ -0,0 +1,39 @@
+from datetime import datetime
+
+from server import export
+from server.database import session_scope
+from server.db_config import Answer, User
+
+from conftest import create_assessment, create_instance, question
+
+# La exportación lee las respuestas por lotes en sesiones cortas: mientras se descarga
+# se pueden seguir guardando respuestas, y las filas de un par evaluador/evaluado que
+# cae entre dos lotes salen juntas.
+
+def test_export_batches_do_not_hold_the_database(client, token, monkeypatch):
+	monkeypatch.setattr(export, "BATCH_SIZE", 3)
+	assessment_id = create_assessment(client, token, "Exportación", [question(1), question(2)])
+	instance_id = create_instance(client, token, assessment_id, "Exportación", users=3)
+	question_ids = [question["id"] for question in client.get(f"/assessment/{assessment_id}/view/token={token}").json()["questions"]]
+
+	with session_scope() as session:
+		users = [user_id for user_id, in session.query(User.id).filter(User.assessment_instance_id == instance_id).order_by(User.id)]
+		now = datetime.now()
+		for grading in users:
+			for graded in users:
+				if grading != graded:
+					for question_id in question_ids:
+						session.add(Answer(assessment_instance_id=instance_id, question_id=question_id, grading_user_id=grading, graded_user_id=graded, answerText=str(question_id), date=now, createdAt=now, updatedAt=now))
+
+	matrix = export.grading_matrix(assessment_id, [instance_id])
+	next(matrix)
+	rows = [next(matrix)]
+
+	# Con el cursor abierto durante la descarga, esta escritura esperaría al bloqueo
+	with session_scope() as session:
+		session.query(Answer).filter(Answer.assessment_instance_id == instance_id, Answer.grading_user_id == users[2]).update({"answerText": "9"})
+
+	rows.extend(matrix)
+	assert len(rows) == 6
+	assert all(row["answers"] == [str(question_id) for question_id in question_ids] for row in rows[:4])
+	assert all(row["answers"] == ["9", "9"] for row in rows[4:])
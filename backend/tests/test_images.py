@@ -0,0 +1,113 @@
+import io
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from server.database import session_scope
+from server.db_config import Image
+from server.images import store
+
+from conftest import create_assessment, question
+
+# Pillow está en requirements.txt; sin él el servidor sirve los originales sin reducir
+PILImage = pytest.importorskip("PIL.Image")
+
+# Servidor HTTP local con las imágenes de prueba: /a.png y /b.png tienen el mismo
+# contenido, /slow tarda más que el tiempo de descarga permitido y /big supera el
+# tamaño máximo. Las que fallan deben quedarse con su URL original.
+
+def png(width: int, height: int, color) -> bytes:
+	buffer = io.BytesIO()
+	PILImage.new("RGB", (width, height), color).save(buffer, format="PNG")
+	return buffer.getvalue()
+
+SMALL = png(8, 8, "red")
+BIG = png(64, 64, "blue")
+SLOW_SECONDS = 1
+
+class Handler(BaseHTTPRequestHandler):
+	def do_GET(self):
+		if self.path == "/slow":
+			time.sleep(SLOW_SECONDS)
+		body = BIG if self.path == "/big" else SMALL
+		self.send_response(200)
+		self.send_header("Content-Type", "image/png")
+		self.send_header("Content-Length", str(len(body)))
+		self.end_headers()
+		self.wfile.write(body)
+
+	def log_message(self, format, *args):
+		pass
+
+@pytest.fixture
+def image_server(monkeypatch):
+	server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+	thread = threading.Thread(target=server.serve_forever, daemon=True)
+	thread.start()
+	monkeypatch.setattr(store, "max_bytes", len(SMALL) + 1)
+	monkeypatch.setattr(store, "fetch_timeout", SLOW_SECONDS / 4)
+	try:
+		yield f"http://127.0.0.1:{server.server_address[1]}"
+	finally:
+		server.shutdown()
+		server.server_close()
+
+def test_localize_dedup_rewrite_and_fallback(client, token, image_server):
+	a, b, slow, big = (f"{image_server}{path}" for path in ("/a.png", "/b.png", "/slow", "/big"))
+	questions = [{**question(order), "image": image} for order, image in enumerate((b, slow, big), start=1)]
+	response = client.post(f"/assessment/create/token={token}", json={"title": "Imágenes", "image": a, "questions": questions})
+	assert response.status_code == 200, response.text
+	assessment_id = int(response.json()["detail"].split(": ")[1])
+	view = client.get(f"/assessment/{assessment_id}/view/token={token}").json()
+
+	# Mismo contenido -> misma ruta local, un solo fichero y una sola fila
+	local = view["image"]
+	assert local.startswith("/images/") and view["questions"][0]["image"] == local
+	digest = local.rsplit("/", 1)[1]
+	assert os.path.isfile(store.path(digest))
+	with session_scope() as session:
+		assert session.query(Image).filter(Image.digest == digest).count() == 1
+
+	# Tiempo agotado y tamaño excesivo: se queda la URL original
+	assert view["questions"][1]["image"] == slow
+	assert view["questions"][2]["image"] == big
+
+	response = client.get(local)
+	assert response.status_code == 200
+	assert response.content == SMALL
+
+def test_resized_variant(client, token):
+	original = png(400, 200, "green")
+	response = client.post(f"/images/upload/token={token}", files={"file": ("verde.png", original)})
+	assert response.status_code == 200, response.text
+	local = response.json()["image"]
+
+	# El ancho pedido se ajusta al menor de image_widths que lo cubre
+	response = client.get(local, params={"w": 100})
+	assert response.status_code == 200
+	with PILImage.open(io.BytesIO(response.content)) as image:
+		assert image.size == (store.snap_width(100), store.snap_width(100) // 2)
+	assert client.get(local).content == original
+
+def test_rejected_requests_do_not_download(client, token, image_server, monkeypatch):
+	requests = []
+	original = Handler.do_GET
+
+	def do_GET(self):
+		requests.append(self.path)
+		original(self)
+
+	monkeypatch.setattr(Handler, "do_GET", do_GET)
+	create_assessment(client, token, "Repetida", [question(1)])
+	image = f"{image_server}/rechazada.png"
+	body = {"title": "Repetida", "image": image, "questions": [{**question(1), "image": image}]}
+	assert client.post(f"/assessment/create/token={token}", json=body).status_code == 400
+	edit = {"title": None, "image": image, "questions": [], "deletedQuestionsIds": []}
+	assert client.put(f"/assessment/999999/edit/token={token}", json=edit).status_code == 404
+	# Ni descargas ni filas de imagen para peticiones rechazadas
+	assert requests == []
+	with session_scope() as session:
+		assert session.query(Image).filter(Image.source == image).count() == 0
@@ -0,0 +1,81 @@
+import re
+from contextlib import ExitStack
+
+from sqlalchemy import event
+
+from server.database import engine
+
+from conftest import create_assessment, create_instance, question
+
+# Las consultas que mandan las rutas deben resolverse con los índices de las
+# migraciones, nunca recorriendo una tabla indexada entera. Se recorre una sesión
+# completa (crear, listar, jugar, resultados, exportar) a través de TestClient, se
+# captura cada sentencia con before_cursor_execute y se pide su EXPLAIN QUERY PLAN
+# con los mismos parámetros. Recorrer un índice (SCAN ... USING INDEX) sí vale.
+
+INDEXED_TABLES = {"answer", "user", "question", "assessment_instance"}
+
+SCAN = re.compile(r"^SCAN (\w+)")
+
+def ok(response):
+	assert response.status_code == 200, response.text
+	return response
+
+def receive_event(websocket, event_name: str) -> dict:
+	while True:
+		message = websocket.receive_json()
+		if message.get("event") == event_name:
+			return message
+
+def play_session(client, token):
+	assessment_id = create_assessment(client, token, "Planes", [question(1), {**question(2, questionType="select"), "selectOptions": [{"title": "Sí"}]}])
+	instance_id = create_instance(client, token, assessment_id, "Planes", users=3, groups=2)
+	ok(client.get(f"/assessment/all/token={token}"))
+	ok(client.get(f"/assessment/{assessment_id}/view/token={token}"))
+	ok(client.get(f"/assessment/{assessment_id}/assessment-instance/all/token={token}"))
+	users = sorted(ok(client.get(f"/assessment-instance/{instance_id}/token={token}")).json()["users"], key=lambda user: user["order"])
+	question_id = client.get(f"/assessment/{assessment_id}/view/token={token}").json()["questions"][0]["id"]
+
+	with ExitStack() as stack:
+		admin = stack.enter_context(client.websocket_connect(f"/assessment-instance/{instance_id}/start/token={token}"))
+		admin.receive_json()
+		student_token = ok(client.post("/user-login", json={"pin": users[1]["pin"]})).json()["token"]
+		student = stack.enter_context(client.websocket_connect(f"/play/token={student_token}"))
+		student.receive_json()
+		admin.send_text("START")
+		receive_event(admin, "START")
+		ok(client.get(f"/assessment-instance/{instance_id}/active/token={token}"))
+		ok(client.get(f"/assessment-instance/active/token={student_token}"))
+		ok(client.post(f"/user/answer/token={student_token}", json={"answers": [{"question_id": question_id, "answerText": "7"}]}))
+		ok(client.post(f"/assessment-instance/{instance_id}/next/token={token}"))
+		admin.send_text("CLOSE")
+		receive_event(admin, "CLOSE")
+
+	ok(client.get(f"/assessment-instance/{instance_id}/results/token={token}"))
+	ok(client.get(f"/assessment-instance/{instance_id}/export/token={token}", params={"format": "csv"}))
+	ok(client.get(f"/assessment/{assessment_id}/export/token={token}", params={"format": "jsonl"}))
+	ok(client.get(f"/assessment/bundle/token={token}", params={"format": "lgqzl"}))
+
+def test_route_queries_use_indexes(client, token):
+	statements = []
+
+	def before_cursor_execute(connection, cursor, statement, parameters, context, executemany):
+		if not executemany and re.match(r"\s*(SELECT|UPDATE|DELETE)\b", statement):
+			statements.append((statement, parameters))
+
+	event.listen(engine, "before_cursor_execute", before_cursor_execute)
+	try:
+		play_session(client, token)
+	finally:
+		event.remove(engine, "before_cursor_execute", before_cursor_execute)
+
+	assert statements
+	scans = []
+	with engine.connect() as connection:
+		for statement, parameters in dict.fromkeys((statement, tuple(parameters or ())) for statement, parameters in statements):
+			plan = [row[-1] for row in connection.exec_driver_sql("EXPLAIN QUERY PLAN " + statement, parameters)]
+			for line in plan:
+				match = SCAN.match(line)
+				if match is not None and "INDEX" not in line and match.group(1) in INDEXED_TABLES:
+					scans.append((line, statement))
+	assert not scans, "\n\n".join(f"{line}\n{statement}" for line, statement in scans)
@@ -0,0 +1,80 @@
+from contextlib import ExitStack
+
+from conftest import create_assessment, create_instance, question
+
+def receive_event(websocket, event: str) -> dict:
+	while True:
+		message = websocket.receive_json()
+		if message.get("event") == event:
+			return message
+
+def test_next_sends_each_student_its_view(client, token):
+	assessment_id = create_assessment(client, token, "Eventos", [question(1), question(2)])
+	instance_id = create_instance(client, token, assessment_id, "Eventos", users=3)
+	users = sorted(client.get(f"/assessment-instance/{instance_id}/token={token}").json()["users"], key=lambda user: user["order"])
+
+	with ExitStack() as stack:
+		admin = stack.enter_context(client.websocket_connect(f"/assessment-instance/{instance_id}/start/token={token}"))
+		assert admin.receive_json()["actual_user_id"] == users[0]["id"]
+		students = {}
+		for user in users[1:]:
+			student_token = client.post("/user-login", json={"pin": user["pin"]}).json()["token"]
+			students[user["id"]] = stack.enter_context(client.websocket_connect(f"/play/token={student_token}"))
+			assert students[user["id"]].receive_json() == {"mode": "LOBBY"}
+			receive_event(admin, "CONNECT")
+
+		admin.send_text("START")
+		start = receive_event(admin, "START")
+		for websocket in students.values():
+			event = receive_event(websocket, "START")
+			assert event["seq"] == start["seq"] == event["snapshot"]["seq"]
+			assert event["snapshot"]["actual_user"]["id"] == users[0]["id"]
+			assert len(event["snapshot"]["assessment"]["questions"]) == 2
+
+		assert client.post(f"/assessment-instance/{instance_id}/next/token={token}").status_code == 200
+		next_event = receive_event(admin, "NEXT")
+		assert next_event["seq"] > start["seq"]
+		assert next_event["actual_user_id"] == users[1]["id"]
+		assert "snapshot" not in next_event
+
+		# El nuevo evaluado no evalúa; el otro alumno recibe ya las preguntas
+		graded = receive_event(students[users[1]["id"]], "NEXT")
+		assert graded["mode"] == "PLAYING"
+		assert graded["snapshot"]["seq"] == next_event["seq"]
+		assert graded["snapshot"]["actual_user"] is None and graded["snapshot"]["assessment"] is None
+		grader = receive_event(students[users[2]["id"]], "NEXT")
+		assert grader["snapshot"]["actual_user"]["id"] == users[1]["id"]
+		assert len(grader["snapshot"]["assessment"]["questions"]) == 2
+
+		# La instantánea completa coincide con la que llegó en el evento
+		active = client.get(f"/assessment-instance/{instance_id}/active/token={token}").json()
+		assert active["seq"] >= next_event["seq"]
+		assert active["actual_user"]["id"] == users[1]["id"]
+
+		admin.send_text("CLOSE")
+		receive_event(admin, "CLOSE")
+
+def test_reconnect_does_not_report_disconnect(client, token):
+	assessment_id = create_assessment(client, token, "Reconexión", [question(1)])
+	instance_id = create_instance(client, token, assessment_id, "Reconexión", users=2)
+	user = sorted(client.get(f"/assessment-instance/{instance_id}/token={token}").json()["users"], key=lambda user: user["order"])[1]
+
+	with client.websocket_connect(f"/assessment-instance/{instance_id}/start/token={token}") as admin:
+		admin.receive_json()
+		student_token = client.post("/user-login", json={"pin": user["pin"]}).json()["token"]
+		old = client.websocket_connect(f"/play/token={student_token}").__enter__()
+		old.receive_json()
+		receive_event(admin, "CONNECT")
+		with client.websocket_connect(f"/play/token={student_token}") as new:
+			new.receive_json()
+			receive_event(admin, "CONNECT")
+			# El socket anterior (expulsado) termina después de la reconexión
+			old.__exit__(None, None, None)
+			admin.send_text("START")
+			events = []
+			while not events or events[-1]["event"] != "START":
+				events.append(admin.receive_json())
+			assert "DISCONNECT" not in [event["event"] for event in events]
+		assert receive_event(admin, "DISCONNECT")["user_id"] == user["id"]
+		admin.send_text("CLOSE")
+		receive_event(admin, "CLOSE")
@@ -0,0 +1,65 @@
+import threading
+import time
+
+from server import live_session
+from server.live_session import LiveSessionCache
+
+# La carga de una evaluación no retiene el cerrojo de la caché: invalidate() (que se
+# llama desde el event loop) y las cargas de otras aulas no esperan a la base de
+# datos, y lo que se cargó antes de una invalidación no se guarda.
+
+def test_invalidate_does_not_wait_for_loads(monkeypatch):
+	release = threading.Event()
+	loads = []
+
+	def load(session, assessment_instance_id):
+		loads.append(assessment_instance_id)
+		version = len(loads)
+		if assessment_instance_id == 1:
+			release.wait(5)
+		return f"live {assessment_instance_id} v{version}"
+
+	monkeypatch.setattr(live_session, "load_live_session", load)
+	cache = LiveSessionCache()
+	results = []
+	loader = threading.Thread(target=lambda: results.append(cache.get(None, 1)))
+	loader.start()
+	while not loads:
+		time.sleep(0.01)
+
+	start = time.monotonic()
+	assert cache.get(None, 2) == "live 2 v2"
+	cache.invalidate(1)
+	assert time.monotonic() - start < 1
+
+	release.set()
+	loader.join()
+	assert results == ["live 1 v1"]
+	# La carga anterior a la invalidación no se guarda: la siguiente lectura recarga
+	assert cache.get(None, 1) == "live 1 v3"
+	assert cache.get(None, 1) == "live 1 v3"
+	assert cache.get(None, 2) == "live 2 v2"
+
+def test_instance_changed_callback_does_not_block(monkeypatch):
+	from server.api import live_sessions, on_instance_changed
+
+	release = threading.Event()
+	started = threading.Event()
+
+	def load(session, assessment_instance_id):
+		started.set()
+		release.wait(5)
+		return None
+
+	monkeypatch.setattr(live_session, "load_live_session", load)
+	loader = threading.Thread(target=live_sessions.get, args=(None, 999))
+	loader.start()
+	started.wait(5)
+	try:
+		# Lo que hace el backplane al recibir la invalidación de otro worker
+		start = time.monotonic()
+		on_instance_changed({"assessment_instance_id": 999, "revoked_at": time.time()})
+		assert time.monotonic() - start < 1
+	finally:
+		release.set()
+		loader.join()
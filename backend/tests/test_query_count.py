@@ -0,0 +1,46 @@
+from contextlib import contextmanager
+
+from sqlalchemy import event
+
+from server.database import engine
+
+from conftest import create_assessment, create_instance, question
+
+# El listado y el detalle de las partidas cargan sus relaciones en bloque: el número de
+# sentencias no depende de cuántas partidas, usuarios o respuestas haya. Si vuelve un
+# N+1 (una consulta por fila), estas cuentas crecen con los datos.
+
+LISTING_STATEMENTS = 3
+DETAIL_STATEMENTS = 4
+
+@contextmanager
+def count_statements():
+	statements = []
+
+	def before_cursor_execute(connection, cursor, statement, parameters, context, executemany):
+		statements.append(statement)
+
+	event.listen(engine, "before_cursor_execute", before_cursor_execute)
+	try:
+		yield statements
+	finally:
+		event.remove(engine, "before_cursor_execute", before_cursor_execute)
+
+def test_listing_and_detail_statements(client, token):
+	assessment_id = create_assessment(client, token, "Consultas", [question(1), question(2)])
+	instance_ids = []
+	for instances in (2, 20):
+		while len(instance_ids) < instances:
+			instance_ids.append(create_instance(client, token, assessment_id, f"Partida {len(instance_ids)}", users=10, groups=2))
+
+		with count_statements() as statements:
+			response = client.get(f"/assessment/{assessment_id}/assessment-instance/all/token={token}")
+		assert response.status_code == 200
+		assert len(response.json()["assessmentInstances"]) == instances
+		assert len(statements) == LISTING_STATEMENTS, statements
+
+		with count_statements() as statements:
+			response = client.get(f"/assessment-instance/{instance_ids[-1]}/token={token}")
+		assert response.status_code == 200
+		assert len(response.json()["users"]) == 10
+		assert len(statements) == DETAIL_STATEMENTS, statements
@@ -0,0 +1,55 @@
+from datetime import datetime
+
+from server.database import session_scope
+from server.db_config import Answer, User
+from server.results import normalize_number, parse_number
+
+from conftest import create_assessment, create_instance, question
+
+def test_parse_number():
+	assert parse_number("7") == 7
+	assert parse_number(" 7,5 ") == 7.5
+	assert parse_number("abc") is None
+	assert parse_number("") is None
+	assert parse_number("nan") is None
+	assert normalize_number("7,5") == "7.5"
+	assert normalize_number("  ") == ""
+	assert normalize_number("siete") is None
+
+def test_results_count_only_eligible_graders_and_numbers(client, token):
+	questions = [question(1), {**question(2, questionType="select"), "selectOptions": [{"title": "Sí"}, {"title": "No"}]}]
+	assessment_id = create_assessment(client, token, "Resultados", questions)
+	instance_id = create_instance(client, token, assessment_id, "Resultados")
+	roster = "name,email,order,group,voteEveryone\na,a@example.com,1,1,False\nb,b@example.com,2,1,False\nc,c@example.com,3,2,False\nd,d@example.com,4,2,True\n"
+	assert client.post(f"/assessment-instance/{instance_id}/users/upload/token={token}", files={"file": ("users.csv", roster)}).status_code == 200
+	view = client.get(f"/assessment/{assessment_id}/view/token={token}").json()
+	number_id, select_id = [question["id"] for question in view["questions"]]
+
+	with session_scope() as session:
+		users = {user.name: user.id for user in session.query(User).filter(User.assessment_instance_id == instance_id)}
+		now = datetime.now()
+
+		def answer(grading: str, question_id: int, text: str):
+			session.add(Answer(assessment_instance_id=instance_id, question_id=question_id, grading_user_id=users[grading], graded_user_id=users["a"], answerText=text, date=now, createdAt=now, updatedAt=now))
+
+		# b (su grupo) y d (vota a todos) pueden evaluar a "a"; c no cuenta como
+		# evaluador. La respuesta que no es un número queda fuera de las estadísticas
+		answer("b", number_id, "7,5")
+		answer("b", select_id, "Sí")
+		answer("d", number_id, "abc")
+		answer("d", select_id, "No")
+		answer("c", number_id, "10")
+
+	results = client.get(f"/assessment-instance/{instance_id}/results/token={token}").json()
+	graded = {user["name"]: user for user in results["graded_users"]}
+	assert graded["a"]["graders"] == 2
+	assert graded["a"]["expected_graders"] == 2
+	assert graded["a"]["completion"] == 1.0
+	number_stats = graded["a"]["questions"][0]
+	assert number_stats["count"] == 2
+	assert number_stats["mean"] == (7.5 + 10) / 2
+	assert number_stats["min"] == 7.5 and number_stats["max"] == 10
+	assert graded["a"]["questions"][1]["options"] == {"Sí": 1, "No": 1}
+	assert all(user["completion"] <= 1 for user in results["graded_users"])
+	assert results["ranking"][0] == {"user_id": users["a"], "name": "a", "score": 8.75}
+	assert [user["score"] for user in results["ranking"][1:]] == [None, None, None]
@@ -0,0 +1,19 @@
+from conftest import create_assessment, create_instance, question
+
+# Al editar una evaluación ya jugada se crea una versión nueva que comparte las
+# preguntas sin cambios con la anterior. Vista desde cualquier versión, cada pregunta
+# lleva el id de esa versión, tanto las compartidas como las editadas.
+
+def test_questions_carry_the_viewed_version(client, token):
+	assessment_id = create_assessment(client, token, "Versión vista", [question(1, "Igual"), question(2, "Antes")])
+	create_instance(client, token, assessment_id, "Versión vista")
+	same, edited = client.get(f"/assessment/{assessment_id}/view/token={token}").json()["questions"]
+	edit = {"title": None, "image": None, "questions": [{**question(1, "Igual"), "id": same["id"]}, {**question(2, "Después"), "id": edited["id"]}], "deletedQuestionsIds": []}
+	assert client.put(f"/assessment/{assessment_id}/edit/token={token}", json=edit).status_code == 200
+
+	head = next(assessment for assessment in client.get(f"/assessment/all/token={token}").json() if assessment["title"] == "Versión vista")
+	assert head["id"] != assessment_id
+	questions = client.get(f"/assessment/{head['id']}/view/token={token}").json()["questions"]
+	assert [question["title"] for question in questions] == ["Igual", "Después"]
+	assert questions[0]["id"] == same["id"]
+	assert [question["assessment_id"] for question in questions] == [head["id"], head["id"]]
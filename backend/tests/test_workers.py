@@ -0,0 +1,134 @@
+import json
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+import pytest
+from websockets.sync.client import connect
+
+# Dos workers (dos procesos uvicorn) con la misma base de datos y el backplane SQLite.
+# El administrador está conectado a uno y los alumnos al otro: los eventos publicados
+# en un worker deben llegar a los sockets del otro, y en orden de seq.
+
+APP_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "app")
+TIMEOUT = 10
+
+def free_port() -> int:
+	with socket.socket() as sock:
+		sock.bind(("127.0.0.1", 0))
+		return sock.getsockname()[1]
+
+def start_worker(port: int, env: dict) -> subprocess.Popen:
+	process = subprocess.Popen(
+		[sys.executable, "-m", "uvicorn", "server.api:app", "--host", "127.0.0.1", "--port", str(port), "--log-level", "warning"],
+		cwd=APP_DIR,
+		env=env,
+	)
+	deadline = time.monotonic() + 30
+	while True:
+		try:
+			if httpx.get(f"http://127.0.0.1:{port}/metrics").status_code == 200:
+				return process
+		except httpx.TransportError:
+			pass
+		if time.monotonic() > deadline or process.poll() is not None:
+			process.kill()
+			raise RuntimeError("El worker no ha arrancado")
+		time.sleep(0.1)
+
+@pytest.fixture
+def workers():
+	with tempfile.TemporaryDirectory(prefix="conalma-workers-") as directory:
+		env = dict(
+			os.environ,
+			DATABASE_URL=f"sqlite:///{os.path.join(directory, 'workers.db')}",
+			BACKPLANE="sqlite",
+			BACKPLANE_PATH=os.path.join(directory, "backplane.db"),
+			IMAGE_DIR=os.path.join(directory, "images"),
+		)
+		processes = []
+		try:
+			for _ in range(2):
+				port = free_port()
+				processes.append(start_worker(port, env))
+				processes[-1].port = port
+			yield [f"127.0.0.1:{process.port}" for process in processes]
+		finally:
+			for process in processes:
+				process.terminate()
+				process.wait(timeout=30)
+
+def receive_event(websocket, event: str, log: list) -> dict:
+	deadline = time.monotonic() + TIMEOUT
+	while True:
+		message = json.loads(websocket.recv(timeout=max(0.1, deadline - time.monotonic())))
+		if "seq" in message:
+			log.append(message)
+		if message.get("event") == event:
+			return message
+
+def retry(request, attempts: int = 50) -> httpx.Response:
+	# La invalidación del estado en memoria llega al otro worker en un ciclo del backplane
+	for _ in range(attempts):
+		response = request()
+		if response.status_code == 200:
+			return response
+		time.sleep(0.05)
+	return response
+
+def test_events_cross_workers_in_seq_order(workers):
+	admin_host, student_host = workers
+	admin_api = httpx.Client(base_url=f"http://{admin_host}", timeout=TIMEOUT)
+	student_api = httpx.Client(base_url=f"http://{student_host}", timeout=TIMEOUT)
+
+	token = admin_api.post("/login", json={"username": "admin", "password": "1234"}).json()["token"]
+	question = {"title": "Nota", "image": None, "questionType": "number", "questionOrder": 1, "selectOptions": []}
+	response = admin_api.post(f"/assessment/create/token={token}", json={"title": "Workers", "image": None, "questions": [question]})
+	assessment_id = int(response.json()["detail"].split(": ")[1])
+	question_id = admin_api.get(f"/assessment/{assessment_id}/view/token={token}").json()["questions"][0]["id"]
+	response = admin_api.post(f"/assessment/{assessment_id}/assessment-instance/create/token={token}", json={"title": "Workers"})
+	instance_id = int(response.json()["detail"].split(": ")[1])
+	roster = "name,email,order,group,voteEveryone\n" + "\n".join(f"u{i},u{i}@example.com,{i},0,False" for i in range(1, 4))
+	admin_api.post(f"/assessment-instance/{instance_id}/users/upload/token={token}", files={"file": ("users.csv", roster)})
+	users = sorted(admin_api.get(f"/assessment-instance/{instance_id}/token={token}").json()["users"], key=lambda user: user["order"])
+
+	admin_log, student_log = [], []
+	with connect(f"ws://{admin_host}/assessment-instance/{instance_id}/start/token={token}") as admin:
+		admin.recv(timeout=TIMEOUT)
+		student_token = retry(lambda: student_api.post("/user-login", json={"pin": users[2]["pin"]})).json()["token"]
+		with connect(f"ws://{student_host}/play/token={student_token}") as student:
+			student.recv(timeout=TIMEOUT)
+			receive_event(admin, "CONNECT", admin_log)
+
+			admin.send("START")
+			receive_event(student, "START", student_log)
+
+			# Respuesta en el worker de los alumnos -> socket del administrador en el otro
+			answer = {"answers": [{"question_id": question_id, "answerText": "8"}]}
+			assert student_api.post(f"/user/answer/token={student_token}", json=answer).status_code == 200
+			event = receive_event(admin, "ANSWER", admin_log)
+			assert event["grading_user_id"] == users[2]["id"] and event["graded_user_id"] == users[0]["id"]
+
+			# NEXT en el worker del administrador -> socket del alumno en el otro
+			assert admin_api.post(f"/assessment-instance/{instance_id}/next/token={token}").status_code == 200
+			event = receive_event(student, "NEXT", student_log)
+			assert event["snapshot"]["actual_user"]["id"] == users[1]["id"]
+			receive_event(admin, "NEXT", admin_log)
+
+			assert retry(lambda: student_api.post(f"/user/answer/token={student_token}", json=answer)).status_code == 200
+			event = receive_event(admin, "ANSWER", admin_log)
+			assert event["graded_user_id"] == users[1]["id"]
+
+		receive_event(admin, "DISCONNECT", admin_log)
+		admin.send("CLOSE")
+		receive_event(admin, "CLOSE", admin_log)
+
+	for log in (admin_log, student_log):
+		seqs = [message["seq"] for message in log]
+		assert seqs == sorted(seqs) and len(set(seqs)) == len(seqs), log
+	assert [message["event"] for message in admin_log] == ["CONNECT", "START", "ANSWER", "NEXT", "ANSWER", "DISCONNECT", "CLOSE"]
+	assert [message["event"] for message in student_log] == ["START", "NEXT"]
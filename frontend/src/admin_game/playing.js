@@ -1,19 +1,36 @@
-import React, {useState, useCallback, useEffect} from "react";
+import React, { useCallback, useEffect, useMemo, useReducer } from "react";
 import { useNavigate } from "react-router-dom";
+import { initialLiveState, liveReducer } from "../live_events";
+
+// El administrador tiene en la instantánea todos los usuarios, así que aplica NEXT y
+// ANSWER localmente: NEXT cambia el evaluado y ANSWER marca al evaluador.
+function applyEvent(snapshot, event) {
+	const actualUserId = snapshot.actual_user?.id;
+	if ((event.event === "NEXT" || event.event === "START") && event.actual_user_id !== actualUserId) {
+		const actualUser = snapshot.users.find((user) => user.id === event.actual_user_id);
+		return { ...snapshot, actual_user: actualUser || { id: event.actual_user_id, name: event.actual_user_name }, answers: [] };
+	}
+	if (event.event === "ANSWER" && event.graded_user_id === actualUserId) {
+		const answer = { grading_user_id: event.grading_user_id, graded_user_id: event.graded_user_id };
+		return { ...snapshot, answers: [...(snapshot.answers || []), answer] };
+	}
+	return snapshot;
+}
+
+const reducer = liveReducer(applyEvent);
 
 function PlayingScreen({ data, ws, connectedUsers, assessmentInstanceId }) {
 	const colors = ["#FF7043", "#FFCA28", "#29B6F6", "#66BB6A"];
 	const navigate = useNavigate();
-	const [assessmentInstance, setAssessmentInstance] = useState(null);
-	const [gameState, setGameState] = useState(data);
+	const [live, dispatch] = useReducer(reducer, initialLiveState);
+	const assessmentInstance = live.snapshot;
 	const token = localStorage.getItem("token");
-	const [currentGradingUsers, setCurrentGradingUsers] = useState([]);
 
 	console.log(data);
 	const handleNext = async () => {
 		try {
 			const response = await fetch(
-				`http://localhost:8000/next/token=${token}`,
+				`http://localhost:8000/assessment-instance/${assessmentInstanceId}/next/token=${token}`,
 				{
 					method: "POST",
 					headers: {
@@ -38,7 +55,7 @@ function PlayingScreen({ data, ws, connectedUsers, assessmentInstanceId }) {
 	const fetchAssessmentInstance = useCallback(async () => {
 		try {
 			const response = await fetch(
-				`http://localhost:8000/assessment-instance/active/token=${token}`
+				`http://localhost:8000/assessment-instance/${assessmentInstanceId}/active/token=${token}`
 			);
 			if (!response.ok) {
 				throw new Error(
@@ -46,49 +63,46 @@ function PlayingScreen({ data, ws, connectedUsers, assessmentInstanceId }) {
 				);
 			}
 			const data = await response.json();
-			setAssessmentInstance(data);
-			const gradingUsers = data.users.filter((user) => (user.voteEveryone || user.group === data.actual_user.group) && user.id !== data.actual_user.id);
-			const filteredGradingUsers = gradingUsers.filter((user) => connectedUsers.some((connectedUser) => connectedUser.id === user.id));
-			filteredGradingUsers.forEach((user) => {
-				user.voted = false;
-				if (data.answers && data.answers.some((answer) => answer.grading_user_id === user.id && answer.graded_user_id === data.actual_user.id)) {
-					user.voted = true;
-				}
-			});
-			setCurrentGradingUsers(filteredGradingUsers);
+			dispatch({ type: "SNAPSHOT", snapshot: data });
 		} catch (error) {
 			console.error("Fetch error:", error);
 			navigate("/error");
 		}
-	}, [gameState.event, token]);
+	}, [token, assessmentInstanceId]);
 
 	useEffect(() => {
 		fetchAssessmentInstance();
 	}, [fetchAssessmentInstance]);
 
 	useEffect(() => {
+		// La instantánea se pide una sola vez; los eventos que llegan mientras tanto
+		// quedan pendientes en el reducer y se aplican sobre ella
 		ws.onmessage = (event) => {
 			const data = JSON.parse(event.data);
-			if (data.event === "REFRESH") {
-				fetchAssessmentInstance();
-			}
 			if(data.event === "FINISH") {
 				ws.send("CLOSE");
 				navigate(`/menu/assessment-instance/${assessmentInstanceId}`);
+				return;
 			}
-			// if (data.event === "DISCONNECT") {
-			// 	// remove user from connectedUsers
-			// 	setConnectedUsers((prev) => prev.filter((user) => user.id !== data.user_id));
-			// }
-			setGameState(data);
-
+			dispatch({ type: "EVENT", event: data });
 			console.log(data);
 		};
-	}, [ws.onmessage]);
+	}, [ws]);
 
-	useEffect(() => {
-		console.log("currentGradingUsers updated", currentGradingUsers);
-	  }, [currentGradingUsers]);
+	const currentGradingUsers = useMemo(() => {
+		if (!assessmentInstance?.actual_user) {
+			return [];
+		}
+		const actualUser = assessmentInstance.users.find((user) => user.id === assessmentInstance.actual_user.id) || assessmentInstance.actual_user;
+		const answers = assessmentInstance.answers || [];
+		return assessmentInstance.users
+			.filter((user) => (user.voteEveryone || user.group === actualUser.group) && user.id !== actualUser.id)
+			.filter((user) => connectedUsers.some((connectedUser) => connectedUser.id === user.id))
+			.map((user) => ({
+				...user,
+				voted: answers.some((answer) => answer.grading_user_id === user.id && answer.graded_user_id === actualUser.id),
+			}));
+	}, [assessmentInstance, connectedUsers]);
 
 	return (
 		<div
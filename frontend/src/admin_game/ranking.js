@@ -1,6 +1,33 @@
-import React from "react";
+import React, { useEffect, useState } from "react";
+import { useNavigate } from "react-router-dom";
+
+function RankingScreen({ data, ws, assessmentInstanceId }) {
+	const navigate = useNavigate();
+	const token = localStorage.getItem("token");
+	const [ranking, setRanking] = useState([]);
+
+	useEffect(() => {
+		// La clasificación la calcula el servidor (/results); no se envían las respuestas
+		const fetchResults = async () => {
+			try {
+				const response = await fetch(
+					`http://localhost:8000/assessment-instance/${assessmentInstanceId}/results/token=${token}`
+				);
+				if (!response.ok) {
+					throw new Error(
+						`Error ${response.status}: ${response.statusText}`
+					);
+				}
+				const data = await response.json();
+				setRanking(data.ranking);
+			} catch (error) {
+				console.error("Fetch error:", error);
+				navigate("/error");
+			}
+		};
+		fetchResults();
+	}, [assessmentInstanceId, token]);
 
-function RankingScreen({ data, ws, testid }) {
 	const handleNext = () => {
 		ws.send("NEXT");
 	};
@@ -9,8 +36,6 @@ function RankingScreen({ data, ws, testid }) {
 		ws.send("END");
 	};
 
-	const sortedResults = [...data.results].sort((a, b) => b.score - a.score);
-
 	return (
 		<div
 			className="container mt-4 text-center"
@@ -27,15 +52,15 @@ function RankingScreen({ data, ws, testid }) {
 				}}
 			>
 				<ul className="list-group" style={{ width: "90%" }}>
-					{sortedResults.map((result, index) => (
+					{ranking.map((result) => (
 						<li
-							key={index}
+							key={result.user_id}
 							className="list-group-item d-flex justify-content-between align-items-center"
 						>
 							<span style={{ marginRight: "0.5em" }}>
-								{result.player}
+								{result.name}
 							</span>
-							<span>{result.score}</span>
+							<span>{result.score === null ? "-" : result.score.toFixed(2)}</span>
 						</li>
 					))}
 				</ul>
@@ -1,5 +1,6 @@
 import React, { useState, useRef } from "react";
 import { useNavigate } from "react-router-dom";
+import { uploadImage } from "./images";
 
 function CreateAssessment() {
 	const initialAssessmentState = {
@@ -140,30 +141,6 @@ function CreateAssessment() {
 		return true;
 	};
 
-	function handleImageChange(event) {
-		const file = event.target.files[0];
-		if (file) {
-			updateFormField("image", file.name);
-
-			const reader = new FileReader();
-			reader.onload = function (uploadEvent) {
-				// Lógica de carga de imagen (si es necesario)
-			};
-			reader.readAsDataURL(file);
-		}
-	}
-
-	function handleQuestionImageChange(event, qIndex) {
-		const file = event.target.files[0];
-		if (file) {
-			updateQuestion(qIndex, "image", file.name);
-
-			const reader = new FileReader();
-			reader.onload = function (uploadEvent) {};
-			reader.readAsDataURL(file);
-		}
-	}
-
 	const handleSave = async () => {
 		if (!isValidForm()) {
 			alert("Por favor, rellena todos los campos correctamente.");
@@ -221,14 +198,14 @@ function CreateAssessment() {
 		formData.questions[qIndex].selectOptions.length > 2;
 	const canRemoveQuestion = () => formData.questions.length > 1;
 
-	function handleImageChange(event) {
+	async function handleImageChange(event) {
 		const file = event.target.files[0];
 		if (file) {
-			updateFormField("image", file.name);
-
-			const reader = new FileReader();
-			reader.onload = function (uploadEvent) {};
-			reader.readAsDataURL(file);
+			try {
+				updateFormField("image", await uploadImage(file, token));
+			} catch (error) {
+				alert(error.message);
+			}
 		}
 	}
 
@@ -236,14 +213,14 @@ function CreateAssessment() {
 		questionFileInputRefs.current[index] = input;
 	};
 
-	function handleQuestionImageChange(event, qIndex) {
+	async function handleQuestionImageChange(event, qIndex) {
 		const file = event.target.files[0];
 		if (file) {
-			updateFormField("image", file.name);
-
-			const reader = new FileReader();
-			reader.onload = function (uploadEvent) {};
-			reader.readAsDataURL(file);
+			try {
+				updateQuestion(qIndex, "image", await uploadImage(file, token));
+			} catch (error) {
+				alert(error.message);
+			}
 		}
 	}
 
@@ -1,5 +1,6 @@
 import React, { useState, useRef, useEffect } from "react";
 import { useParams, useNavigate } from "react-router-dom";
+import { uploadImage } from "./images";
 
 function EditAssessment() {
 	const [formData, setFormData] = useState({
@@ -219,14 +220,14 @@ function EditAssessment() {
 		}
 	};
 
-	function handleImageChange(event) {
+	async function handleImageChange(event) {
 		const file = event.target.files[0];
 		if (file) {
-			updateFormField("image", file.name);
-
-			const reader = new FileReader();
-			reader.onload = function (uploadEvent) {};
-			reader.readAsDataURL(file);
+			try {
+				updateFormField("image", await uploadImage(file, token));
+			} catch (error) {
+				alert(error.message);
+			}
 		}
 	}
 
@@ -234,14 +235,14 @@ function EditAssessment() {
 		questionFileInputRefs.current[index] = input;
 	};
 
-	function handleQuestionImageChange(event, qIndex) {
+	async function handleQuestionImageChange(event, qIndex) {
 		const file = event.target.files[0];
 		if (file) {
-			updateFormField("image", file.name);
-
-			const reader = new FileReader();
-			reader.onload = function (uploadEvent) {};
-			reader.readAsDataURL(file);
+			try {
+				updateQuestion(qIndex, "image", await uploadImage(file, token));
+			} catch (error) {
+				alert(error.message);
+			}
 		}
 	}
 
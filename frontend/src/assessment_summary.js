@@ -15,7 +15,7 @@ function AssessmentInstances() {
 	const fetchAssessmentInstances = async () => {
 		try {
 			const response = await fetch(
-				`http://localhost:8000/assessment/${id}/assessment-instance/all/token=${token}`
+				`http://localhost:8000/assessment/${id}/assessment-instance/all/token=${token}?fields=title,active,finished,userCount`
 			);
 			if (!response.ok) {
 				if (response.status === 404) {
@@ -156,8 +156,8 @@ function AssessmentInstances() {
 											Finalizado: {instance.finished ? "Sí" : "No"}
 										</h6>
 										<p className="card-text">
-											{instance.users.length ? (
-												`Número de usuarios: ${instance.users.length}`
+											{instance.userCount ? (
+												`Número de usuarios: ${instance.userCount}`
 											) : (
 												"No hay usuarios creados"
 											)}
@@ -1,5 +1,6 @@
 import React, { useState, useEffect, useCallback } from "react";
 import { useParams, useNavigate } from "react-router-dom";
+import { imageUrl } from "./images";
 
 function DetalleAssessment() {
 	const [assessment, setAssessment] = useState(null);
@@ -34,10 +35,10 @@ function DetalleAssessment() {
 	function transformJson(originalJson) {
 		return {
 			title: originalJson.title,
-			image: originalJson.image,
+			image: imageUrl(originalJson.image),
 			questions: originalJson.questions.map((question) => ({
 				title: question.title,
-				image: question.image,
+				image: imageUrl(question.image),
 				questionType: question.questionType,
 				selectOptions: question.selectOptions.map((selectOption) => ({
 					title: selectOption.title,
@@ -221,7 +222,7 @@ function DetalleAssessment() {
 					{assessment && (
 						<div className="card">
 							<img
-								src={assessment.image}
+								src={imageUrl(assessment.image, 1280)}
 								className="card-img-top img-fluid"
 								style={{
 									maxHeight: "150px",
@@ -264,7 +265,7 @@ function DetalleAssessment() {
 											<div
 												className="me-3"
 												style={{
-													backgroundImage: `url(${question.image}), url(${process.env.PUBLIC_URL}/default-banner.png)`,
+													backgroundImage: `url(${imageUrl(question.image, 320)}), url(${process.env.PUBLIC_URL}/default-banner.png)`,
 													backgroundSize: "cover",
 													backgroundPosition:
 														"center",
@@ -53,9 +53,9 @@ function GameScreen() {
 		// case "RESULTS":
 		// 	return <ResultsScreen data={gameState} ws={ws} />;
 		case "END":
-			return <EndScreen data={gameState} ws={ws} testid={testId} />;
+			return <EndScreen data={gameState} ws={ws} assessmentInstanceId={assessmentInstanceId} />;
 		// case "RANKING":
-		// 	return <RankingScreen data={gameState} ws={ws} />;
+		// 	return <RankingScreen data={gameState} ws={ws} assessmentInstanceId={assessmentInstanceId} />;
 		default:
 			console.log("Invalid game mode");
 			navigate("/error");
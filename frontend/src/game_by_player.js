@@ -1,5 +1,6 @@
 import React, { useState, useEffect } from "react";
 import { useParams, useNavigate } from "react-router-dom";
+import { imageUrl } from "./images";
 
 function PlayerGameDetails() {
 	const [gameDetails, setGameDetails] = useState(null);
@@ -88,7 +89,7 @@ function PlayerGameDetails() {
 								<h2>{gameDetails.title}</h2>
 								<img
 									src={
-										gameDetails.image ||
+										imageUrl(gameDetails.image, 1280) ||
 										`${process.env.PUBLIC_URL}/default-banner.png`
 									}
 									alt="Imagen del Test"
@@ -126,7 +127,7 @@ function PlayerGameDetails() {
 														<div className="col-md-1">
 															<img
 																src={
-																	question.image ||
+																	imageUrl(question.image, 320) ||
 																	`${process.env.PUBLIC_URL}/default-question-image.png`
 																}
 																alt="Imagen de la pregunta"
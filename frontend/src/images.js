@@ -0,0 +1,28 @@
+// Las imágenes guardadas en el servidor llegan como ruta relativa (/images/<hash>).
+// Se piden al backend con el ancho que se va a mostrar; el resto de URL (externas o
+// data:) se usan tal cual.
+const IMAGE_PREFIX = "/images/";
+
+export function imageUrl(image, width) {
+	if (!image || !image.startsWith(IMAGE_PREFIX)) {
+		return image;
+	}
+	const query = width ? `?w=${width}` : "";
+	return `http://${process.env.REACT_APP_IP}:8000${image}${query}`;
+}
+
+// Sube una imagen elegida en un formulario y devuelve la ruta local que hay que
+// guardar en la evaluación
+export async function uploadImage(file, token) {
+	const body = new FormData();
+	body.append("file", file);
+	const response = await fetch(
+		`http://localhost:8000/images/upload/token=${token}`,
+		{ method: "POST", body }
+	);
+	const data = await response.json();
+	if (!response.ok) {
+		throw new Error(data.detail);
+	}
+	return data.image;
+}
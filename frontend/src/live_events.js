@@ -0,0 +1,36 @@
+// Eventos de la sesión en directo. Cada evento lleva un número de secuencia ("seq")
+// creciente y cada instantánea (/assessment-instance/active, o la que llega dentro de
+// START y NEXT) el seq con el que se construyó. Los eventos con seq menor o igual ya
+// están en la instantánea y se descartan; los que llegan mientras se pide la
+// instantánea se guardan y se aplican sobre ella cuando llega, en orden.
+//
+// liveReducer(apply) devuelve un reducer para useReducer; apply(snapshot, event)
+// devuelve la instantánea con el evento aplicado, sin modificar la anterior.
+
+export const initialLiveState = { snapshot: null, seq: null, pending: [] };
+
+export function liveReducer(apply) {
+	const step = (state, event) => {
+		if (event.seq === undefined || event.seq <= state.seq) {
+			return state;
+		}
+		const snapshot = event.snapshot || apply(state.snapshot, event);
+		return { ...state, snapshot, seq: event.seq };
+	};
+
+	const reducer = (state, action) => {
+		if (action.type === "SNAPSHOT") {
+			const pending = [...state.pending].sort((a, b) => a.seq - b.seq);
+			return pending.reduce(step, { snapshot: action.snapshot, seq: action.snapshot.seq, pending: [] });
+		}
+		const event = action.event;
+		if (state.snapshot !== null) {
+			return step(state, event);
+		}
+		if (event.snapshot) {
+			return reducer(state, { type: "SNAPSHOT", snapshot: event.snapshot });
+		}
+		return { ...state, pending: [...state.pending, event] };
+	};
+	return reducer;
+}
@@ -1,10 +1,14 @@
 import React, { useState, useRef, useEffect } from "react";
 import { useNavigate } from "react-router-dom";
+import { imageUrl } from "./images";
+
+const PAGE_SIZE = 60;
 
 function MenuAssessment() {
 	const [assessments, setAssessments] = useState([]);
 	const [searchTerm, setSearchTerm] = useState("");
 	const [archiveFilter, setArchiveFilter] = useState("todos");
+	const [nextCursor, setNextCursor] = useState(null);
 	// const [playedFilter, setPlayedFilter] = useState("todos");
 	const navigate = useNavigate();
 	const token = localStorage.getItem("token");
@@ -15,16 +19,28 @@ function MenuAssessment() {
 	};
 	useEffect(() => {
 		fetchAssessments();
-	}, [token]);
+	}, [token, archiveFilter]);
 
-	const fetchAssessments = async () => {
+	const fetchAssessments = async (cursor = null) => {
 		try {
+			// Se piden solo las columnas que pinta el menú, por páginas
+			const params = new URLSearchParams({
+				limit: PAGE_SIZE,
+				fields: "title,image,archived,createdAt",
+			});
+			if (archiveFilter !== "todos") {
+				params.set("archived", archiveFilter === "archivados");
+			}
+			if (cursor) {
+				params.set("cursor", cursor);
+			}
 			const response = await fetch(
-				`http://localhost:8000/assessment/all/token=${token}`
+				`http://localhost:8000/assessment/all/token=${token}?${params}`
 			);
 			if (!response.ok) {
 				if (response.status === 404) {
 					setAssessments([]);
+					setNextCursor(null);
 				} else {
 					throw new Error(
 						`Error ${response.status}: ${response.statusText}`
@@ -32,7 +48,10 @@ function MenuAssessment() {
 				}
 			} else {
 				const data = await response.json();
-				setAssessments(data);
+				setAssessments((previous) =>
+					cursor ? [...previous, ...data] : data
+				);
+				setNextCursor(response.headers.get("X-Next-Cursor"));
 			}
 		} catch (error) {
 			console.error("Fetch error:", error);
@@ -91,53 +110,49 @@ function MenuAssessment() {
 	};
 
 	const handleImportAssessment = async () => {
-		const file = fileInputRef.current.files[0];
-		if (!file) {
-			alert("Por favor, selecciona un archivo .lgqz.");
+		const files = Array.from(fileInputRef.current.files);
+		if (files.length === 0) {
+			alert("Por favor, selecciona un archivo .lgqz, .lgqzl o .zip.");
 			return;
 		}
 
-		if (!file.name.endsWith(".lgqz")) {
-			alert("El archivo no tiene la extensión .lgqz");
-			return;
-		}
+		const body = new FormData();
+		files.forEach((file) => body.append("files", file));
+		try {
+			const response = await fetch(
+				`http://localhost:8000/assessment/import/token=${token}`,
+				{ method: "POST", body }
+			);
 
-		const reader = new FileReader();
-		reader.onload = async (event) => {
-			try {
-				const jsonData = JSON.parse(event.target.result);
-				// Suponiendo que tienes 'token' disponible
-				const response = await fetch(
-					`http://localhost:8000/assessment/create/token=${token}`,
-					{
-						method: "PUT",
-						headers: {
-							"Content-Type": "application/json",
-						},
-						body: JSON.stringify(jsonData),
-					}
+			if (!response.ok) {
+				throw new Error(
+					`Error ${response.status}: ${response.statusText}`
 				);
-
-				if (!response.ok) {
-					throw new Error(
-						`Error ${response.status}: ${response.statusText}`
-					);
-				}
-
-				alert("Evaluación importada con éxito");
-				window.location.reload(true);
-			} catch (error) {
-				console.error("Fetch error:", error);
-				navigate("/error");
 			}
-		};
 
-		reader.onerror = () => {
-			console.error("Error al leer el archivo");
-			alert("Error al leer el archivo");
-		};
+			const data = await response.json();
+			const lines = data.files.map((entry) => {
+				let line = `${entry.file}: ${entry.assessments} evaluaciones, ${entry.questions} preguntas`;
+				if (entry.skipped.length > 0) {
+					line += `, ${entry.skipped.length} ya existían`;
+				}
+				if (entry.errors.length > 0) {
+					line += `, ${entry.errors.length} con errores (${entry.errors
+						.map((error) => `${error.source}: ${error.detail}`)
+						.join("; ")})`;
+				}
+				return line;
+			});
+			alert(`${data.detail}\n\n${lines.join("\n")}`);
+			window.location.reload(true);
+		} catch (error) {
+			console.error("Fetch error:", error);
+			navigate("/error");
+		}
+	};
 
-		reader.readAsText(file);
+	const handleExportAll = () => {
+		window.location.href = `http://localhost:8000/assessment/bundle/token=${token}?format=zip`;
 	};
 
 	const handleSearchChange = (e) => {
@@ -235,10 +250,17 @@ function MenuAssessment() {
 					>
 						Importar Assessment
 					</button>
+					<button
+						className="btn btn-outline-primary mb-3 w-100"
+						onClick={handleExportAll}
+					>
+						Exportar todos
+					</button>
 					<input
 						type="file"
 						ref={fileInputRef}
-						accept=".lgqz"
+						accept=".lgqz,.lgqzl,.zip"
+						multiple
 						style={{ display: "none" }}
 						onChange={handleImportAssessment}
 					/>
@@ -363,7 +385,7 @@ function MenuAssessment() {
 									>
 										<img
 											src={
-												assessment.image ||
+												imageUrl(assessment.image, 640) ||
 												`${process.env.PUBLIC_URL}/default-banner.png`
 											}
 											className="card-img-top img-fluid"
@@ -405,6 +427,20 @@ function MenuAssessment() {
 									</div>
 								</div>
 							))}
+							{nextCursor ? (
+								<div className="col-12 mb-4 text-center">
+									<button
+										className="btn btn-secondary"
+										onClick={() =>
+											fetchAssessments(nextCursor)
+										}
+									>
+										Cargar más
+									</button>
+								</div>
+							) : (
+								""
+							)}
 						</div>
 					) : (
 						<p>Cargando detalles del juego...</p>
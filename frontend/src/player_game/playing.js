@@ -1,12 +1,18 @@
-import React, { useState, useCallback, useEffect } from "react";
+import React, { useState, useCallback, useEffect, useReducer } from "react";
 import { useNavigate } from "react-router-dom";
+import { imageUrl } from "../images";
+import { initialLiveState, liveReducer } from "../live_events";
+
+// Un alumno no recibe eventos incrementales: su vista de cada ronda llega completa
+// dentro de START y NEXT y sustituye a la anterior
+const reducer = liveReducer((snapshot) => snapshot);
 
 function PlayingScreen({ data, ws }) {
 	const token = localStorage.getItem("token");
-	const [assessmentInstance, setAssessmentInstance] = useState(null);
+	const [live, dispatch] = useReducer(reducer, initialLiveState);
+	const assessmentInstance = live.snapshot;
 	const [answers, setAnswers] = useState([]);
 	const navigate = useNavigate();
-	const [gameState, setGameState] = useState(data);
 	const [isSubmitted, setIsSubmitted] = useState(false);
 	const colors = ["#FF7043", "#FFCA28", "#29B6F6", "#66BB6A"];
 
@@ -60,51 +66,53 @@ function PlayingScreen({ data, ws }) {
 					`Error ${response.status}: ${response.statusText}`
 				);
 			}
-			const data = await response.json();
-			console.log(data);
-			setAssessmentInstance(data);
-			let initialAnswers = [];
-			if (data.assessment) {
-				initialAnswers = data.assessment.questions.map((question) => ({
-					question_id: question.id,
-					answerText: "",
-				}));
-			}
-			// setAnswers(initialAnswers);
-			// setIsSubmitted(false);
-			if (data.answers && data.answers.length > 0) {
-				setAnswers(data.answers);
-				setIsSubmitted(true);
-			} else {
-				setAnswers(initialAnswers);
-				setIsSubmitted(false);
-			}
+			dispatch({ type: "SNAPSHOT", snapshot: await response.json() });
 		} catch (error) {
 			console.error("Fetch error:", error);
 			navigate("/error");
 		}
-	}, [gameState.event, token]);
+	}, [token]);
+
+	useEffect(() => {
+		// Solo se pide la instantánea si el evento que abrió la pantalla no la traía
+		if (data.snapshot) {
+			dispatch({ type: "EVENT", event: data });
+		} else {
+			fetchAssessmentInstance();
+		}
+	}, []);
 
 	useEffect(() => {
-		fetchAssessmentInstance();
-	}, [fetchAssessmentInstance]);
+		// Cada ronda empieza con el formulario vacío o con lo que ya se había enviado
+		if (!assessmentInstance) {
+			return;
+		}
+		console.log(assessmentInstance);
+		if (assessmentInstance.answers && assessmentInstance.answers.length > 0) {
+			setAnswers(assessmentInstance.answers);
+			setIsSubmitted(true);
+		} else {
+			setAnswers((assessmentInstance.assessment?.questions || []).map((question) => ({
+				question_id: question.id,
+				answerText: "",
+			})));
+			setIsSubmitted(false);
+		}
+	}, [assessmentInstance]);
 
 	const handleSubmit = async (e) => {
 		e.preventDefault();
 		await submitForm();
-		await fetchAssessmentInstance();
 	};
 
 	ws.onmessage = (event) => {
 		const data = JSON.parse(event.data);
-		if (data.event === "REFRESH") {
-			fetchAssessmentInstance();
-		}
 		if (data.event === "FINISH") {
 			ws.send("CLOSE");
 			navigate("/");
+			return;
 		}
-		setGameState(data);
+		dispatch({ type: "EVENT", event: data });
 
 		console.log(data);
 	};
@@ -127,7 +135,7 @@ function PlayingScreen({ data, ws }) {
 				{assessmentInstance?.assessment && (
 					<div className="card">
 						<img
-							src={assessmentInstance.assessment.image}
+							src={imageUrl(assessmentInstance.assessment.image, 1280)}
 							className="card-img-top img-fluid"
 							style={{
 								maxHeight: "150px",
@@ -158,7 +166,7 @@ function PlayingScreen({ data, ws }) {
 											<div
 												className="me-3"
 												style={{
-													backgroundImage: `url(${question.image}), url(${process.env.PUBLIC_URL}/default-banner.png)`,
+													backgroundImage: `url(${imageUrl(question.image, 320)}), url(${process.env.PUBLIC_URL}/default-banner.png)`,
 													backgroundSize: "cover",
 													backgroundPosition:
 														"center",
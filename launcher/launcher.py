@@ -5,6 +5,13 @@ import shutil
 import socket
 import signal
 import sys
+import time
+import urllib.request
+
+try:
+	import psutil
+except ImportError:
+	psutil = None
 
 if os.name == 'nt':  # Windows
 	null_device = 'NUL'
@@ -78,14 +85,125 @@ def cambiar_credenciales():
 	nueva_contrasena = input("Ingrese la nueva contraseña: ")
 	modificar_credenciales_admin(nuevo_usuario, nueva_contrasena)
 
+proceso_frontend = None
+proceso_backend = None
+
 def signal_handler(sig, frame):
 	print('Señal de interrupción capturada, cerrando procesos...')
-	if proceso_frontend.poll() is None:
-		proceso_frontend.terminate()
-	if proceso_backend.poll() is None:
-		proceso_backend.terminate()
+	for proceso in (proceso_frontend, proceso_backend):
+		if proceso is not None and proceso.poll() is None:
+			proceso.terminate()
 	sys.exit(0)
 
+def esperar_servidor(url, limite=300):
+	# Segundos hasta que el servidor responde, o None si no lo hace a tiempo
+	inicio = time.monotonic()
+	while time.monotonic() - inicio < limite:
+		try:
+			urllib.request.urlopen(url, timeout=2)
+			return time.monotonic() - inicio
+		except Exception:
+			time.sleep(0.2)
+	return None
+
+def memoria_residente(pid):
+	# Memoria residente (MiB) del proceso y todos sus hijos: servidor de desarrollo de
+	# React, recargador y workers de uvicorn
+	if psutil is not None:
+		try:
+			proceso = psutil.Process(pid)
+			procesos = [proceso] + proceso.children(recursive=True)
+			return sum(p.memory_info().rss for p in procesos) / 2**20
+		except psutil.Error:
+			return None
+	if not os.path.isdir("/proc"):
+		return None
+	hijos = {}
+	for entrada in os.listdir("/proc"):
+		if entrada.isdigit():
+			try:
+				with open(f"/proc/{entrada}/stat") as file:
+					ppid = int(file.read().rsplit(")", 1)[1].split()[1])
+				hijos.setdefault(ppid, []).append(int(entrada))
+			except (IOError, IndexError, ValueError):
+				pass
+	total = 0
+	pendientes = [pid]
+	while pendientes:
+		actual = pendientes.pop()
+		pendientes.extend(hijos.get(actual, []))
+		try:
+			with open(f"/proc/{actual}/status") as file:
+				for linea in file:
+					if linea.startswith("VmRSS:"):
+						total += int(linea.split()[1]) * 1024
+		except IOError:
+			pass
+	return total / 2**20
+
+def informar_arranque(inicio, urls, procesos):
+	for url in urls:
+		if esperar_servidor(url) is None:
+			print(f"El servidor {url} no responde.")
+			return
+	print(f"Arranque completado en {time.monotonic() - inicio:.1f} s.")
+	memorias = [memoria_residente(proceso.pid) for proceso in procesos]
+	if None in memorias:
+		print("Memoria residente no disponible (instala psutil).")
+	else:
+		print(f"Memoria residente: {sum(memorias):.0f} MiB.")
+
+def frontend_compilado_al_dia(dir_frontend):
+	# El build depende del código y del .env (la IP se fija al compilar)
+	index = os.path.join(dir_frontend, "build", "index.html")
+	if not os.path.isfile(index):
+		return False
+	compilado = os.path.getmtime(index)
+	fuentes = [os.path.join(dir_frontend, nombre) for nombre in (".env", "package.json")]
+	for carpeta in ("src", "public"):
+		for raiz, _, ficheros in os.walk(os.path.join(dir_frontend, carpeta)):
+			fuentes.extend(os.path.join(raiz, nombre) for nombre in ficheros)
+	return all(os.path.getmtime(fuente) <= compilado for fuente in fuentes if os.path.isfile(fuente))
+
+def compilar_frontend(dir_frontend):
+	if frontend_compilado_al_dia(dir_frontend):
+		print("Frontend ya compilado.")
+		return True
+	print("Compilando frontend (solo la primera vez o tras cambios)...")
+	return subprocess.call("npm run build", shell=True, cwd=dir_frontend, stdout=open(null_device, 'w'), stderr=open(null_device, 'w')) == 0
+
+def lanzar_produccion(workers=None):
+	# Un único servidor (uvicorn sin recarga y con varios workers) que sirve la API y el
+	# frontend compilado en el puerto 8000
+	dir_frontend = "./AgoraEval/frontend"
+	dir_backend = "./AgoraEval/backend"
+	comando_backend = "python ./app/main.py --prod"
+	if workers:
+		comando_backend += f" --workers {workers}"
+
+	if not os.path.isfile("./AgoraEval/backend/app/db/local.db"):
+		generar_base_de_datos()
+	if not compilar_frontend(dir_frontend):
+		print("Hubo un error al compilar el frontend.")
+		return
+
+	global proceso_backend
+	print("\nIniciando servidor en modo producción...")
+	inicio = time.monotonic()
+	proceso_backend = subprocess.Popen(comando_backend, shell=True, cwd=dir_backend, stdout=open(null_device, 'w'), stderr=open(null_device, 'w'))
+	informar_arranque(inicio, ["http://127.0.0.1:8000/"], [proceso_backend])
+	ip = "{IP local}"
+	try:
+		with open(os.path.join(dir_frontend, ".env")) as file:
+			for linea in file:
+				if linea.startswith("REACT_APP_IP="):
+					ip = linea.split("=", 1)[1].strip()
+	except IOError:
+		pass
+	print(f"Los jugadores deben entrar en http://{ip}:8000/")
+	print("Registro del servidor: AgoraEval/backend/app/logs/")
+	proceso_backend.wait()
+
 def lanzar_comandos_en_paralelo():
 	# Define los comandos para frontend y backend
 	comando_frontend = "npm start"
@@ -106,8 +224,10 @@ def lanzar_comandos_en_paralelo():
 	global proceso_frontend
 	global proceso_backend
 	print("\nIniciando frontend y backend...")
+	inicio = time.monotonic()
 	proceso_frontend = subprocess.Popen(comando_frontend, shell=True, cwd=dir_frontend, stdout=open(null_device, 'w'), stderr=open(null_device, 'w'))
 	proceso_backend = subprocess.Popen(comando_backend, shell=True, cwd=dir_backend, stdout=open(null_device, 'w'), stderr=open(null_device, 'w'))
+	informar_arranque(inicio, ["http://127.0.0.1:3000/", "http://127.0.0.1:8000/docs"], [proceso_frontend, proceso_backend])
 
 	# Esperar a que ambos procesos terminen
 	proceso_frontend.wait()
@@ -127,8 +247,9 @@ def menu_existente():
 		print("1. Iniciar programa")
 		print("2. Reinstalar/Reparar")
 		print("3. Eliminar programa")
+		print("4. Iniciar programa en modo producción (recomendado en clase)")
 		print("Para salir, presiona Ctrl + C dos veces, o cierra la ventana.\n")
-		opcion = input("Ingresa tu opción (1, 2, 3): ")
+		opcion = input("Ingresa tu opción (1, 2, 3, 4): ")
 
 		if opcion == '1':
 			limpiar_consola()
@@ -146,6 +267,12 @@ def menu_existente():
 			eliminar_programa()
 			print("Programa eliminado correctamente.")
 			break
+		elif opcion == '4':
+			limpiar_consola()
+			mostrar_info_admin()
+			workers = input("\nNúmero de procesos del servidor (Enter para el valor por defecto): ").strip()
+			lanzar_produccion(int(workers) if workers.isdigit() else None)
+			break
 		else:
 			print("Opción no válida, intenta de nuevo.")
 